@@ -1,160 +1,505 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
-import logging
-
-from counseling_agent import CounselingSessionAgent
-from email_service import EmailService
-from models import SessionTranscript, AgentResponse
-from config import Config
-
-# Configure logging
-logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
-logger = logging.getLogger(__name__)
-
-# Initialize FastAPI app
-app = FastAPI(
-    title="Counseling Session Agent API",
-    description="AI Agent for processing counseling session transcripts and generating summaries and follow-up emails",
-    version="1.0.0"
-)
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Initialize services
-counseling_agent = CounselingSessionAgent()
-email_service = EmailService()
-
-class ProcessSessionRequest(BaseModel):
-    """Request model for processing a session."""
-    transcript: SessionTranscript
-    send_email: bool = True
-    save_email_template: bool = False
-
-class ProcessSessionResponse(BaseModel):
-    """Response model for processing a session."""
-    success: bool
-    message: str
-    session_summary: Optional[Dict[str, Any]] = None
-    follow_up_email: Optional[Dict[str, Any]] = None
-    email_sent: Optional[Dict[str, Any]] = None
-    email_template_path: Optional[str] = None
-    error: Optional[str] = None
-
-@app.get("/")
-async def root():
-    """Root endpoint."""
-    return {
-        "message": "Counseling Session Agent API",
-        "version": "1.0.0",
-        "status": "running"
-    }
-
-@app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {
-        "status": "healthy",
-        "services": {
-            "counseling_agent": "initialized",
-            "email_service": "initialized"
-        }
-    }
-
-@app.post("/process-session", response_model=ProcessSessionResponse)
-async def process_session(request: ProcessSessionRequest):
-    """Process a counseling session transcript and generate summary and email."""
-    try:
-        logger.info(f"Processing session request for session {request.transcript.session_id}")
-        
-        # Process the session
-        result = counseling_agent.process_session(request.transcript)
-        
-        if not result.success:
-            raise HTTPException(status_code=400, detail=result.error)
-        
-        response_data = {
-            "success": True,
-            "message": result.message,
-            "session_summary": result.data.get("session_summary"),
-            "follow_up_email": result.data.get("follow_up_email"),
-            "email_sent": None,
-            "email_template_path": None
-        }
-        
-        # Send email if requested and available
-        if request.send_email and result.data.get("follow_up_email"):
-            follow_up_email = result.data["follow_up_email"]
-            
-            # Send the email
-            email_result = email_service.send_email(
-                FollowUpEmail(**follow_up_email)
-            )
-            response_data["email_sent"] = email_result
-            
-            # Save email template if requested
-            if request.save_email_template:
-                template_path = email_service.save_email_template(
-                    FollowUpEmail(**follow_up_email)
-                )
-                response_data["email_template_path"] = template_path
-        
-        return ProcessSessionResponse(**response_data)
-        
-    except Exception as e:
-        logger.error(f"Error processing session: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/extract-takeaways")
-async def extract_takeaways(transcript: str):
-    """Extract key takeaways from a transcript."""
-    try:
-        takeaways = counseling_agent.extract_key_takeaways(transcript)
-        return {
-            "success": True,
-            "takeaways": takeaways
-        }
-    except Exception as e:
-        logger.error(f"Error extracting takeaways: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/send-email")
-async def send_email(email_data: Dict[str, Any]):
-    """Send a follow-up email."""
-    try:
-        follow_up_email = FollowUpEmail(**email_data)
-        result = email_service.send_email(follow_up_email)
-        
-        return {
-            "success": result["success"],
-            "email_result": result
-        }
-    except Exception as e:
-        logger.error(f"Error sending email: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-if __name__ == "__main__":
-    import uvicorn
-    
-    # Validate configuration
-    try:
-        Config.validate()
-    except ValueError as e:
-        logger.error(f"Configuration error: {e}")
-        exit(1)
-    
-    # Run the API server
-    uvicorn.run(
-        "api:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=Config.DEBUG
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, List, Literal, Tuple
+from datetime import datetime
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from services import ServiceContainer
+from batch_processor import process_batch, batch_result_record
+from transcript_loader import load_transcript_directory
+from metrics import metrics, track_request
+from singleflight import SingleFlight, flight_key
+from models import SessionTranscript, SessionSummary, AgentResponse, FollowUpEmail
+from json_response import FastJSONResponse, dumps
+from response_format import compact_response, parse_fields, project
+from compression import CompressionMiddleware
+from scheduler import SchedulerFull, counselor_key
+from structured_logging import configure_logging, shutdown_logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Services are built lazily so importing this module stays cheap
+services = ServiceContainer()
+
+# Identical concurrent /process-session requests (client retries) share one pipeline run and one email
+session_flights = SingleFlight("process_session")
+
+async def _warm_up_agent():
+    """Build the agent in the background so the first request does not pay for it."""
+    try:
+        await services.get_agent()
+    except Exception as e:
+        logger.error("Counseling agent warm-up failed: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start email delivery and agent warm-up without delaying startup; release resources on shutdown."""
+    configure_logging()
+    warm_up = asyncio.create_task(_warm_up_agent()) if Config.PRELOAD_AGENT else None
+    # Resume delivery of anything left in the outbox by a previous run
+    await services.get_email_outbox()
+    yield
+    if warm_up:
+        warm_up.cancel()
+    await run_in_threadpool(services.close)
+    shutdown_logging()
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="Counseling Session Agent API",
+    description="AI Agent for processing counseling session transcripts and generating summaries and follow-up emails",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# br/gzip for large bodies; batch NDJSON is compressed as it streams
+if Config.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+class ProcessSessionRequest(BaseModel):
+    """Request model for processing a session."""
+    transcript: SessionTranscript
+    mode: Optional[Literal["multi_call", "single_shot"]] = None  # defaults to Config.PIPELINE_MODE
+    email_mode: Optional[Literal["llm", "template", "auto"]] = None  # defaults to Config.EMAIL_MODE
+    priority: Literal["interactive", "standard", "batch"] = "interactive"  # scheduler class; batch only uses spare capacity
+    send_email: bool = True
+    queue_email: bool = True  # deliver through the outbox instead of waiting on SMTP
+    save_email_template: bool = False
+    include_timings: bool = False  # add a per-stage latency/token breakdown to the response
+    incremental: bool = True  # if the stored transcript for this session_id was only appended to, process just the new part
+
+class ProcessSessionResponse(BaseModel):
+    """Response model for processing a session."""
+    success: bool
+    message: str
+    session_summary: Optional[SessionSummary] = None
+    follow_up_email: Optional[FollowUpEmail] = None
+    email_sent: Optional[Dict[str, Any]] = None
+    outbox_id: Optional[str] = None
+    email_archive_id: Optional[str] = None
+    email_template_path: Optional[str] = None  # only when the email archive is disabled
+    timings: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+ResponseFormat = Literal["full", "compact"]
+
+def _response_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse the fields= query parameter, rejecting malformed paths."""
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _shape_response(response: ProcessSessionResponse, response_format: str, fields: Optional[List[str]]) -> Any:
+    """Apply the requested format and field projection; the full, unprojected response stays a model."""
+    if response_format == "compact":
+        data = compact_response(response)
+    elif fields:
+        data = response.model_dump(mode="json")
+    else:
+        return response
+    return project(data, fields) if fields else data
+
+class BatchProcessRequest(BaseModel):
+    """Request model for processing many sessions at once."""
+    transcripts: List[SessionTranscript] = []
+    directory: Optional[str] = None  # relative to Config.TRANSCRIPT_DIR
+    max_concurrency: Optional[int] = None
+    mode: Optional[Literal["multi_call", "single_shot"]] = None
+    email_mode: Optional[Literal["llm", "template", "auto"]] = None
+    priority: Literal["interactive", "standard", "batch"] = "batch"
+
+class BulkEmailRequest(BaseModel):
+    """Request model for sending many follow-up emails."""
+    emails: List[FollowUpEmail]
+
+def _resolve_transcript_directory(directory: str) -> str:
+    """Resolve a batch directory, refusing paths outside the transcript root."""
+    root = os.path.realpath(Config.TRANSCRIPT_DIR)
+    path = os.path.realpath(os.path.join(root, directory))
+    if path != root and not path.startswith(root + os.sep):
+        raise HTTPException(status_code=400, detail="directory must be inside the transcript directory")
+    return path
+
+async def _deliver_follow_up_email(request: ProcessSessionRequest, follow_up_email: FollowUpEmail) -> Dict[str, Any]:
+    """Queue or send the follow-up email, and save the template, as the request asks; returns response fields."""
+    delivery = {}
+    email_outbox = await services.get_email_outbox()
+    if request.queue_email and email_outbox:
+        # Persist to the outbox and return right away; workers handle SMTP
+        delivery["outbox_id"] = await run_in_threadpool(email_outbox.enqueue, follow_up_email)
+    else:
+        # Send the email (SMTP is blocking, so run it in the threadpool)
+        email_service = await services.get_email_service()
+        delivery["email_sent"] = await run_in_threadpool(email_service.send_email, follow_up_email)
+    
+    # Archive the email if requested; the writer thread does the file and index work
+    if request.save_email_template:
+        email_archive = await services.get_email_archive()
+        if email_archive:
+            delivery["email_archive_id"] = await email_archive.asave(follow_up_email)
+        else:
+            email_service = await services.get_email_service()
+            delivery["email_template_path"] = await run_in_threadpool(email_service.save_email_template, follow_up_email)
+    return delivery
+
+async def _load_previous_result(session_id: str) -> Optional[Tuple[SessionTranscript, SessionSummary, Optional[FollowUpEmail]]]:
+    """Stored transcript, summary and email for a session, if any; a store failure means a full run."""
+    session_store = await services.get_session_store()
+    if not session_store:
+        return None
+    try:
+        return await run_in_threadpool(session_store.get_result, session_id)
+    except Exception as e:
+        logger.error("Error loading stored session %s: %s", session_id, e)
+        return None
+
+async def _store_session_result(
+    transcript: SessionTranscript,
+    session_summary: SessionSummary,
+    follow_up_email: Optional[FollowUpEmail]
+) -> None:
+    """Persist a processed session for later lookup; a store failure never fails the request."""
+    session_store = await services.get_session_store()
+    if not session_store:
+        return
+    try:
+        await run_in_threadpool(session_store.save, transcript, session_summary, follow_up_email)
+    except Exception as e:
+        logger.error("Error storing session %s: %s", transcript.session_id, e)
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+@app.get("/")
+async def root():
+    """Root endpoint."""
+    return {
+        "message": "Counseling Session Agent API",
+        "version": "1.0.0",
+        "status": "running"
+    }
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint."""
+    return {
+        "status": "healthy",
+        "services": services.status()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Pipeline, LLM and email metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Session scheduler queue depth, running sessions and wait times per priority class."""
+    scheduler = await services.get_scheduler()
+    if scheduler is None:
+        raise HTTPException(status_code=404, detail="Scheduler is disabled")
+    return scheduler.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """LLM response cache hit/miss counters."""
+    counseling_agent = await services.get_agent()
+    return counseling_agent.cache_stats()
+
+@asynccontextmanager
+async def _session_slot(transcript: SessionTranscript, priority: str):
+    """Hold a scheduler slot for processing a transcript; a no-op when the scheduler is disabled."""
+    scheduler = await services.get_scheduler()
+    if scheduler is None:
+        yield
+        return
+    async with scheduler.slot(priority, counselor_key(transcript)):
+        yield
+
+async def _run_process_session(request: ProcessSessionRequest) -> Tuple[ProcessSessionResponse, Dict[str, Any]]:
+    """Run the pipeline and email delivery for a request; returns the response and the timings breakdown."""
+    with track_request() as timings:
+        # Process the session without blocking the event loop
+        counseling_agent = await services.get_agent()
+        # The pipeline runs under a scheduler slot; storing and delivering the result do not hold one
+        async with _session_slot(request.transcript, request.priority):
+            previous = await _load_previous_result(request.transcript.session_id) if request.incremental else None
+            if previous:
+                result = await counseling_agent.aprocess_incremental(
+                    request.transcript, *previous, mode=request.mode, email_mode=request.email_mode
+                )
+            else:
+                result = await counseling_agent.aprocess_session(request.transcript, mode=request.mode, email_mode=request.email_mode)
+        
+        if not result.success:
+            raise HTTPException(status_code=400, detail=result.error)
+        
+        follow_up_email = result.data.follow_up_email
+        await _store_session_result(request.transcript, result.data.session_summary, follow_up_email)
+        
+        # Send email if requested and available
+        delivery = {}
+        if request.send_email and follow_up_email:
+            delivery = await _deliver_follow_up_email(request, follow_up_email)
+        
+        # Model instances pass validation by reference, so nothing is copied or re-checked here
+        response = ProcessSessionResponse(
+            success=True,
+            message=result.message,
+            session_summary=result.data.session_summary,
+            follow_up_email=follow_up_email,
+            **delivery
+        )
+        return response, timings.as_dict()
+
+@app.post("/process-session", response_model=ProcessSessionResponse, response_class=FastJSONResponse)
+async def process_session(
+    request: ProcessSessionRequest,
+    response_format: ResponseFormat = Query("full", alias="format"),
+    fields: Optional[str] = Query(None, description="Comma-separated dotted paths to return, e.g. session_summary.summary_text,outbox_id")
+):
+    """Process a counseling session transcript and generate summary and email.
+    
+    format=compact returns each piece of data once (no summary embedded in
+    the email, no derived takeaway lists); fields= trims the response to the
+    listed paths.
+    """
+    started = time.perf_counter()
+    selected_fields = _response_fields(fields)
+    try:
+        logger.info("Processing session request for session %s", request.transcript.session_id)
+        
+        # A retry of a request that is still running joins it instead of starting a second pipeline
+        key = flight_key(
+            request.transcript.session_id,
+            request.transcript.model_dump_json(),
+            request.mode, request.email_mode, request.send_email, request.queue_email,
+            request.save_email_template, request.incremental
+        )
+        response, timings = await session_flights.do(key, lambda: _run_process_session(request))
+        
+        if request.include_timings:
+            # Coalesced callers share the response object, so copy rather than mutate it
+            response = response.model_copy(update={"timings": timings})
+        return FastJSONResponse(_shape_response(response, response_format, selected_fields))
+        
+    except HTTPException:
+        raise
+    except SchedulerFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error("Error processing session: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        metrics.observe(
+            "process_session_request_duration_seconds",
+            time.perf_counter() - started,
+            "End-to-end latency of /process-session"
+        )
+
+@app.post("/process-session/stream")
+async def process_session_stream(request: ProcessSessionRequest):
+    """Process a session as a Server-Sent Events stream of stage events and summary/email tokens."""
+    logger.info("Streaming session request for session %s", request.transcript.session_id)
+    
+    async def events():
+        try:
+            follow_up_email = None
+            counseling_agent = await services.get_agent()
+            async with _session_slot(request.transcript, request.priority):
+                async for event, data in counseling_agent.astream_session(request.transcript, request.email_mode):
+                    if event == "email":
+                        follow_up_email = data
+                    yield _sse_event(event, data)
+            
+            if follow_up_email:
+                await _store_session_result(request.transcript, follow_up_email.session_summary, follow_up_email)
+            delivery = {}
+            if request.send_email and follow_up_email:
+                delivery = await _deliver_follow_up_email(request, follow_up_email)
+            yield _sse_event("done", {"success": True, **delivery})
+        except Exception as e:
+            logger.error("Error streaming session: %s", e)
+            yield _sse_event("error", {"success": False, "error": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/process-sessions/batch")
+async def process_sessions_batch(
+    request: BatchProcessRequest,
+    response_format: ResponseFormat = Query("full", alias="format"),
+    fields: Optional[str] = Query(None, description="Comma-separated dotted paths to keep in each line")
+):
+    """Process many sessions with bounded concurrency, streaming one JSON line per session as it finishes."""
+    selected_fields = _response_fields(fields)
+    transcripts = list(request.transcripts)
+    if request.directory is not None:
+        directory = _resolve_transcript_directory(request.directory)
+        try:
+            transcripts.extend(await run_in_threadpool(load_transcript_directory, directory))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if not transcripts:
+        raise HTTPException(status_code=400, detail="No transcripts provided")
+    
+    logger.info("Processing batch of %s sessions", len(transcripts))
+    
+    counseling_agent = await services.get_agent()
+    
+    async def stream_results():
+        async for transcript, result in process_batch(
+            counseling_agent, transcripts, request.max_concurrency, request.mode, request.email_mode,
+            await services.get_scheduler(), request.priority
+        ):
+            if result.success:
+                await _store_session_result(transcript, result.data.session_summary, result.data.follow_up_email)
+            record = batch_result_record(transcript, result, compact=response_format == "compact")
+            if selected_fields:
+                record = dict(project(record, selected_fields), session_id=transcript.session_id)
+            yield dumps(record) + b"\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/sessions")
+async def list_sessions(
+    student_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0)
+):
+    """Page through stored session results, newest first, filtered by student name and date range."""
+    session_store = await services.get_session_store()
+    if not session_store:
+        raise HTTPException(status_code=404, detail="Session store is disabled")
+    return await run_in_threadpool(session_store.list_sessions, student_name, date_from, date_to, limit, offset)
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Stored summary and follow-up email for a processed session."""
+    session_store = await services.get_session_store()
+    if not session_store:
+        raise HTTPException(status_code=404, detail="Session store is disabled")
+    stored = await run_in_threadpool(session_store.get, session_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Unknown session ID")
+    return stored
+
+@app.get("/emails/archive")
+async def list_archived_emails(session_id: str, limit: int = Query(50, ge=1, le=200)):
+    """Archived follow-up emails of a session, newest first."""
+    email_archive = await services.get_email_archive()
+    if not email_archive:
+        raise HTTPException(status_code=404, detail="Email archive is disabled")
+    return await run_in_threadpool(email_archive.find, session_id, limit)
+
+@app.get("/emails/archive/{archive_id}")
+async def get_archived_email(archive_id: str):
+    """One archived follow-up email; emails are written a moment after they are saved."""
+    email_archive = await services.get_email_archive()
+    if not email_archive:
+        raise HTTPException(status_code=404, detail="Email archive is disabled")
+    record = await run_in_threadpool(email_archive.get, archive_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown archive ID")
+    return record
+
+@app.post("/extract-takeaways")
+async def extract_takeaways(transcript: str):
+    """Extract key takeaways from a transcript."""
+    try:
+        counseling_agent = await services.get_agent()
+        takeaways = await counseling_agent.aextract_key_takeaways(transcript)
+        return {
+            "success": True,
+            "takeaways": takeaways
+        }
+    except Exception as e:
+        logger.error("Error extracting takeaways: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/send-email")
+async def send_email(email_data: Dict[str, Any]):
+    """Send a follow-up email."""
+    try:
+        follow_up_email = FollowUpEmail(**email_data)
+        email_service = await services.get_email_service()
+        result = await run_in_threadpool(email_service.send_email, follow_up_email)
+        
+        return {
+            "success": result["success"],
+            "email_result": result
+        }
+    except Exception as e:
+        logger.error("Error sending email: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/outbox/{outbox_id}")
+async def outbox_status(outbox_id: str):
+    """Delivery status of an email queued in the outbox."""
+    email_outbox = await services.get_email_outbox()
+    if not email_outbox:
+        raise HTTPException(status_code=404, detail="Email outbox is disabled")
+    status = await run_in_threadpool(email_outbox.get, outbox_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown outbox ID")
+    return status
+
+@app.post("/send-emails/batch")
+async def send_emails_batch(request: BulkEmailRequest):
+    """Send many follow-up emails over a few pooled SMTP sessions."""
+    try:
+        email_service = await services.get_email_service()
+        results = await run_in_threadpool(email_service.send_bulk, request.emails)
+        sent = sum(1 for result in results if result["success"])
+        
+        return {
+            "success": sent == len(results),
+            "sent": sent,
+            "failed": len(results) - sent,
+            "results": results
+        }
+    except Exception as e:
+        logger.error("Error sending emails: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    # Validate configuration
+    try:
+        Config.validate()
+    except ValueError as e:
+        logger.error("Configuration error: %s", e)
+        exit(1)
+    
+    # Run the API server
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=Config.DEBUG
     ) 
\ No newline at end of file
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Batch processing CLI for the Counseling Session Agent
+
+Processes every transcript in one or more files or directories with bounded
+concurrency and writes one JSON line per session as soon as it finishes.
+
+    python batch_process.py transcript/ --concurrency 8 --output results.jsonl
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+from counseling_agent import CounselingSessionAgent
+from batch_processor import process_batch, batch_result_record
+from transcript_loader import load_transcript_file, load_transcript_directory
+from structured_logging import configure_logging
+from config import Config
+
+def collect_transcripts(paths):
+    """Load transcripts from a mix of files and directories."""
+    transcripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            transcripts.extend(load_transcript_directory(path))
+        else:
+            transcripts.append(load_transcript_file(path))
+    return transcripts
+
+async def run(args):
+    """Process the batch and stream results to the output file."""
+    transcripts = collect_transcripts(args.paths)
+    if not transcripts:
+        print("No transcripts found.", file=sys.stderr)
+        return 1
+
+    agent = CounselingSessionAgent()
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failures = 0
+    try:
+        async for transcript, result in process_batch(agent, transcripts, args.concurrency, args.mode, args.email_mode):
+            output.write(json.dumps(batch_result_record(transcript, result, args.compact)) + "\n")
+            output.flush()
+            if not result.success:
+                failures += 1
+            status = "ok" if result.success else f"failed: {result.error}"
+            print(f"[{transcript.session_id}] {status}", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Processed {len(transcripts)} sessions ({failures} failed)", file=sys.stderr)
+    return 1 if failures else 0
+
+def main():
+    """Parse arguments and run the batch."""
+    parser = argparse.ArgumentParser(description="Process counseling session transcripts in bulk.")
+    parser.add_argument("paths", nargs="+", help="Transcript files or directories of .txt transcripts")
+    parser.add_argument("--concurrency", type=int, default=Config.BATCH_MAX_CONCURRENCY,
+                        help="Maximum sessions processed at once")
+    parser.add_argument("--mode", choices=["multi_call", "single_shot"], default=None,
+                        help="Pipeline mode (defaults to PIPELINE_MODE)")
+    parser.add_argument("--email-mode", choices=["llm", "template", "auto"], default=None,
+                        help="How follow-up emails are written (defaults to EMAIL_MODE); template skips the LLM email call")
+    parser.add_argument("--output", help="Write JSON lines here instead of stdout")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write each summary once, without the copies embedded in the email and takeaway lists")
+    args = parser.parse_args()
+    configure_logging()
+    return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
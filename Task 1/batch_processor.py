@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import AsyncIterator, Iterable, Optional, Tuple
+
+from models import SessionTranscript, AgentResponse
+from response_format import compact_result
+from scheduler import SessionScheduler, counselor_key
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+async def process_batch(
+    agent,
+    transcripts: Iterable[SessionTranscript],
+    max_concurrency: Optional[int] = None,
+    mode: Optional[str] = None,
+    email_mode: Optional[str] = None,
+    scheduler: Optional[SessionScheduler] = None,
+    priority: str = "batch"
+) -> AsyncIterator[Tuple[SessionTranscript, AgentResponse]]:
+    """Process transcripts with bounded concurrency, yielding each result as soon as it finishes.
+    
+    With a scheduler, each session also waits for a slot at the given
+    priority, so batch work shares capacity with interactive requests.
+    """
+    limit = max(1, max_concurrency or Config.BATCH_MAX_CONCURRENCY)
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(transcript: SessionTranscript) -> Tuple[SessionTranscript, AgentResponse]:
+        async with semaphore:
+            try:
+                async with scheduler.slot(priority, counselor_key(transcript)) if scheduler else nullcontext():
+                    return transcript, await agent.aprocess_session(transcript, mode=mode, email_mode=email_mode)
+            except Exception as e:
+                logger.error("Error processing session %s in batch: %s", transcript.session_id, e)
+                return transcript, AgentResponse(
+                    success=False,
+                    message="Failed to process session",
+                    error=str(e)
+                )
+
+    tasks = [asyncio.ensure_future(run(transcript)) for transcript in transcripts]
+    logger.info("Processing batch of %s sessions with concurrency %s", len(tasks), limit)
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding work if the consumer goes away (e.g. client disconnect)
+        for task in tasks:
+            task.cancel()
+
+def batch_result_record(transcript: SessionTranscript, result: AgentResponse, compact: bool = False) -> dict:
+    """JSON-serializable record for one batch result; compact drops the duplicated summary data."""
+    record = {"session_id": transcript.session_id}
+    if compact and result.data is not None:
+        record.update({"success": result.success, "message": result.message})
+        record.update(compact_result(result.data.session_summary, result.data.follow_up_email))
+        return record
+    record.update(result.model_dump(mode="json"))
+    return record
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the Counseling Session Agent
+
+Drives process_session and the FastAPI app at several concurrency levels
+against the deterministic fake LLM backend (no API key needed) and reports
+throughput and latency percentiles. Sessions are synthesized from the
+transcript/ fixtures.
+
+    python benchmark.py --sessions 200 --concurrency 1,8,32 --latency 0.5 --jitter 0.1
+
+With --startup it instead measures cold start in fresh interpreters: the
+time to import the API module and the latency of the first request.
+
+    python benchmark.py --startup --runs 5
+
+With --parser it micro-benchmarks prompt rendering and takeaway parsing
+over large synthetic responses against the previous str.format / per-line
+implementations.
+
+    python benchmark.py --parser --items 2000 --repeat 50
+
+With --serialization it measures the per-request cost of turning pipeline
+outputs into the /process-session response body, comparing the previous
+dict round-trips and FastAPI re-encoding with the typed pipeline and the
+single-pass JSON response.
+
+    python benchmark.py --serialization --items 50 --repeat 200
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+from typing import List
+
+from config import Config
+from models import SessionTranscript
+from transcript_loader import load_transcript_directory
+
+def synthesize_sessions(count: int, length_multiplier: int = 1, directory: str = None) -> List[SessionTranscript]:
+    """Build count unique sessions by cycling the fixture transcripts.
+
+    Each session gets its own ID and a tagged transcript so the response
+    cache cannot short-circuit the pipeline; length_multiplier repeats the
+    conversation to simulate longer sessions.
+    """
+    fixtures = load_transcript_directory(directory or Config.TRANSCRIPT_DIR)
+    if not fixtures:
+        raise ValueError("No transcript fixtures found")
+    sessions = []
+    for index in range(count):
+        fixture = fixtures[index % len(fixtures)]
+        text = "\n\n".join([fixture.transcript] * max(1, length_multiplier))
+        sessions.append(fixture.model_copy(update={
+            "session_id": f"bench_{index:05d}",
+            "date": datetime(2025, 1, 1) + timedelta(minutes=index),
+            "transcript": f"{text}\n\nCounselor: (session {index})"
+        }))
+    return sessions
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(pct / 100 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+def report(target: str, concurrency: int, latencies: List[float], failures: int, elapsed: float):
+    """Print one result row."""
+    completed = len(latencies)
+    print(
+        f"{target:<6} {concurrency:>11} {completed:>9} {failures:>8} "
+        f"{completed / elapsed if elapsed else 0:>12.2f} "
+        f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 95) * 1000:>9.1f} "
+        f"{percentile(latencies, 99) * 1000:>9.1f}"
+    )
+
+async def run_load(call, sessions: List[SessionTranscript], concurrency: int):
+    """Run call(session) for every session with at most concurrency in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(session):
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            ok = await call(session)
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(session) for session in sessions))
+    return latencies, failures, time.perf_counter() - started
+
+async def bench_agent(sessions, concurrency_levels, mode):
+    """Benchmark CounselingSessionAgent.aprocess_session directly."""
+    from counseling_agent import CounselingSessionAgent
+
+    agent = CounselingSessionAgent()
+
+    async def call(session):
+        result = await agent.aprocess_session(session, mode=mode)
+        return result.success
+
+    for concurrency in concurrency_levels:
+        report("agent", concurrency, *await run_load(call, sessions, concurrency))
+
+async def bench_api(sessions, concurrency_levels, mode):
+    """Benchmark POST /process-session through the ASGI app in-process."""
+    try:
+        import httpx
+    except ImportError:
+        print("httpx is required for the API benchmark (pip install httpx)", file=sys.stderr)
+        return
+    import api
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def call(session):
+            response = await client.post("/process-session", json={
+                "transcript": session.model_dump(mode="json"),
+                "mode": mode,
+                "send_email": False,
+                # Sessions are stored after the first level; later levels must still run the pipeline
+                "incremental": False
+            })
+            return response.status_code == 200
+
+        for concurrency in concurrency_levels:
+            report("api", concurrency, *await run_load(call, sessions, concurrency))
+
+STARTUP_PROBE = """
+import sys, json, time, asyncio
+started = time.perf_counter()
+import api
+imported = time.perf_counter()
+import httpx
+
+async def first_request():
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        request_started = time.perf_counter()
+        response = await client.post("/process-session", json=json.loads(sys.argv[1]))
+        return time.perf_counter() - request_started, response.status_code
+
+first_request_seconds, status = asyncio.run(first_request())
+print(json.dumps({"import_seconds": imported - started, "first_request_seconds": first_request_seconds, "status": status}))
+"""
+
+def bench_startup(runs: int, backend: str):
+    """Measure API import time and first-request latency in fresh interpreters."""
+    session = synthesize_sessions(1)[0]
+    body = json.dumps({"transcript": session.model_dump(mode="json"), "send_email": False, "incremental": False})
+    env = dict(os.environ, LLM_BACKEND=backend, FAKE_LLM_LATENCY="0", FAKE_LLM_JITTER="0",
+               LLM_CACHE_ENABLED="False", EMAIL_OUTBOX_ENABLED="False", LOG_LEVEL="WARNING")
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    print(f"Cold start over {runs} runs ({backend} backend, zero LLM latency)")
+    print(f"{'run':>3} {'process s':>10} {'import s':>9} {'first request s':>16} {'status':>7}")
+    for run in range(1, runs + 1):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE, body],
+            cwd=here, env=env, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        total = time.perf_counter() - started
+        result = json.loads(output)
+        print(f"{run:>3} {total:>10.3f} {result['import_seconds']:>9.3f} "
+              f"{result['first_request_seconds']:>16.3f} {result['status']:>7}")
+
+def legacy_parse_takeaways(response_text: str) -> dict:
+    """The per-line startswith/lstrip parser the regex parser replaced, kept as a baseline."""
+    career_goals = []
+    action_items = []
+    current_section = None
+    for line in response_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.lower().startswith("career goals"):
+            current_section = "career_goals"
+            continue
+        if line.lower().startswith("action items"):
+            current_section = "action_items"
+            continue
+        if current_section and (line.startswith('-') or line.startswith('•') or line[0:1].isdigit() or line.startswith('*')):
+            item = line.lstrip('-•*0123456789. ').strip()
+            if item:
+                if current_section == "career_goals":
+                    career_goals.append(item)
+                elif current_section == "action_items":
+                    action_items.append(item)
+    return {"career_goals": career_goals, "action_items": action_items}
+
+def synthesize_takeaways_response(items: int) -> str:
+    """A large extraction response: items bullets spread over all five sections, mixed bullet styles."""
+    headings = ["Career Goals", "Action Items", "Concerns", "Achievements", "Insights"]
+    bullets = ["- ", "* ", "• ", "1. "]
+    lines = ["Here is what I found in the transcript:", ""]
+    for section, heading in enumerate(headings):
+        lines.append(heading)
+        for index in range(items // len(headings)):
+            lines.append(f"{bullets[index % len(bullets)]}Item {section}-{index} about building a career in field {index % 97}")
+        lines.append("")
+    return "\n".join(lines)
+
+def time_call(func, repeat: int) -> float:
+    """Best-of-three average seconds per call."""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+def bench_parser(items: int, repeat: int):
+    """Compare prompt rendering and takeaway parsing with the previous implementations."""
+    from prompts import render_prompt, parse_takeaways, TEMPLATE_SOURCES
+
+    response = synthesize_takeaways_response(items)
+    parsed = parse_takeaways(response)
+    legacy = legacy_parse_takeaways(response)
+    print(f"Takeaway parsing over {len(response) / 1024:.0f} KiB, {items} bullets "
+          f"(regex parser finds {sum(len(v) for v in parsed.values())}, legacy {sum(len(v) for v in legacy.values())})")
+    regex_seconds = time_call(lambda: parse_takeaways(response), repeat)
+    legacy_seconds = time_call(lambda: legacy_parse_takeaways(response), repeat)
+    print(f"  legacy per-line parser {legacy_seconds * 1000:>9.3f} ms")
+    print(f"  precompiled regex      {regex_seconds * 1000:>9.3f} ms  ({legacy_seconds / regex_seconds:.2f}x)")
+
+    session = synthesize_sessions(1)[0]
+    format_template = "Summarize the following conversation between two people:\n\n{transcript}"
+    print(f"Prompt rendering ({len(session.transcript)} character transcript)")
+    format_seconds = time_call(lambda: format_template.format(transcript=session.transcript), repeat * 100)
+    jinja_seconds = time_call(lambda: render_prompt("summarize", transcript=session.transcript), repeat * 100)
+    print(f"  str.format             {format_seconds * 1e6:>9.2f} us")
+    print(f"  precompiled Jinja2     {jinja_seconds * 1e6:>9.2f} us")
+    action_items = [f"Action item {index}" for index in range(20)]
+    email_seconds = time_call(lambda: render_prompt(
+        "email", student_name="Student", student_email="s@example.com",
+        session_summary=session.transcript[:2000], action_items=action_items
+    ), repeat * 100)
+    print(f"  email template (20 action items) {email_seconds * 1e6:.2f} us; {len(TEMPLATE_SOURCES)} templates compiled at import")
+
+def legacy_response_body(transcript: SessionTranscript, key_takeaways: dict, summary_text: str, email_body: str) -> bytes:
+    """The previous path: validated construction, .dict() hand-off, model rebuilds and FastAPI re-encoding."""
+    from typing import Any, Dict, Optional
+    from pydantic import BaseModel
+    from fastapi.encoders import jsonable_encoder
+    from models import SessionSummary, FollowUpEmail, KeyTakeaway
+
+    class LegacyProcessSessionResponse(BaseModel):
+        success: bool
+        message: str
+        session_summary: Optional[Dict[str, Any]] = None
+        follow_up_email: Optional[Dict[str, Any]] = None
+        email_sent: Optional[Dict[str, Any]] = None
+        outbox_id: Optional[str] = None
+        email_template_path: Optional[str] = None
+        timings: Optional[Dict[str, Any]] = None
+        error: Optional[str] = None
+
+    student = next(p for p in transcript.participants if p.role == "student")
+    session_summary = SessionSummary(
+        session_id=transcript.session_id,
+        student_name=student.name,
+        date=transcript.date,
+        key_takeaways=[KeyTakeaway(category=c, content=i, priority="medium") for c, items in key_takeaways.items() for i in items],
+        career_goals=key_takeaways["career_goals"],
+        action_items=key_takeaways["action_items"],
+        concerns_addressed=key_takeaways["concerns"],
+        next_steps=key_takeaways["action_items"],
+        summary_text=summary_text
+    )
+    follow_up_email = FollowUpEmail(to_email="student@example.com", subject=f"Follow-up: Career Counseling Session - {transcript.date.strftime('%B %d, %Y')}", body=email_body, session_summary=session_summary)
+    data = {"session_summary": session_summary.model_dump(), "follow_up_email": follow_up_email.model_dump(), "key_takeaways": key_takeaways}
+    FollowUpEmail(**data["follow_up_email"])  # rebuilt to send
+    FollowUpEmail(**data["follow_up_email"])  # rebuilt again to save / store
+    SessionSummary(**data["session_summary"])
+    response = LegacyProcessSessionResponse(success=True, message="ok", **{k: data[k] for k in ("session_summary", "follow_up_email")})
+    # FastAPI: dump the returned model, validate it against response_model, jsonable_encoder, json.dumps
+    validated = LegacyProcessSessionResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def typed_response_body(agent_class, transcript: SessionTranscript, key_takeaways: dict, summary_text: str, email_body: str) -> bytes:
+    """The typed path: models passed through by reference, one serialization."""
+    from api import ProcessSessionResponse
+    from json_response import dumps
+
+    session_summary = agent_class._build_session_summary(transcript, key_takeaways, summary_text)
+    follow_up_email = agent_class._build_email(session_summary, "student@example.com", email_body)
+    result = agent_class._build_response(session_summary, follow_up_email, key_takeaways)
+    response = ProcessSessionResponse(
+        success=True, message="ok",
+        session_summary=result.data.session_summary, follow_up_email=result.data.follow_up_email
+    )
+    return dumps(response)
+
+def bench_serialization(items: int, repeat: int):
+    """Compare the per-request cost of building the /process-session response body."""
+    from counseling_agent import CounselingSessionAgent
+    from prompts import parse_takeaways
+    from json_response import orjson
+
+    transcript = synthesize_sessions(1)[0]
+    key_takeaways = parse_takeaways(synthesize_takeaways_response(items))
+    summary_text = transcript.transcript[:1500]
+    email_body = transcript.transcript[:1200]
+    legacy_body = legacy_response_body(transcript, key_takeaways, summary_text, email_body)
+    typed_body = typed_response_body(CounselingSessionAgent, transcript, key_takeaways, summary_text, email_body)
+    print(f"Response body for {items} takeaways: legacy {len(legacy_body)} bytes, typed {len(typed_body)} bytes"
+          f" (orjson {'installed' if orjson else 'not installed'})")
+    legacy_seconds = time_call(lambda: legacy_response_body(transcript, key_takeaways, summary_text, email_body), repeat)
+    typed_seconds = time_call(lambda: typed_response_body(CounselingSessionAgent, transcript, key_takeaways, summary_text, email_body), repeat)
+    print(f"  dict round-trips + FastAPI encoding {legacy_seconds * 1e6:>9.1f} us/request")
+    print(f"  typed models + single-pass JSON     {typed_seconds * 1e6:>9.1f} us/request  ({legacy_seconds / typed_seconds:.1f}x)")
+
+def main():
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the counseling pipeline against a fake LLM backend.")
+    parser.add_argument("--sessions", type=int, default=100, help="Sessions per concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--target", choices=["agent", "api", "both"], default="both")
+    parser.add_argument("--mode", choices=["multi_call", "single_shot"], default=None)
+    parser.add_argument("--email-mode", choices=["llm", "template", "auto"], default=None,
+                        help="Follow-up email mode (defaults to EMAIL_MODE)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Fake LLM latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake LLM calls failing with a simulated 429")
+    parser.add_argument("--length-multiplier", type=int, default=1, help="Repeat each fixture to lengthen transcripts")
+    parser.add_argument("--cache", action="store_true", help="Keep the LLM response cache enabled")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="Upload each transcript once as cached context and report the input tokens saved")
+    parser.add_argument("--startup", action="store_true", help="Measure cold start instead of throughput")
+    parser.add_argument("--runs", type=int, default=5, help="Cold start runs (with --startup)")
+    parser.add_argument("--parser", action="store_true", help="Micro-benchmark prompt rendering and response parsing")
+    parser.add_argument("--serialization", action="store_true", help="Micro-benchmark building the /process-session response body")
+    parser.add_argument("--items", type=int, default=2000, help="Bullets in the synthetic response (with --parser / --serialization)")
+    parser.add_argument("--repeat", type=int, default=50, help="Iterations per measurement (with --parser / --serialization)")
+    parser.add_argument("--startup-backend", choices=["fake", "gemini"], default="fake",
+                        help="Backend constructed during the cold start measurement")
+    args = parser.parse_args()
+
+    if args.startup:
+        bench_startup(args.runs, args.startup_backend)
+        return
+    if args.parser:
+        bench_parser(args.items, args.repeat)
+        return
+    if args.serialization:
+        bench_serialization(args.items, args.repeat)
+        return
+
+    # Configure before the agent (and the API module) are built
+    Config.LLM_BACKEND = "fake"
+    Config.FAKE_LLM_LATENCY = args.latency
+    Config.FAKE_LLM_JITTER = args.jitter
+    Config.FAKE_LLM_ERROR_RATE = args.error_rate
+    Config.LLM_CACHE_ENABLED = args.cache
+    Config.EMAIL_OUTBOX_ENABLED = False
+    Config.CONTEXT_CACHE_ENABLED = args.context_cache
+    if args.email_mode:
+        Config.EMAIL_MODE = args.email_mode
+
+    sessions = synthesize_sessions(args.sessions, args.length_multiplier)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    print(f"{len(sessions)} sessions, fake LLM latency {args.latency}s +/- {args.jitter}s, "
+          f"error rate {args.error_rate:.0%}, mode {args.mode or Config.PIPELINE_MODE}, email mode {Config.EMAIL_MODE}")
+    print(f"{'target':<6} {'concurrency':>11} {'completed':>9} {'failures':>8} {'sessions/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    if args.target in ("agent", "both"):
+        asyncio.run(bench_agent(sessions, concurrency_levels, args.mode))
+    if args.target in ("api", "both"):
+        asyncio.run(bench_api(sessions, concurrency_levels, args.mode))
+    if args.context_cache:
+        from metrics import metrics
+        saved = metrics.counter_value("context_cache_tokens_saved_total")
+        runs = len(sessions) * len(concurrency_levels) * (2 if args.target == "both" else 1)
+        print(f"Context caching saved {saved:.0f} input tokens ({saved / runs:.0f} per session run)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import zlib
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip is offered
+    brotli = None
+
+# Already compressed, or streamed event by event where buffering would hurt
+EXCLUDED_CONTENT_TYPES = ("text/event-stream", "application/gzip", "application/zip", "image/", "audio/", "video/")
+
+# Bodies at least this large are compressed off the event loop
+THREAD_MINIMUM_SIZE = 256 * 1024
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br when the client accepts it and brotli is installed, else gzip, else nothing."""
+    accepted = {}
+    for entry in accept_encoding.lower().split(","):
+        name, _, params = entry.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+class _Compressor:
+    """Incremental gzip or brotli stream."""
+
+    def __init__(self, encoding: str):
+        """Start a compression stream."""
+        self.encoding = encoding
+        if encoding == "br":
+            self._stream = brotli.Compressor(quality=Config.BROTLI_QUALITY)
+        else:
+            self._stream = zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, body: bytes, final: bool) -> bytes:
+        """Compress a chunk; non-final chunks are flushed so streamed lines reach the client."""
+        if self.encoding == "br":
+            data = self._stream.process(body)
+            return data + (self._stream.finish() if final else self._stream.flush())
+        data = self._stream.compress(body)
+        return data + self._stream.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    async def acompress(self, body: bytes, final: bool) -> bytes:
+        """compress, moved to the threadpool for large bodies."""
+        if len(body) >= THREAD_MINIMUM_SIZE:
+            return await run_in_threadpool(self.compress, body, final)
+        return self.compress(body, final)
+
+class CompressionMiddleware:
+    """Compress responses with br or gzip, whichever the client accepts (br only if brotli is installed).
+
+    Single-body responses smaller than minimum_size are sent as is. Streamed
+    responses such as the batch NDJSON are compressed chunk by chunk with a
+    flush after each, so results still arrive as they finish.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = None):
+        """Wrap an ASGI app."""
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else Config.RESPONSE_COMPRESSION_MIN_BYTES
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Negotiate an encoding and compress the response if one was agreed."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").lower()
+                passthrough = "content-encoding" in headers or any(
+                    content_type.startswith(excluded) for excluded in EXCLUDED_CONTENT_TYPES
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                # First body message: decide whether to compress at all
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                body = await compressor.acompress(body, final=not more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            body = await compressor.acompress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,30 +1,104 @@
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-class Config:
-    """Configuration class for the counseling session agent."""
-    
-    # Google Gemini Configuration
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-    
-    # Email Service Configuration
-    SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.mailslurp.com")
-    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-    SMTP_USERNAME = os.getenv("SMTP_USERNAME")
-    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-    
-    # Application Configuration
-    DEBUG = os.getenv("DEBUG", "True").lower() == "true"
-    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-    
-    @classmethod
-    def validate(cls):
-        """Validate that required configuration is present."""
-        if not cls.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY is required")
-        if not cls.SMTP_USERNAME or not cls.SMTP_PASSWORD:
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+class Config:
+    """Configuration class for the counseling session agent."""
+    
+    # Google Gemini Configuration
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" or "fake" (offline, for tests and benchmarks)
+    FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+    FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.1"))
+    FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))  # fraction of calls failing with a simulated 429
+    PIPELINE_MODE = os.getenv("PIPELINE_MODE", "multi_call")  # "multi_call" or "single_shot"
+    CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "8000"))  # longer transcripts are map-reduced
+    CHUNK_MAX_CONCURRENCY = int(os.getenv("CHUNK_MAX_CONCURRENCY", "4"))
+    EMAIL_MODE = os.getenv("EMAIL_MODE", "llm")  # "llm", "template" (no LLM call) or "auto" (LLM, template if it fails or is slow)
+    EMAIL_LLM_TIMEOUT_SECONDS = float(os.getenv("EMAIL_LLM_TIMEOUT_SECONDS", "20"))  # auto mode's wait before using the template
+    CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "False").lower() == "true"  # upload each transcript once as cached context
+    CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))  # Gemini's minimum cacheable size
+    CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "300"))
+    GEMINI_CONTEXT_CACHE_MODEL = os.getenv("GEMINI_CONTEXT_CACHE_MODEL", "gemini-2.0-flash-001")  # caching needs a pinned model version
+    
+    # Gemini Quota Configuration (client-side rate limiting and retries)
+    GEMINI_RATE_LIMIT_ENABLED = os.getenv("GEMINI_RATE_LIMIT_ENABLED", "True").lower() == "true"
+    GEMINI_RPM = float(os.getenv("GEMINI_RPM", "2000"))  # requests per minute; 0 disables the budget
+    GEMINI_TPM = float(os.getenv("GEMINI_TPM", "4000000"))  # tokens per minute; 0 disables the budget
+    GEMINI_INITIAL_CONCURRENCY = int(os.getenv("GEMINI_INITIAL_CONCURRENCY", "8"))
+    GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "64"))
+    GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+    GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "1"))
+    GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "30"))
+    
+    # Email Service Configuration
+    SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.mailslurp.com")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+    SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+    SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "True").lower() == "true"  # disable for local SMTP stand-ins
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+    SMTP_POOL_IDLE_TIMEOUT = int(os.getenv("SMTP_POOL_IDLE_TIMEOUT", "60"))
+    
+    # Email Outbox Configuration
+    EMAIL_OUTBOX_ENABLED = os.getenv("EMAIL_OUTBOX_ENABLED", "True").lower() == "true"
+    EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", "outbox/email_outbox.db")
+    EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "2"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+    EMAIL_OUTBOX_BACKOFF_SECONDS = float(os.getenv("EMAIL_OUTBOX_BACKOFF_SECONDS", "2"))
+    EMAIL_OUTBOX_RETENTION_SECONDS = float(os.getenv("EMAIL_OUTBOX_RETENTION_SECONDS", "604800"))  # sent/failed rows older than this are deleted; 0 keeps them
+    
+    # Email Archive Configuration (saved follow-up emails as rotated gzip JSONL segments)
+    EMAIL_ARCHIVE_ENABLED = os.getenv("EMAIL_ARCHIVE_ENABLED", "True").lower() == "true"
+    EMAIL_ARCHIVE_DIR = os.getenv("EMAIL_ARCHIVE_DIR", "emails/archive")  # segments plus index.db
+    EMAIL_ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("EMAIL_ARCHIVE_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))  # compressed size before rotating
+    EMAIL_ARCHIVE_QUEUE_SIZE = int(os.getenv("EMAIL_ARCHIVE_QUEUE_SIZE", "10000"))  # saves buffered for the writer thread
+    
+    # LLM Response Cache Configuration
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")  # e.g. cache/llm_responses.db; unset keeps the cache in memory only
+    LLM_CACHE_DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "10000"))
+    
+    # Session Result Store Configuration
+    SESSION_STORE_ENABLED = os.getenv("SESSION_STORE_ENABLED", "True").lower() == "true"
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "data/sessions.db")
+    
+    # Response Compression Configuration (br is offered only when the brotli package is installed)
+    RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "True").lower() == "true"
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+    
+    # Session Scheduler Configuration (priority classes, per-counselor fairness, global cap)
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "True").lower() == "true"
+    SCHEDULER_MAX_CONCURRENT = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "32"))  # sessions processed at once across all requests
+    SCHEDULER_INTERACTIVE_RESERVED = int(os.getenv("SCHEDULER_INTERACTIVE_RESERVED", "4"))  # slots batch/standard work may not take
+    SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", "10000"))  # 0 means unbounded
+    
+    # Batch Processing Configuration
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "transcript")
+    
+    # Application Configuration
+    DEBUG = os.getenv("DEBUG", "True").lower() == "true"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" (one event per line) or "text"
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records beyond this are dropped, not waited on
+    LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "llm.prompt=0.01,llm.response=0.01")  # category=fraction kept
+    LOG_REDACT_FIELDS = os.getenv("LOG_REDACT_FIELDS", "to_email,student_email,password,api_key")
+    LOG_REDACT_EMAILS = os.getenv("LOG_REDACT_EMAILS", "True").lower() == "true"  # mask addresses inside logged text
+    PRELOAD_AGENT = os.getenv("PRELOAD_AGENT", "True").lower() == "true"  # build the agent in the background at startup
+    
+    @classmethod
+    def validate(cls):
+        """Validate that required configuration is present."""
+        if cls.LLM_BACKEND == "gemini" and not cls.GEMINI_API_KEY:
+            raise ValueError("GEMINI_API_KEY is required")
+        if not cls.SMTP_USERNAME or not cls.SMTP_PASSWORD:
             print("Warning: SMTP credentials not configured. Email sending will be mocked.") 
\ No newline at end of file
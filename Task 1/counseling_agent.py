@@ -1,261 +1,1052 @@
-import json
-import logging
-from typing import List, Dict, Any
-from datetime import datetime
-
-import google.generativeai as genai
-
-from models import (
-    SessionTranscript, 
-    SessionSummary, 
-    FollowUpEmail, 
-    KeyTakeaway,
-    AgentResponse
-)
-from config import Config
-
-# Configure logging
-logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
-logger = logging.getLogger(__name__)
-
-class CounselingSessionAgent:
-    """AI Agent for processing counseling session transcripts and generating summaries and follow-up emails."""
-    
-    def __init__(self):
-        """Initialize the counseling session agent."""
-        # Configure Gemini
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
-        
-        # Initialize prompt templates
-        self._setup_prompts()
-        
-    def _setup_prompts(self):
-        """Setup prompt templates for different tasks."""
-        # Prompt for extracting key takeaways (Colab style)
-        self.extract_takeaways_prompt = """
-From the following transcript, identify and list:
-1. Career Goals mentioned by the participants.
-2. Action Items that the participants decided to take.
-
-Format the output clearly with headings for \"Career Goals\" and \"Action Items\".
-
-Transcript:
-{transcript}
-"""
-        
-        # Prompt for generating session summary
-        self.summary_prompt = """You are a professional career counselor. Create a comprehensive session summary based on the extracted information.
-
-The summary should be:
-- Professional yet warm in tone
-- Structured and easy to read
-- Focused on the student's progress and next steps
-- 2-3 paragraphs in length
-
-Include:
-- Key discussion points
-- Career goals identified
-- Action items and deadlines
-- Next steps for both student and counselor
-- Any resources or tools mentioned
-
-Write in a way that would be helpful for both the student and the counselor's records.
-
-Student: {student_name}
-Session Date: {session_date}
-Key Information: {key_info}
-
-Please generate a session summary."""
-        
-        # Prompt for generating follow-up email
-        self.email_prompt = """You are a career counselor writing a follow-up email to a student after a counseling session.
-
-Write a friendly, personalized email that:
-- Acknowledges the session and thanks the student
-- Summarizes key points discussed
-- Lists specific action items and deadlines
-- Offers encouragement and support
-- Provides next steps
-- Maintains a warm, professional tone
-
-The email should be:
-- Personalized to the student
-- Action-oriented
-- Encouraging and supportive
-- Clear about next steps
-- Professional but friendly
-
-Keep it concise (2-3 paragraphs) but comprehensive.
-
-Student Name: {student_name}
-Student Email: {student_email}
-Session Summary: {session_summary}
-Key Action Items: {action_items}
-
-Generate a follow-up email."""
-    
-    def _call_gemini(self, prompt: str) -> str:
-        """Call Gemini API with a prompt and return the response."""
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            logger.error(f"Error calling Gemini API: {e}")
-            raise
-    
-    def extract_key_takeaways(self, transcript: str) -> Dict[str, list]:
-        """Extract key takeaways from the session transcript using a robust, heading-based approach."""
-        try:
-            prompt = self.extract_takeaways_prompt.format(transcript=transcript)
-            logger.info(f"Sending prompt to Gemini: {prompt[:200]}...")
-            response_text = self._call_gemini(prompt)
-            # print("[DEBUG] Raw Gemini response for key takeaways:", response_text)
-            logger.info(f"Raw Gemini response: {response_text}")
-            # Parse the response by headings
-            career_goals = []
-            action_items = []
-            current_section = None
-            for line in response_text.splitlines():
-                line = line.strip()
-                if not line:
-                    continue
-                if line.lower().startswith("career goals"):
-                    current_section = "career_goals"
-                    continue
-                if line.lower().startswith("action items"):
-                    current_section = "action_items"
-                    continue
-                if current_section and (line.startswith('-') or line.startswith('•') or line[0:1].isdigit() or line.startswith('*')):
-                    # Remove bullet or number
-                    item = line.lstrip('-•*0123456789. ').strip()
-                    if item:
-                        if current_section == "career_goals":
-                            career_goals.append(item)
-                        elif current_section == "action_items":
-                            action_items.append(item)
-            # Fallback if nothing found
-            if not career_goals:
-                career_goals = ["Career goal extraction failed"]
-            if not action_items:
-                action_items = ["Action item extraction failed"]
-            return {
-                "career_goals": career_goals,
-                "action_items": action_items,
-                "concerns": [],
-                "achievements": [],
-                "insights": []
-            }
-        except Exception as e:
-            logger.error(f"Error extracting key takeaways: {e}")
-            return {
-                "career_goals": ["Career goal extraction failed"],
-                "action_items": ["Action item extraction failed"],
-                "concerns": [],
-                "achievements": [],
-                "insights": []
-            }
-    
-    def generate_session_summary(self, transcript: SessionTranscript, key_takeaways: Dict[str, List[str]]) -> SessionSummary:
-        """Generate a session summary using a simple Gemini prompt."""
-        # Find student name
-        student_name = next((p.name for p in transcript.participants if p.role == "student"), "Student")
-        # Create key takeaways objects
-        key_takeaways_objects = []
-        for category, items in key_takeaways.items():
-            for item in items:
-                key_takeaways_objects.append(KeyTakeaway(
-                    category=category,
-                    content=item,
-                    priority="medium"
-                ))
-        # Use the simple summarization prompt only
-        simple_prompt = f"Summarize the following conversation between two people:\n\n{transcript.transcript}"
-        summary_text = self._call_gemini(simple_prompt)
-        return SessionSummary(
-            session_id=transcript.session_id,
-            student_name=student_name,
-            date=transcript.date,
-            key_takeaways=key_takeaways_objects,
-            career_goals=key_takeaways.get("career_goals", []),
-            action_items=key_takeaways.get("action_items", []),
-            concerns_addressed=key_takeaways.get("concerns", []),
-            next_steps=key_takeaways.get("action_items", []),  # Use action items as next steps
-            summary_text=summary_text
-        )
-    
-    def generate_follow_up_email(self, session_summary: SessionSummary, student_email: str) -> FollowUpEmail:
-        """Generate a personalized follow-up email."""
-        try:
-            # Create subject line
-            subject = f"Follow-up: Career Counseling Session - {session_summary.date.strftime('%B %d, %Y')}"
-            
-            # Generate email body
-            action_items_text = "\n".join([f"• {item}" for item in session_summary.action_items])
-            
-            prompt = self.email_prompt.format(
-                student_name=session_summary.student_name,
-                student_email=student_email,
-                session_summary=session_summary.summary_text,
-                action_items=action_items_text
-            )
-            
-            email_body = self._call_gemini(prompt)
-            
-            return FollowUpEmail(
-                to_email=student_email,
-                subject=subject,
-                body=email_body,
-                session_summary=session_summary
-            )
-            
-        except Exception as e:
-            logger.error(f"Error generating follow-up email: {e}")
-            raise
-    
-    def process_session(self, transcript: SessionTranscript) -> AgentResponse:
-        """Process a counseling session transcript and generate summary and email."""
-        try:
-            logger.info(f"Processing session {transcript.session_id}")
-            
-            # Extract key takeaways
-            key_takeaways = self.extract_key_takeaways(transcript.transcript)
-            logger.info(f"Extracted {sum(len(v) for v in key_takeaways.values())} key takeaways")
-            
-            # Generate session summary
-            session_summary = self.generate_session_summary(transcript, key_takeaways)
-            logger.info("Generated session summary")
-            
-            # Find student email
-            student_email = next((p.email for p in transcript.participants if p.role == "student"), None)
-            
-            # Generate follow-up email if student email is available
-            follow_up_email = None
-            if student_email:
-                follow_up_email = self.generate_follow_up_email(session_summary, student_email)
-                logger.info("Generated follow-up email")
-            
-            return AgentResponse(
-                success=True,
-                message="Session processed successfully",
-                data={
-                    "session_summary": session_summary.dict(),
-                    "follow_up_email": follow_up_email.dict() if follow_up_email else None,
-                    "key_takeaways": key_takeaways
-                }
-            )
-            
-        except Exception as e:
-            logger.error(f"Error processing session: {e}")
-            return AgentResponse(
-                success=False,
-                message="Failed to process session",
-                error=str(e)
-            )
-
-def simple_gemini_summary(transcript, api_key, model_name="gemini-2.0-flash"):
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(model_name)
-    prompt = f"Summarize the following conversation between two people:\n\n{transcript}"
-    response = model.generate_content(prompt)
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from datetime import datetime
+
+from models import (
+    SessionTranscript, 
+    SessionSummary, 
+    FollowUpEmail, 
+    KeyTakeaway,
+    AgentResponse,
+    SessionResult,
+    StructuredSessionOutput
+)
+from config import Config
+from response_cache import ResponseCache, build_response_cache, make_cache_key
+from transcript_chunker import estimate_tokens, chunk_transcript
+from metrics import metrics, timed, timed_stage, record_llm_call, record_stage
+from prompts import render_prompt, parse_takeaways, CAREER_GOALS_FAILED, ACTION_ITEMS_FAILED, EXTRACTION_FAILED_PLACEHOLDERS
+from llm_backends import LLMBackend, LLMContext, LLMResult, build_backend
+from rate_limiter import LLMRateLimiter, build_rate_limiter
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+class CounselingSessionAgent:
+    """AI Agent for processing counseling session transcripts and generating summaries and follow-up emails."""
+    
+    # Single-shot mode asks Gemini for a JSON document instead of free text
+    SINGLE_SHOT_CONFIG = {"response_mime_type": "application/json"}
+    
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        backend: Optional[LLMBackend] = None,
+        rate_limiter: Optional[LLMRateLimiter] = None
+    ):
+        """Initialize the counseling session agent."""
+        # LLM backend (Gemini unless LLM_BACKEND selects the offline fake)
+        self.backend = backend if backend is not None else build_backend()
+        
+        # Client-side RPM/TPM budget, adaptive concurrency and retries; None calls the backend directly
+        self.rate_limiter = rate_limiter if rate_limiter is not None else build_rate_limiter()
+        
+        # Response cache keyed on (model, prompt); None disables caching
+        self.cache = cache if cache is not None else build_response_cache()
+        self._llm_calls = 0
+        self._llm_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        
+        
+    def _cache_key(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None) -> Optional[str]:
+        """Content-addressed cache key for a call, or None when caching is disabled."""
+        if self.cache is None:
+            return None
+        options = (json.dumps(generation_config, sort_keys=True),) if generation_config else ()
+        if context is not None:
+            options += (context.digest,)
+        return make_cache_key(self.backend.model_name, prompt, *options)
+    
+    def _cache_lookup(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None):
+        """Return (cache_key, cached_response); both are None when caching is disabled."""
+        cache_key = self._cache_key(prompt, generation_config, context)
+        return cache_key, self.cache.get(cache_key) if cache_key is not None else None
+    
+    async def _acache_lookup(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None):
+        """Async variant of _cache_lookup; disk tiers are read off the event loop."""
+        cache_key = self._cache_key(prompt, generation_config, context)
+        return cache_key, await self.cache.aget(cache_key) if cache_key is not None else None
+    
+    def _record_llm_call(self, cache_key: Optional[str], result: LLMResult, started: float, stage: str = None):
+        """Store a fresh response in the cache (pass cache_key=None to skip) and record LLM latency and token usage."""
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._llm_calls += 1
+            self._llm_seconds += elapsed
+        record_llm_call(elapsed, result.prompt_tokens, result.response_tokens, stage=stage, cached_tokens=result.cached_tokens)
+        if cache_key is not None:
+            self.cache.set(cache_key, result.text)
+    
+    @staticmethod
+    def _used_tokens(result: LLMResult) -> int:
+        """Tokens a call counted against the per-minute budget."""
+        return result.prompt_tokens + result.response_tokens
+    
+    def _call_gemini(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        context: Optional[LLMContext] = None
+    ) -> str:
+        """Call the LLM backend (Gemini by default) with a prompt, optionally after a cached context, and return the response."""
+        cache_key, cached = self._cache_lookup(prompt, generation_config, context)
+        if cached is not None:
+            record_llm_call(0.0, 0, 0, cache_hit=True)
+            return cached
+        try:
+            started = time.perf_counter()
+            if self.rate_limiter is None:
+                result = self.backend.generate(prompt, generation_config, context)
+            else:
+                result = self.rate_limiter.call(
+                    lambda: self.backend.generate(prompt, generation_config, context),
+                    estimate_tokens(prompt) + (context.tokens if context else 0),
+                    self._used_tokens
+                )
+            self._record_llm_call(cache_key, result, started)
+            if context is not None:
+                context.record_use(result.cached_tokens)
+            return result.text
+        except Exception as e:
+            logger.error("Error calling Gemini API: %s", e)
+            raise
+    
+    async def _acall_gemini(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        context: Optional[LLMContext] = None
+    ) -> str:
+        """Call Gemini API asynchronously so the event loop is never blocked."""
+        cache_key, cached = await self._acache_lookup(prompt, generation_config, context)
+        if cached is not None:
+            record_llm_call(0.0, 0, 0, cache_hit=True)
+            return cached
+        try:
+            started = time.perf_counter()
+            if self.rate_limiter is None:
+                result = await self.backend.agenerate(prompt, generation_config, context)
+            else:
+                result = await self.rate_limiter.acall(
+                    lambda: self.backend.agenerate(prompt, generation_config, context),
+                    estimate_tokens(prompt) + (context.tokens if context else 0),
+                    self._used_tokens
+                )
+            self._record_llm_call(None, result, started)
+            if cache_key is not None:
+                await self.cache.aset(cache_key, result.text)
+            if context is not None:
+                context.record_use(result.cached_tokens)
+            return result.text
+        except Exception as e:
+            logger.error("Error calling Gemini API: %s", e)
+            raise
+    
+    async def _astream_gemini(self, prompt: str, stage: str) -> AsyncIterator[str]:
+        """Stream a response from the LLM backend; a cache hit is served as a single piece."""
+        cache_key, cached = await self._acache_lookup(prompt)
+        if cached is not None:
+            record_llm_call(0.0, 0, 0, cache_hit=True, stage=stage)
+            yield cached
+            return
+        started = time.perf_counter()
+        pieces = []
+        if self.rate_limiter is None:
+            stream = self.backend.astream(prompt)
+        else:
+            stream = self.rate_limiter.astream(lambda: self.backend.astream(prompt), estimate_tokens(prompt))
+        try:
+            async for piece in stream:
+                pieces.append(piece)
+                yield piece
+        except Exception as e:
+            logger.error("Error calling Gemini API: %s", e)
+            raise
+        text = "".join(pieces)
+        self._record_llm_call(None, LLMResult(text, estimate_tokens(prompt), estimate_tokens(text)), started, stage)
+        if cache_key is not None:
+            await self.cache.aset(cache_key, text)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return response cache counters and the estimated LLM time saved by cache hits."""
+        if self.cache is None:
+            return {"enabled": False}
+        stats = self.cache.stats()
+        average_call_seconds = self._llm_seconds / self._llm_calls if self._llm_calls else 0.0
+        stats["enabled"] = True
+        stats["llm_calls"] = self._llm_calls
+        stats["average_llm_call_seconds"] = round(average_call_seconds, 4)
+        stats["estimated_seconds_saved"] = round(stats["hits"] * average_call_seconds, 4)
+        return stats
+    
+    @staticmethod
+    def _failed_takeaways() -> Dict[str, list]:
+        """Fallback takeaways used when extraction fails."""
+        return {
+            "career_goals": [CAREER_GOALS_FAILED],
+            "action_items": [ACTION_ITEMS_FAILED],
+            "concerns": [],
+            "achievements": [],
+            "insights": []
+        }
+    
+    @staticmethod
+    def _parse_takeaways(response_text: str) -> Dict[str, list]:
+        """Parse a heading-based takeaways response into categories."""
+        return parse_takeaways(response_text)
+    
+    def _chunk(self, transcript: str) -> Optional[List[str]]:
+        """Split a transcript over the token budget into speaker-turn windows; None if it fits in one prompt."""
+        if estimate_tokens(transcript) <= Config.CHUNK_TOKEN_BUDGET:
+            return None
+        chunks = chunk_transcript(transcript, Config.CHUNK_TOKEN_BUDGET)
+        logger.info("Transcript split into %s chunks", len(chunks))
+        return chunks
+    
+    @staticmethod
+    def _merge_takeaways(parts: List[Dict[str, list]]) -> Dict[str, list]:
+        """Merge per-chunk takeaways, dropping duplicates and per-chunk failure placeholders."""
+        merged = CounselingSessionAgent._failed_takeaways()
+        placeholders = {item for items in merged.values() for item in items}
+        for category in merged:
+            seen = set()
+            items = []
+            for part in parts:
+                for item in part.get(category, []):
+                    key = item.strip().lower()
+                    if item in placeholders or key in seen:
+                        continue
+                    seen.add(key)
+                    items.append(item)
+            if items:
+                merged[category] = items
+        return merged
+    
+    def _extraction_prompt(self, transcript: str, context: Optional[LLMContext]) -> str:
+        """The extraction prompt, or just its instruction when the transcript is a cached context."""
+        if context is not None:
+            return render_prompt("context_extract_takeaways")
+        return render_prompt("extract_takeaways", transcript=transcript)
+    
+    def _extract_chunk(self, transcript: str, context: Optional[LLMContext] = None) -> Dict[str, list]:
+        """Run takeaway extraction over a transcript that fits in one prompt."""
+        try:
+            prompt = self._extraction_prompt(transcript, context)
+            log_event(logger, logging.DEBUG, "llm_prompt", category="llm.prompt", stage="extract", prompt=prompt, prompt_chars=len(prompt))
+            response_text = self._call_gemini(prompt, context=context)
+            log_event(logger, logging.DEBUG, "llm_response", category="llm.response", stage="extract", response=response_text, response_chars=len(response_text))
+            return self._parse_takeaways(response_text)
+        except Exception as e:
+            logger.error("Error extracting key takeaways: %s", e)
+            return self._failed_takeaways()
+    
+    async def _aextract_chunk(self, transcript: str, context: Optional[LLMContext] = None) -> Dict[str, list]:
+        """Async variant of _extract_chunk."""
+        try:
+            prompt = self._extraction_prompt(transcript, context)
+            log_event(logger, logging.DEBUG, "llm_prompt", category="llm.prompt", stage="extract", prompt=prompt, prompt_chars=len(prompt))
+            response_text = await self._acall_gemini(prompt, context=context)
+            log_event(logger, logging.DEBUG, "llm_response", category="llm.response", stage="extract", response=response_text, response_chars=len(response_text))
+            return self._parse_takeaways(response_text)
+        except Exception as e:
+            logger.error("Error extracting key takeaways: %s", e)
+            return self._failed_takeaways()
+    
+    async def _gather_limited(self, coroutines: list) -> list:
+        """Await coroutines concurrently, at most CHUNK_MAX_CONCURRENCY at a time, preserving order."""
+        semaphore = asyncio.Semaphore(Config.CHUNK_MAX_CONCURRENCY)
+        
+        async def limited(coroutine):
+            async with semaphore:
+                return await coroutine
+        
+        return await asyncio.gather(*(limited(coroutine) for coroutine in coroutines))
+    
+    @timed("extract_takeaways")
+    def extract_key_takeaways(self, transcript: str, context: Optional[LLMContext] = None) -> Dict[str, list]:
+        """Extract key takeaways from the session transcript using a robust, heading-based approach.
+        
+        Long transcripts are extracted chunk by chunk in parallel and merged.
+        With a context holding the transcript, only the instruction is sent.
+        """
+        if context is not None:
+            return self._extract_chunk(transcript, context)
+        chunks = self._chunk(transcript)
+        if not chunks:
+            return self._extract_chunk(transcript)
+        with ThreadPoolExecutor(max_workers=min(len(chunks), Config.CHUNK_MAX_CONCURRENCY)) as executor:
+            parts = list(executor.map(self._extract_chunk, chunks))
+        return self._merge_takeaways(parts)
+    
+    @timed("extract_takeaways")
+    async def aextract_key_takeaways(self, transcript: str, context: Optional[LLMContext] = None) -> Dict[str, list]:
+        """Async variant of extract_key_takeaways."""
+        if context is not None:
+            return await self._aextract_chunk(transcript, context)
+        chunks = self._chunk(transcript)
+        if not chunks:
+            return await self._aextract_chunk(transcript)
+        parts = await self._gather_limited([self._aextract_chunk(chunk) for chunk in chunks])
+        return self._merge_takeaways(parts)
+    
+    @staticmethod
+    def _build_summary_prompt(transcript: SessionTranscript) -> str:
+        """Build the summarization prompt for a transcript."""
+        return render_prompt("summarize", transcript=transcript.transcript)
+    
+    @staticmethod
+    def _build_session_summary(transcript: SessionTranscript, key_takeaways: Dict[str, List[str]], summary_text: str) -> SessionSummary:
+        """Assemble a SessionSummary from takeaways and generated summary text."""
+        # Find student name
+        student_name = next((p.name for p in transcript.participants if p.role == "student"), "Student")
+        # Create key takeaways objects
+        key_takeaways_objects = []
+        for category, items in key_takeaways.items():
+            for item in items:
+                key_takeaways_objects.append(KeyTakeaway(
+                    category=category,
+                    content=item,
+                    priority="medium"
+                ))
+        return SessionSummary(
+            session_id=transcript.session_id,
+            student_name=student_name,
+            date=transcript.date,
+            key_takeaways=key_takeaways_objects,
+            career_goals=key_takeaways.get("career_goals", []),
+            action_items=key_takeaways.get("action_items", []),
+            concerns_addressed=key_takeaways.get("concerns", []),
+            next_steps=key_takeaways.get("action_items", []),  # Use action items as next steps
+            summary_text=summary_text
+        )
+    
+    @staticmethod
+    def _build_chunk_summary_prompts(chunks: List[str]) -> List[str]:
+        """Build the map-stage prompts for a chunked transcript."""
+        return [
+            render_prompt("chunk_summary", part=index, total=len(chunks), transcript=chunk)
+            for index, chunk in enumerate(chunks, start=1)
+        ]
+    
+    @staticmethod
+    def _build_combine_prompt(partial_summaries: List[str]) -> str:
+        """Build the reduce-stage prompt that merges partial summaries."""
+        return render_prompt("combine_summaries", partial_summaries=partial_summaries)
+    
+    @timed("summarize")
+    def summarize_transcript(self, transcript: SessionTranscript, context: Optional[LLMContext] = None) -> str:
+        """Generate the summary text; depends only on the transcript, not on the takeaways.
+        
+        Long transcripts are summarized chunk by chunk in parallel, then combined.
+        With a context holding the transcript, only the instruction is sent.
+        """
+        if context is not None:
+            return self._call_gemini(render_prompt("context_summary"), context=context)
+        chunks = self._chunk(transcript.transcript)
+        if not chunks:
+            return self._call_gemini(self._build_summary_prompt(transcript))
+        with ThreadPoolExecutor(max_workers=min(len(chunks), Config.CHUNK_MAX_CONCURRENCY)) as executor:
+            partial_summaries = list(executor.map(self._call_gemini, self._build_chunk_summary_prompts(chunks)))
+        return self._call_gemini(self._build_combine_prompt(partial_summaries))
+    
+    @timed("summarize")
+    async def asummarize_transcript(self, transcript: SessionTranscript, context: Optional[LLMContext] = None) -> str:
+        """Async variant of summarize_transcript."""
+        if context is not None:
+            return await self._acall_gemini(render_prompt("context_summary"), context=context)
+        chunks = self._chunk(transcript.transcript)
+        if not chunks:
+            return await self._acall_gemini(self._build_summary_prompt(transcript))
+        partial_summaries = await self._gather_limited(
+            [self._acall_gemini(prompt) for prompt in self._build_chunk_summary_prompts(chunks)]
+        )
+        return await self._acall_gemini(self._build_combine_prompt(partial_summaries))
+    
+    def generate_session_summary(self, transcript: SessionTranscript, key_takeaways: Dict[str, List[str]]) -> SessionSummary:
+        """Generate a session summary using a simple Gemini prompt."""
+        summary_text = self.summarize_transcript(transcript)
+        return self._build_session_summary(transcript, key_takeaways, summary_text)
+    
+    async def agenerate_session_summary(self, transcript: SessionTranscript, key_takeaways: Dict[str, List[str]]) -> SessionSummary:
+        """Async variant of generate_session_summary."""
+        summary_text = await self.asummarize_transcript(transcript)
+        return self._build_session_summary(transcript, key_takeaways, summary_text)
+    
+    async def astream_summary_text(self, transcript: SessionTranscript) -> AsyncIterator[str]:
+        """Streaming variant of summarize_transcript; long transcripts stream the combine step."""
+        chunks = self._chunk(transcript.transcript)
+        if not chunks:
+            prompt = self._build_summary_prompt(transcript)
+        else:
+            partial_summaries = await self._gather_limited(
+                [self._acall_gemini(prompt) for prompt in self._build_chunk_summary_prompts(chunks)]
+            )
+            prompt = self._build_combine_prompt(partial_summaries)
+        async for piece in self._astream_gemini(prompt, "summarize"):
+            yield piece
+    
+    @staticmethod
+    def _build_email_subject(session_summary: SessionSummary) -> str:
+        """Build the follow-up email subject line."""
+        return f"Follow-up: Career Counseling Session - {session_summary.date.strftime('%B %d, %Y')}"
+    
+    @classmethod
+    def _build_email(cls, session_summary: SessionSummary, student_email: str, body: str, generated_by: str = "llm") -> FollowUpEmail:
+        """Assemble a FollowUpEmail around an existing SessionSummary; the summary instance is reused, not re-validated."""
+        return FollowUpEmail(
+            to_email=student_email,
+            subject=cls._build_email_subject(session_summary),
+            body=body,
+            session_summary=session_summary,
+            generated_by=generated_by
+        )
+    
+    @staticmethod
+    def _build_email_prompt(session_summary: SessionSummary, student_email: str) -> str:
+        """Build the follow-up email prompt."""
+        return render_prompt(
+            "email",
+            student_name=session_summary.student_name,
+            student_email=student_email,
+            session_summary=session_summary.summary_text,
+            action_items=session_summary.action_items
+        )
+    
+    @timed("generate_email")
+    def generate_follow_up_email(self, session_summary: SessionSummary, student_email: str) -> FollowUpEmail:
+        """Generate a personalized follow-up email."""
+        try:
+            email_body = self._call_gemini(self._build_email_prompt(session_summary, student_email))
+            
+            return self._build_email(session_summary, student_email, email_body)
+            
+        except Exception as e:
+            logger.error("Error generating follow-up email: %s", e)
+            raise
+    
+    @timed("generate_email")
+    async def agenerate_follow_up_email(self, session_summary: SessionSummary, student_email: str) -> FollowUpEmail:
+        """Async variant of generate_follow_up_email."""
+        try:
+            email_body = await self._acall_gemini(self._build_email_prompt(session_summary, student_email))
+            
+            return self._build_email(session_summary, student_email, email_body)
+            
+        except Exception as e:
+            logger.error("Error generating follow-up email: %s", e)
+            raise
+    
+    async def astream_email_body(self, session_summary: SessionSummary, student_email: str) -> AsyncIterator[str]:
+        """Streaming variant of generate_follow_up_email that yields the body as it is written."""
+        async for piece in self._astream_gemini(self._build_email_prompt(session_summary, student_email), "generate_email"):
+            yield piece
+    
+    @staticmethod
+    def _counselor_name(transcript: SessionTranscript) -> Optional[str]:
+        """Find the counselor's name among the participants."""
+        return next((p.name for p in transcript.participants if p.role == "counselor"), None)
+    
+    @timed("template_email")
+    def generate_template_email(self, session_summary: SessionSummary, student_email: str, counselor_name: Optional[str] = None) -> FollowUpEmail:
+        """Render the follow-up email from the summary's goals, action items and text; no LLM call."""
+        body = render_prompt(
+            "template_email",
+            student_name=session_summary.student_name,
+            session_date=session_summary.date.strftime('%B %d, %Y'),
+            summary_text=session_summary.summary_text.strip(),
+            career_goals=[goal for goal in session_summary.career_goals if goal not in EXTRACTION_FAILED_PLACEHOLDERS],
+            action_items=[item for item in session_summary.action_items if item not in EXTRACTION_FAILED_PLACEHOLDERS],
+            counselor_name=counselor_name or "Your Career Counselor"
+        )
+        return self._build_email(session_summary, student_email, body, generated_by="template")
+    
+    @staticmethod
+    def _record_email_fallback(session_summary: SessionSummary, error: Exception):
+        """Count and log an auto-mode email that fell back to the template."""
+        reason = "timeout" if isinstance(error, (TimeoutError, asyncio.TimeoutError)) else type(error).__name__
+        metrics.inc("email_template_fallbacks_total", 1, "Follow-up emails rendered from the template after the LLM failed or was too slow", reason=reason)
+        logger.warning("LLM email for session %s unavailable (%s), using the template", session_summary.session_id, reason)
+    
+    def _follow_up_email(
+        self,
+        session_summary: SessionSummary,
+        student_email: str,
+        email_mode: Optional[str] = None,
+        counselor_name: Optional[str] = None
+    ) -> FollowUpEmail:
+        """Write the follow-up email as email_mode asks.
+        
+        "llm" asks Gemini, "template" renders it locally, and "auto" asks
+        Gemini but falls back to the template when the call fails or takes
+        longer than EMAIL_LLM_TIMEOUT_SECONDS.
+        """
+        email_mode = email_mode or Config.EMAIL_MODE
+        if email_mode == "template":
+            return self.generate_template_email(session_summary, student_email, counselor_name)
+        if email_mode != "auto":
+            return self.generate_follow_up_email(session_summary, student_email)
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            future = executor.submit(self.generate_follow_up_email, session_summary, student_email)
+            return future.result(timeout=Config.EMAIL_LLM_TIMEOUT_SECONDS)
+        except Exception as e:
+            self._record_email_fallback(session_summary, e)
+            return self.generate_template_email(session_summary, student_email, counselor_name)
+        finally:
+            # A timed-out call finishes in the background; its result is discarded
+            executor.shutdown(wait=False)
+    
+    async def _afollow_up_email(
+        self,
+        session_summary: SessionSummary,
+        student_email: str,
+        email_mode: Optional[str] = None,
+        counselor_name: Optional[str] = None
+    ) -> FollowUpEmail:
+        """Async variant of _follow_up_email; a timed-out LLM call is cancelled."""
+        email_mode = email_mode or Config.EMAIL_MODE
+        if email_mode == "template":
+            return self.generate_template_email(session_summary, student_email, counselor_name)
+        if email_mode != "auto":
+            return await self.agenerate_follow_up_email(session_summary, student_email)
+        try:
+            return await asyncio.wait_for(
+                self.agenerate_follow_up_email(session_summary, student_email),
+                Config.EMAIL_LLM_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            self._record_email_fallback(session_summary, e)
+            return self.generate_template_email(session_summary, student_email, counselor_name)
+    
+    @staticmethod
+    def _student_email(transcript: SessionTranscript) -> Optional[str]:
+        """Find the student's email address among the participants."""
+        return next((p.email for p in transcript.participants if p.role == "student"), None)
+    
+    @staticmethod
+    def _build_response(session_summary: SessionSummary, follow_up_email: Optional[FollowUpEmail], key_takeaways: Dict[str, list]) -> AgentResponse:
+        """Wrap pipeline outputs in a successful AgentResponse, keeping them as models."""
+        return AgentResponse(
+            success=True,
+            message="Session processed successfully",
+            data=SessionResult(
+                session_summary=session_summary,
+                follow_up_email=follow_up_email,
+                key_takeaways=key_takeaways
+            )
+        )
+    
+    def _wants_context(self, transcript: SessionTranscript) -> bool:
+        """Cache the transcript as a context when enabled, supported, and it is large enough to be worth it but not chunked."""
+        if not Config.CONTEXT_CACHE_ENABLED or not self.backend.supports_context:
+            return False
+        tokens = estimate_tokens(transcript.transcript)
+        return Config.CONTEXT_CACHE_MIN_TOKENS <= tokens <= Config.CHUNK_TOKEN_BUDGET
+    
+    def _record_context(self, context: LLMContext, started: float):
+        """Count the one-time upload of a context."""
+        record_llm_call(time.perf_counter() - started, context.tokens, 0, stage="create_context")
+    
+    def _report_context_savings(self, transcript: SessionTranscript, context: LLMContext):
+        """Record the input tokens a session saved by reading its transcript from a context."""
+        saved = context.tokens_saved()
+        metrics.inc("context_cache_tokens_saved_total", saved, "Input tokens saved by context caching, net of uploads")
+        metrics.observe("context_cache_tokens_saved_per_session", saved, "Input tokens saved by context caching per session")
+        logger.info("Context caching saved %s input tokens for session %s", saved, transcript.session_id)
+    
+    def _create_transcript_context(self, transcript: SessionTranscript) -> Optional[LLMContext]:
+        """Register the transcript as a cached context, or None to send it inline."""
+        if not self._wants_context(transcript):
+            return None
+        try:
+            started = time.perf_counter()
+            with timed_stage("create_context"):
+                context = self.backend.create_context(
+                    render_prompt("transcript_context", transcript=transcript.transcript), Config.CONTEXT_CACHE_TTL_SECONDS
+                )
+            self._record_context(context, started)
+            return context
+        except Exception as e:
+            logger.warning("Context caching unavailable for session %s, sending the transcript inline: %s", transcript.session_id, e)
+            return None
+    
+    async def _acreate_transcript_context(self, transcript: SessionTranscript) -> Optional[LLMContext]:
+        """Async variant of _create_transcript_context."""
+        if not self._wants_context(transcript):
+            return None
+        try:
+            started = time.perf_counter()
+            with timed_stage("create_context"):
+                context = await self.backend.acreate_context(
+                    render_prompt("transcript_context", transcript=transcript.transcript), Config.CONTEXT_CACHE_TTL_SECONDS
+                )
+            self._record_context(context, started)
+            return context
+        except Exception as e:
+            logger.warning("Context caching unavailable for session %s, sending the transcript inline: %s", transcript.session_id, e)
+            return None
+    
+    def _release_transcript_context(self, transcript: SessionTranscript, context: Optional[LLMContext]):
+        """Report savings and delete the context; it would expire at its TTL anyway."""
+        if context is None:
+            return
+        self._report_context_savings(transcript, context)
+        try:
+            self.backend.delete_context(context)
+        except Exception as e:
+            logger.warning("Could not delete context %s: %s", context.handle, e)
+    
+    async def _arelease_transcript_context(self, transcript: SessionTranscript, context: Optional[LLMContext]):
+        """Async variant of _release_transcript_context."""
+        if context is None:
+            return
+        self._report_context_savings(transcript, context)
+        try:
+            await self.backend.adelete_context(context)
+        except Exception as e:
+            logger.warning("Could not delete context %s: %s", context.handle, e)
+    
+    def _process_multi_call(self, transcript: SessionTranscript, email_mode: Optional[str] = None) -> AgentResponse:
+        """Run the three-call pipeline: takeaways and summary concurrently, then the email."""
+        try:
+            # Takeaway extraction and summarization are independent, so run them side by side;
+            # both read the transcript from one cached context when context caching applies
+            context = self._create_transcript_context(transcript)
+            try:
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    takeaways_future = executor.submit(self.extract_key_takeaways, transcript.transcript, context)
+                    summary_future = executor.submit(self.summarize_transcript, transcript, context)
+                    key_takeaways = takeaways_future.result()
+                    summary_text = summary_future.result()
+            finally:
+                self._release_transcript_context(transcript, context)
+            logger.info("Extracted %s key takeaways", sum(len(v) for v in key_takeaways.values()))
+            
+            # Assemble session summary
+            session_summary = self._build_session_summary(transcript, key_takeaways, summary_text)
+            logger.info("Generated session summary")
+            
+            # Generate follow-up email if student email is available
+            student_email = self._student_email(transcript)
+            follow_up_email = None
+            if student_email:
+                follow_up_email = self._follow_up_email(session_summary, student_email, email_mode, self._counselor_name(transcript))
+                logger.info("Generated follow-up email")
+            
+            return self._build_response(session_summary, follow_up_email, key_takeaways)
+            
+        except Exception as e:
+            logger.error("Error processing session: %s", e)
+            return AgentResponse(
+                success=False,
+                message="Failed to process session",
+                error=str(e)
+            )
+    
+    async def _aprocess_multi_call(self, transcript: SessionTranscript, email_mode: Optional[str] = None) -> AgentResponse:
+        """Async variant of _process_multi_call."""
+        try:
+            # Takeaway extraction and summarization are independent, so run them concurrently;
+            # only the follow-up email needs both results. Both read the transcript from one
+            # cached context when context caching applies
+            context = await self._acreate_transcript_context(transcript)
+            try:
+                key_takeaways, summary_text = await asyncio.gather(
+                    self.aextract_key_takeaways(transcript.transcript, context),
+                    self.asummarize_transcript(transcript, context)
+                )
+            finally:
+                await self._arelease_transcript_context(transcript, context)
+            logger.info("Extracted %s key takeaways", sum(len(v) for v in key_takeaways.values()))
+            
+            # Assemble session summary
+            session_summary = self._build_session_summary(transcript, key_takeaways, summary_text)
+            logger.info("Generated session summary")
+            
+            # Generate follow-up email if student email is available
+            student_email = self._student_email(transcript)
+            follow_up_email = None
+            if student_email:
+                follow_up_email = await self._afollow_up_email(session_summary, student_email, email_mode, self._counselor_name(transcript))
+                logger.info("Generated follow-up email")
+            
+            return self._build_response(session_summary, follow_up_email, key_takeaways)
+            
+        except Exception as e:
+            logger.error("Error processing session: %s", e)
+            return AgentResponse(
+                success=False,
+                message="Failed to process session",
+                error=str(e)
+            )
+
+    def _build_single_shot_prompt(self, transcript: SessionTranscript, email_mode: Optional[str] = None) -> str:
+        """Build the prompt asking for takeaways, summary and email as one JSON document.
+        
+        In template email mode the email is left out, so the model does not write prose that is thrown away.
+        """
+        student_name = next((p.name for p in transcript.participants if p.role == "student"), "Student")
+        return render_prompt(
+            "single_shot",
+            include_email=bool(self._student_email(transcript)) and (email_mode or Config.EMAIL_MODE) != "template",
+            student_name=student_name,
+            session_date=transcript.date.strftime('%B %d, %Y'),
+            transcript=transcript.transcript
+        )
+    
+    @staticmethod
+    def _parse_single_shot(response_text: str) -> StructuredSessionOutput:
+        """Validate the single-shot JSON response, tolerating a markdown code fence."""
+        text = response_text.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[1] if "\n" in text else ""
+            text = text.rsplit("```", 1)[0]
+        return StructuredSessionOutput.model_validate_json(text)
+    
+    def _single_shot_response(self, transcript: SessionTranscript, output: StructuredSessionOutput, email_mode: Optional[str] = None) -> AgentResponse:
+        """Turn a validated single-shot output into the same AgentResponse the multi-call pipeline returns."""
+        key_takeaways = {
+            "career_goals": output.career_goals,
+            "action_items": output.action_items,
+            "concerns": output.concerns,
+            "achievements": output.achievements,
+            "insights": output.insights
+        }
+        session_summary = self._build_session_summary(transcript, key_takeaways, output.summary_text)
+        student_email = self._student_email(transcript)
+        follow_up_email = None
+        if student_email and output.email_body and (email_mode or Config.EMAIL_MODE) != "template":
+            follow_up_email = self._build_email(session_summary, student_email, output.email_body)
+        elif student_email:
+            follow_up_email = self.generate_template_email(session_summary, student_email, self._counselor_name(transcript))
+        return self._build_response(session_summary, follow_up_email, key_takeaways)
+    
+    @timed("single_shot")
+    def _process_single_shot(self, transcript: SessionTranscript, email_mode: Optional[str] = None) -> Optional[AgentResponse]:
+        """Process a session with one structured-output call; None means fall back to multi-call."""
+        try:
+            response_text = self._call_gemini(self._build_single_shot_prompt(transcript, email_mode), self.SINGLE_SHOT_CONFIG)
+            output = self._parse_single_shot(response_text)
+        except Exception as e:
+            logger.warning("Single-shot processing failed for session %s: %s", transcript.session_id, e)
+            return None
+        if self._student_email(transcript) and not output.email_body and (email_mode or Config.EMAIL_MODE) == "llm":
+            logger.warning("Single-shot output for session %s has no email body", transcript.session_id)
+            return None
+        return self._single_shot_response(transcript, output, email_mode)
+    
+    @timed("single_shot")
+    async def _aprocess_single_shot(self, transcript: SessionTranscript, email_mode: Optional[str] = None) -> Optional[AgentResponse]:
+        """Async variant of _process_single_shot."""
+        try:
+            response_text = await self._acall_gemini(self._build_single_shot_prompt(transcript, email_mode), self.SINGLE_SHOT_CONFIG)
+            output = self._parse_single_shot(response_text)
+        except Exception as e:
+            logger.warning("Single-shot processing failed for session %s: %s", transcript.session_id, e)
+            return None
+        if self._student_email(transcript) and not output.email_body and (email_mode or Config.EMAIL_MODE) == "llm":
+            logger.warning("Single-shot output for session %s has no email body", transcript.session_id)
+            return None
+        return self._single_shot_response(transcript, output, email_mode)
+    
+    def _use_single_shot(self, transcript: SessionTranscript, mode: Optional[str]) -> bool:
+        """Single-shot needs the whole transcript in one prompt, so long sessions use the chunked pipeline."""
+        if (mode or Config.PIPELINE_MODE) != "single_shot":
+            return False
+        if estimate_tokens(transcript.transcript) > Config.CHUNK_TOKEN_BUDGET:
+            logger.info("Session %s exceeds the chunk token budget, using the chunked multi-call pipeline", transcript.session_id)
+            return False
+        return True
+    
+    @staticmethod
+    def _participant_keys(transcript: SessionTranscript) -> List[tuple]:
+        """Participants as comparable (role, name, email) tuples."""
+        return sorted((p.role, p.name, p.email or "") for p in transcript.participants)
+    
+    def _transcript_delta(self, transcript: SessionTranscript, previous_transcript: SessionTranscript) -> Optional[str]:
+        """Text appended to a previously processed transcript, "" if unchanged, or None if it was not a pure append.
+        
+        Changed participants or date also return None: the student name,
+        date and email address of the previous result would be stale. A
+        delta too long for one prompt returns None too, since a full run
+        costs about the same.
+        """
+        if transcript.session_id != previous_transcript.session_id:
+            return None
+        if transcript.date != previous_transcript.date:
+            return None
+        if self._participant_keys(transcript) != self._participant_keys(previous_transcript):
+            return None
+        previous_text = previous_transcript.transcript.rstrip()
+        if not transcript.transcript.startswith(previous_text):
+            return None
+        delta = transcript.transcript[len(previous_text):].strip()
+        if estimate_tokens(delta) > Config.CHUNK_TOKEN_BUDGET:
+            return None
+        return delta
+    
+    @staticmethod
+    def _takeaways_from_summary(session_summary: SessionSummary) -> Dict[str, list]:
+        """Rebuild the takeaways dict from a stored SessionSummary."""
+        key_takeaways = {"career_goals": [], "action_items": [], "concerns": [], "achievements": [], "insights": []}
+        for takeaway in session_summary.key_takeaways:
+            key_takeaways.setdefault(takeaway.category, []).append(takeaway.content)
+        return key_takeaways
+    
+    def _build_update_summary_prompt(self, previous_summary: SessionSummary, delta: str) -> str:
+        """Build the prompt that folds appended exchanges into the previous summary."""
+        return render_prompt("update_summary", previous_summary=previous_summary.summary_text, transcript=delta)
+    
+    @timed("summarize")
+    def update_summary_text(self, previous_summary: SessionSummary, delta: str) -> str:
+        """Fold appended exchanges into the previous summary text."""
+        return self._call_gemini(self._build_update_summary_prompt(previous_summary, delta))
+    
+    @timed("summarize")
+    async def aupdate_summary_text(self, previous_summary: SessionSummary, delta: str) -> str:
+        """Async variant of update_summary_text."""
+        return await self._acall_gemini(self._build_update_summary_prompt(previous_summary, delta))
+    
+    @staticmethod
+    def _log_incremental(transcript: SessionTranscript, delta: str):
+        """Record how much of the transcript an incremental run avoided sending."""
+        metrics.inc("incremental_sessions_total", 1, "Sessions re-processed from an appended delta")
+        metrics.inc(
+            "incremental_tokens_skipped_total",
+            max(0, estimate_tokens(transcript.transcript) - estimate_tokens(delta)),
+            "Estimated transcript tokens not re-sent thanks to incremental processing"
+        )
+        logger.info("Incrementally processing session %s (%s new tokens)", transcript.session_id, estimate_tokens(delta))
+    
+    @staticmethod
+    def _email_reusable(previous_email: Optional[FollowUpEmail], student_email: Optional[str], email_mode: Optional[str]) -> bool:
+        """Whether a stored email fits this request: same address, written the way email_mode asks.
+        
+        "auto" accepts either kind; emails stored without generated_by predate template mode and came from the LLM.
+        """
+        if previous_email is None or previous_email.to_email != student_email:
+            return False
+        email_mode = email_mode or Config.EMAIL_MODE
+        return email_mode == "auto" or (previous_email.generated_by or "llm") == email_mode
+    
+    def _reuse_previous_summary(self, transcript: SessionTranscript, previous_summary: SessionSummary) -> Tuple[SessionSummary, Dict[str, list]]:
+        """Summary and takeaways for an unchanged transcript, rebuilt from the previous result without any LLM calls."""
+        logger.info("Session %s is unchanged, reusing the previous result", transcript.session_id)
+        key_takeaways = self._takeaways_from_summary(previous_summary)
+        return self._build_session_summary(transcript, key_takeaways, previous_summary.summary_text), key_takeaways
+    
+    def _reuse_previous_result(
+        self,
+        transcript: SessionTranscript,
+        previous_summary: SessionSummary,
+        previous_email: Optional[FollowUpEmail],
+        email_mode: Optional[str] = None
+    ) -> AgentResponse:
+        """Result for an unchanged transcript; the email is only rewritten if the stored one does not fit the request."""
+        session_summary, key_takeaways = self._reuse_previous_summary(transcript, previous_summary)
+        student_email = self._student_email(transcript)
+        follow_up_email = None
+        if self._email_reusable(previous_email, student_email, email_mode):
+            follow_up_email = previous_email.model_copy(update={"session_summary": session_summary})
+        elif student_email:
+            follow_up_email = self._follow_up_email(session_summary, student_email, email_mode, self._counselor_name(transcript))
+        return self._incremental_response(session_summary, follow_up_email, key_takeaways)
+    
+    async def _areuse_previous_result(
+        self,
+        transcript: SessionTranscript,
+        previous_summary: SessionSummary,
+        previous_email: Optional[FollowUpEmail],
+        email_mode: Optional[str] = None
+    ) -> AgentResponse:
+        """Async variant of _reuse_previous_result."""
+        session_summary, key_takeaways = self._reuse_previous_summary(transcript, previous_summary)
+        student_email = self._student_email(transcript)
+        follow_up_email = None
+        if self._email_reusable(previous_email, student_email, email_mode):
+            follow_up_email = previous_email.model_copy(update={"session_summary": session_summary})
+        elif student_email:
+            follow_up_email = await self._afollow_up_email(session_summary, student_email, email_mode, self._counselor_name(transcript))
+        return self._incremental_response(session_summary, follow_up_email, key_takeaways)
+    
+    def _incremental_response(
+        self,
+        session_summary: SessionSummary,
+        follow_up_email: Optional[FollowUpEmail],
+        key_takeaways: Dict[str, list]
+    ) -> AgentResponse:
+        """Wrap an incremental result, noting how it was produced."""
+        response = self._build_response(session_summary, follow_up_email, key_takeaways)
+        response.message = "Session processed incrementally"
+        return response
+    
+    def process_incremental(
+        self,
+        transcript: SessionTranscript,
+        previous_transcript: SessionTranscript,
+        previous_summary: SessionSummary,
+        previous_email: Optional[FollowUpEmail] = None,
+        mode: Optional[str] = None,
+        email_mode: Optional[str] = None
+    ) -> AgentResponse:
+        """Re-process a session whose transcript was appended to, sending only the new exchanges.
+        
+        Takeaways are extracted from the delta and merged into the previous
+        ones, and the previous summary is updated rather than regenerated.
+        An unchanged transcript reuses the previous result, rewriting only
+        the email when the stored one was not written the way email_mode
+        asks; anything other than an append falls back to process_session.
+        """
+        delta = self._transcript_delta(transcript, previous_transcript)
+        if delta is None:
+            return self.process_session(transcript, mode, email_mode)
+        try:
+            if not delta:
+                return self._reuse_previous_result(transcript, previous_summary, previous_email, email_mode)
+            self._log_incremental(transcript, delta)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                takeaways_future = executor.submit(self.extract_key_takeaways, delta)
+                summary_future = executor.submit(self.update_summary_text, previous_summary, delta)
+                key_takeaways = self._merge_takeaways([self._takeaways_from_summary(previous_summary), takeaways_future.result()])
+                summary_text = summary_future.result()
+            
+            session_summary = self._build_session_summary(transcript, key_takeaways, summary_text)
+            student_email = self._student_email(transcript)
+            follow_up_email = None
+            if student_email:
+                follow_up_email = self._follow_up_email(session_summary, student_email, email_mode, self._counselor_name(transcript))
+            return self._incremental_response(session_summary, follow_up_email, key_takeaways)
+        except Exception as e:
+            logger.error("Error incrementally processing session: %s", e)
+            return AgentResponse(
+                success=False,
+                message="Failed to process session",
+                error=str(e)
+            )
+    
+    async def aprocess_incremental(
+        self,
+        transcript: SessionTranscript,
+        previous_transcript: SessionTranscript,
+        previous_summary: SessionSummary,
+        previous_email: Optional[FollowUpEmail] = None,
+        mode: Optional[str] = None,
+        email_mode: Optional[str] = None
+    ) -> AgentResponse:
+        """Async variant of process_incremental."""
+        delta = self._transcript_delta(transcript, previous_transcript)
+        if delta is None:
+            return await self.aprocess_session(transcript, mode, email_mode)
+        try:
+            if not delta:
+                return await self._areuse_previous_result(transcript, previous_summary, previous_email, email_mode)
+            self._log_incremental(transcript, delta)
+            new_takeaways, summary_text = await asyncio.gather(
+                self.aextract_key_takeaways(delta),
+                self.aupdate_summary_text(previous_summary, delta)
+            )
+            key_takeaways = self._merge_takeaways([self._takeaways_from_summary(previous_summary), new_takeaways])
+            
+            session_summary = self._build_session_summary(transcript, key_takeaways, summary_text)
+            student_email = self._student_email(transcript)
+            follow_up_email = None
+            if student_email:
+                follow_up_email = await self._afollow_up_email(session_summary, student_email, email_mode, self._counselor_name(transcript))
+            return self._incremental_response(session_summary, follow_up_email, key_takeaways)
+        except Exception as e:
+            logger.error("Error incrementally processing session: %s", e)
+            return AgentResponse(
+                success=False,
+                message="Failed to process session",
+                error=str(e)
+            )
+    
+    def process_session(self, transcript: SessionTranscript, mode: Optional[str] = None, email_mode: Optional[str] = None) -> AgentResponse:
+        """Process a counseling session transcript and generate summary and email.
+        
+        mode is "multi_call" (default) or "single_shot"; single-shot falls back
+        to the multi-call pipeline if the structured output is unusable.
+        email_mode is "llm", "template" or "auto" (default EMAIL_MODE).
+        """
+        logger.info("Processing session %s", transcript.session_id)
+        if self._use_single_shot(transcript, mode):
+            result = self._process_single_shot(transcript, email_mode)
+            if result is not None:
+                return result
+            logger.info("Falling back to multi-call pipeline for session %s", transcript.session_id)
+        return self._process_multi_call(transcript, email_mode)
+    
+    async def aprocess_session(self, transcript: SessionTranscript, mode: Optional[str] = None, email_mode: Optional[str] = None) -> AgentResponse:
+        """Async variant of process_session for use inside an event loop."""
+        logger.info("Processing session %s", transcript.session_id)
+        if self._use_single_shot(transcript, mode):
+            result = await self._aprocess_single_shot(transcript, email_mode)
+            if result is not None:
+                return result
+            logger.info("Falling back to multi-call pipeline for session %s", transcript.session_id)
+        return await self._aprocess_multi_call(transcript, email_mode)
+
+    async def astream_session(self, transcript: SessionTranscript, email_mode: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Run the multi-call pipeline, yielding (event, data) pairs as results become available.
+        
+        Events: "takeaways" (dict), "summary_token"/"email_token" ({"text": ...}),
+        "summary" (SessionSummary) and "email" (FollowUpEmail, only when the
+        student has an email address). A template email has no token events;
+        in auto mode a failed stream ends with the template email instead.
+        """
+        logger.info("Streaming session %s", transcript.session_id)
+        takeaways_task = asyncio.ensure_future(self.aextract_key_takeaways(transcript.transcript))
+        try:
+            # Summary tokens stream while extraction runs; takeaways are emitted as soon as they are ready
+            summary_pieces = []
+            takeaways_sent = False
+            started = time.perf_counter()
+            async for piece in self.astream_summary_text(transcript):
+                summary_pieces.append(piece)
+                yield "summary_token", {"text": piece}
+                if not takeaways_sent and takeaways_task.done():
+                    takeaways_sent = True
+                    yield "takeaways", takeaways_task.result()
+            record_stage("summarize", time.perf_counter() - started)
+            
+            key_takeaways = await takeaways_task
+            if not takeaways_sent:
+                yield "takeaways", key_takeaways
+            session_summary = self._build_session_summary(transcript, key_takeaways, "".join(summary_pieces))
+            yield "summary", session_summary
+            
+            student_email = self._student_email(transcript)
+            email_mode = email_mode or Config.EMAIL_MODE
+            if student_email and email_mode == "template":
+                yield "email", self.generate_template_email(session_summary, student_email, self._counselor_name(transcript))
+            elif student_email:
+                email_pieces = []
+                started = time.perf_counter()
+                try:
+                    async for piece in self.astream_email_body(session_summary, student_email):
+                        email_pieces.append(piece)
+                        yield "email_token", {"text": piece}
+                except Exception as e:
+                    if email_mode != "auto":
+                        raise
+                    self._record_email_fallback(session_summary, e)
+                    yield "email", self.generate_template_email(session_summary, student_email, self._counselor_name(transcript))
+                    return
+                record_stage("generate_email", time.perf_counter() - started)
+                yield "email", self._build_email(session_summary, student_email, "".join(email_pieces))
+        finally:
+            takeaways_task.cancel()
+
+def simple_gemini_summary(transcript, api_key, model_name="gemini-2.0-flash"):
+    import google.generativeai as genai
+    
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name)
+    prompt = f"Summarize the following conversation between two people:\n\n{transcript}"
+    response = model.generate_content(prompt)
     return response.text 
\ No newline at end of file
@@ -0,0 +1,191 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from models import FollowUpEmail
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+# Most records the writer packs into one gzip member
+MAX_BATCH_RECORDS = 1000
+
+_STOP = object()
+
+class EmailArchive:
+    """Append-only archive of follow-up emails in size-rotated gzip JSONL segments.
+
+    save() only assigns an ID and queues the email; a single writer thread
+    drains whatever has accumulated, appends it to the current segment as
+    one gzip member and indexes it in SQLite by session_id in the same
+    pass, so the cost per email falls as load rises. Each member is a
+    complete gzip stream: segments stay readable with zcat even if the
+    process dies mid-write, and a single email is read back by seeking to
+    its member. Emails still queued when the process is killed (rather
+    than closed) are lost.
+
+    Segment names include a random suffix, so several API processes can
+    share one directory.
+    """
+
+    def __init__(self, directory: str = None, segment_max_bytes: int = None, queue_size: int = None, compress_level: int = 6):
+        """Open (or create) the archive index and start the writer thread."""
+        self.directory = directory or Config.EMAIL_ARCHIVE_DIR
+        self.segment_max_bytes = segment_max_bytes or Config.EMAIL_ARCHIVE_SEGMENT_MAX_BYTES
+        self.compress_level = compress_level
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size or Config.EMAIL_ARCHIVE_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._segment: Optional[BinaryIO] = None
+        self._segment_name: Optional[str] = None
+
+        self._conn = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS archive ("
+            "archive_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, to_email TEXT NOT NULL, "
+            "subject TEXT NOT NULL, archived_at REAL NOT NULL, "
+            "segment TEXT NOT NULL, member_offset INTEGER NOT NULL, member_length INTEGER NOT NULL, "
+            "line INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_session ON archive(session_id, archived_at)")
+        self._conn.commit()
+
+        self._thread = threading.Thread(target=self._writer, name="email-archive", daemon=True)
+        self._thread.start()
+
+    def save(self, email: FollowUpEmail) -> str:
+        """Queue an email for archiving and return its archive ID; blocks only when the queue is full."""
+        archive_id = uuid.uuid4().hex
+        self._queue.put((archive_id, time.time(), email))
+        return archive_id
+
+    async def asave(self, email: FollowUpEmail) -> str:
+        """save() for the event loop: queues without blocking, waiting in the threadpool only when the queue is full."""
+        archive_id = uuid.uuid4().hex
+        item = (archive_id, time.time(), email)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            metrics.inc("email_archive_backpressure_total", 1, "Archive saves that waited for queue space")
+            await run_in_threadpool(self._queue.put, item)
+        return archive_id
+
+    def _open_segment(self) -> None:
+        """Start a new segment file."""
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_name = f"emails-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+        self._segment = open(os.path.join(self.directory, self._segment_name), "ab")
+        logger.info("Opened email archive segment %s", self._segment_name)
+
+    def _write_batch(self, batch: List[tuple]) -> None:
+        """Append a batch as one gzip member and index it."""
+        started = time.perf_counter()
+        if self._segment is None or self._segment.tell() >= self.segment_max_bytes:
+            self._open_segment()
+        lines = []
+        for archive_id, archived_at, email in batch:
+            lines.append(
+                f'{{"archive_id":"{archive_id}","archived_at":{archived_at},"email":{email.model_dump_json()}}}\n'
+            )
+        member = gzip.compress("".join(lines).encode("utf-8"), self.compress_level)
+        offset = self._segment.tell()
+        self._segment.write(member)
+        self._segment.flush()
+        rows = [
+            (archive_id, email.session_summary.session_id, email.to_email, email.subject, archived_at,
+             self._segment_name, offset, len(member), line)
+            for line, (archive_id, archived_at, email) in enumerate(batch)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT INTO archive VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        metrics.inc("email_archive_records_total", len(batch), "Emails written to the archive")
+        metrics.observe("email_archive_batch_seconds", time.perf_counter() - started, "Time to write and index one archive batch")
+
+    def _writer(self) -> None:
+        """Drain the queue in batches until stopped."""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            taken = 1
+            while True:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= MAX_BATCH_RECORDS:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    logger.error("Failed to archive %d emails: %s", len(batch), e)
+                    metrics.inc("email_archive_errors_total", len(batch), "Emails that could not be archived")
+            for _ in range(taken):
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Wait until every queued email has been written."""
+        self._queue.join()
+
+    def get(self, archive_id: str) -> Optional[Dict[str, Any]]:
+        """Return an archived email record, or None if unknown or not written yet."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT segment, member_offset, member_length, line FROM archive WHERE archive_id = ?", (archive_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        segment, offset, length, line = row
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        return json.loads(gzip.decompress(member).splitlines()[line])
+
+    def find(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Archived emails of a session, newest first, without their bodies."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT archive_id, to_email, subject, archived_at, segment FROM archive "
+                "WHERE session_id = ? ORDER BY archived_at DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        return [
+            {"archive_id": row[0], "to_email": row[1], "subject": row[2], "archived_at": row[3], "segment": row[4]}
+            for row in rows
+        ]
+
+    def close(self, timeout: float = 30) -> None:
+        """Write out queued emails, stop the writer and close the files."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        with self._lock:
+            self._conn.close()
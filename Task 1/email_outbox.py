@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import logging
+import threading
+from typing import Optional, Dict, Any, List
+
+from models import FollowUpEmail
+from config import Config
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+class EmailOutbox:
+    """Durable SQLite-backed queue of follow-up emails drained by background workers.
+
+    Emails are persisted before the API responds, so a crash or a slow SMTP
+    server never loses a message or delays the request. Failed deliveries are
+    retried with jittered exponential backoff up to ``max_attempts``. Sent and
+    failed entries are deleted once older than ``retention_seconds``, when the
+    outbox opens and then every ``prune_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        email_service,
+        path: str = None,
+        workers: int = None,
+        max_attempts: int = None,
+        backoff_seconds: float = None,
+        max_backoff_seconds: float = 300,
+        poll_interval: float = 1.0,
+        retention_seconds: float = None,
+        prune_interval: float = 3600
+    ):
+        """Open (or create) the outbox database."""
+        self.email_service = email_service
+        self.path = path or Config.EMAIL_OUTBOX_PATH
+        self.workers = workers or Config.EMAIL_OUTBOX_WORKERS
+        self.max_attempts = max_attempts or Config.EMAIL_OUTBOX_MAX_ATTEMPTS
+        self.backoff_seconds = backoff_seconds if backoff_seconds is not None else Config.EMAIL_OUTBOX_BACKOFF_SECONDS
+        self.max_backoff_seconds = max_backoff_seconds
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds if retention_seconds is not None else Config.EMAIL_OUTBOX_RETENTION_SECONDS
+        self.prune_interval = prune_interval
+        self._next_prune_at = 0.0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id TEXT PRIMARY KEY, email_json TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "last_error TEXT, result_json TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        # Messages claimed by a worker that died mid-send go back to the queue
+        self._conn.execute("UPDATE outbox SET status = ? WHERE status = ?", (PENDING, SENDING))
+        self._conn.commit()
+        self._prune_if_due()
+
+    @timed("queue_email")
+    def enqueue(self, email: FollowUpEmail) -> str:
+        """Persist an email for background delivery and return its outbox ID."""
+        outbox_id = uuid.uuid4().hex
+        now = time.time()
+        with self._wakeup:
+            self._conn.execute(
+                "INSERT INTO outbox (id, email_json, status, attempts, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 0, ?, ?, ?)",
+                (outbox_id, email.model_dump_json(), PENDING, now, now, now)
+            )
+            self._conn.commit()
+            self._wakeup.notify()
+        logger.info("Queued email to %s as %s", email.to_email, outbox_id)
+        return outbox_id
+
+    def get(self, outbox_id: str) -> Optional[Dict[str, Any]]:
+        """Return the delivery status of a queued email, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, attempts, next_attempt_at, created_at, updated_at, last_error, result_json, email_json "
+                "FROM outbox WHERE id = ?", (outbox_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        email = json.loads(row[8])
+        return {
+            "outbox_id": row[0],
+            "status": row[1],
+            "attempts": row[2],
+            "next_attempt_at": row[3] if row[1] == PENDING else None,
+            "created_at": row[4],
+            "updated_at": row[5],
+            "last_error": row[6],
+            "result": json.loads(row[7]) if row[7] else None,
+            "to_email": email["to_email"],
+            "subject": email["subject"]
+        }
+
+    def counts(self) -> Dict[str, int]:
+        """Number of outbox entries per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def prune(self) -> int:
+        """Delete sent and failed entries last updated before the retention window; returns the count."""
+        if self.retention_seconds <= 0:
+            return 0
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+                (SENT, FAILED, time.time() - self.retention_seconds)
+            ).rowcount
+            self._conn.commit()
+        if deleted:
+            logger.info("Pruned %s delivered or failed emails from the outbox", deleted)
+        return deleted
+
+    def _prune_if_due(self):
+        """Prune at most once per prune_interval across all workers."""
+        with self._lock:
+            now = time.time()
+            if now < self._next_prune_at:
+                return
+            self._next_prune_at = now + self.prune_interval
+        self.prune()
+
+    def _claim(self) -> Optional[tuple]:
+        """Atomically mark the next due email as sending and return it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, email_json, attempts FROM outbox WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (PENDING, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE id = ?",
+                (SENDING, time.time(), row[0])
+            )
+            self._conn.commit()
+            return row
+
+    def _backoff(self, attempts: int) -> float:
+        """Jittered exponential backoff before the next delivery attempt."""
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _deliver(self, outbox_id: str, email_json: str, attempts: int):
+        """Send one claimed email and record the outcome."""
+        attempts += 1
+        try:
+            result = self.email_service.send_email(FollowUpEmail.model_validate_json(email_json))
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        now = time.time()
+        with self._lock:
+            if result.get("success"):
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, updated_at = ?, last_error = NULL, result_json = ? "
+                    "WHERE id = ?",
+                    (SENT, attempts, now, json.dumps(result), outbox_id)
+                )
+            else:
+                exhausted = attempts >= self.max_attempts
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, updated_at = ?, last_error = ? "
+                    "WHERE id = ?",
+                    (FAILED if exhausted else PENDING, attempts, now + self._backoff(attempts), now,
+                     result.get("error"), outbox_id)
+                )
+            self._conn.commit()
+
+        if result.get("success"):
+            logger.info("Delivered outbox email %s", outbox_id)
+        else:
+            logger.warning("Delivery attempt %s failed for outbox email %s: %s", attempts, outbox_id, result.get("error"))
+
+    def _worker(self):
+        """Drain due emails until stopped."""
+        while not self._stopping.is_set():
+            self._prune_if_due()
+            claimed = self._claim()
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._deliver(*claimed)
+
+    def start(self):
+        """Start the background delivery workers."""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"email-outbox-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Email outbox started with %s workers", self.workers)
+
+    def stop(self, timeout: float = 10):
+        """Stop the workers; undelivered emails stay queued for the next start."""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def close(self):
+        """Stop the workers and close the database."""
+        self.stop()
+        with self._lock:
+            self._conn.close()
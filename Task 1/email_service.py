@@ -1,111 +1,213 @@
-import smtplib
-import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Optional, Dict, Any
-from datetime import datetime
-
-from models import FollowUpEmail
-from config import Config
-
-logger = logging.getLogger(__name__)
-
-class EmailService:
-    """Service for sending follow-up emails to students."""
-    
-    def __init__(self):
-        """Initialize the email service."""
-        self.smtp_server = Config.SMTP_SERVER
-        self.smtp_port = Config.SMTP_PORT
-        self.smtp_username = Config.SMTP_USERNAME
-        self.smtp_password = Config.SMTP_PASSWORD
-        
-        # Check if we have SMTP credentials
-        self.has_smtp_credentials = bool(self.smtp_username and self.smtp_password)
-        
-        if not self.has_smtp_credentials:
-            logger.warning("SMTP credentials not configured. Email sending will be mocked.")
-    
-    def send_email(self, email: FollowUpEmail, from_email: str = None) -> Dict[str, Any]:
-        """Send a follow-up email to the student."""
-        try:
-            if not self.has_smtp_credentials:
-                return self._mock_send_email(email)
-            
-            return self._send_via_smtp(email, from_email)
-            
-        except Exception as e:
-            logger.error(f"Error sending email: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "email_id": None,
-                "sent_at": datetime.now().isoformat()
-            }
-    
-    def _send_via_smtp(self, email: FollowUpEmail, from_email: str = None) -> Dict[str, Any]:
-        """Send email via SMTP server."""
-        if not from_email:
-            from_email = self.smtp_username
-        
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = from_email
-        msg['To'] = email.to_email
-        msg['Subject'] = email.subject
-        
-        # Add body
-        msg.attach(MIMEText(email.body, 'plain'))
-        
-        # Send email
-        with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-            server.starttls()
-            server.login(self.smtp_username, self.smtp_password)
-            server.send_message(msg)
-        
-        logger.info(f"Email sent successfully to {email.to_email}")
-        
-        return {
-            "success": True,
-            "email_id": f"email_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-            "sent_at": datetime.now().isoformat(),
-            "to_email": email.to_email,
-            "subject": email.subject
-        }
-    
-    def _mock_send_email(self, email: FollowUpEmail) -> Dict[str, Any]:
-        """Mock email sending for testing purposes."""
-        logger.info(f"MOCK EMAIL SENT:")
-        logger.info(f"To: {email.to_email}")
-        logger.info(f"Subject: {email.subject}")
-        logger.info(f"Body: {email.body[:200]}...")
-        
-        return {
-            "success": True,
-            "email_id": f"mock_email_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-            "sent_at": datetime.now().isoformat(),
-            "to_email": email.to_email,
-            "subject": email.subject,
-            "mock": True
-        }
-    
-    def save_email_template(self, email: FollowUpEmail, filepath: str = None) -> str:
-        """Save email content to a file for review."""
-        if not filepath:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filepath = f"emails/follow_up_email_{timestamp}.txt"
-        
-        # Create emails directory if it doesn't exist
-        import os
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        # Write email content
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(f"To: {email.to_email}\n")
-            f.write(f"Subject: {email.subject}\n")
-            f.write(f"Generated: {email.generated_at}\n")
-            f.write("-" * 50 + "\n")
-            f.write(email.body)
-        
-        logger.info(f"Email template saved to {filepath}")
+import uuid
+import smtplib
+import logging
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from models import FollowUpEmail
+from config import Config
+from smtp_pool import SMTPConnectionPool
+from metrics import timed
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+class EmailService:
+    """Service for sending follow-up emails to students."""
+    
+    def __init__(self):
+        """Initialize the email service."""
+        self.smtp_server = Config.SMTP_SERVER
+        self.smtp_port = Config.SMTP_PORT
+        self.smtp_username = Config.SMTP_USERNAME
+        self.smtp_password = Config.SMTP_PASSWORD
+        
+        # Check if we have SMTP credentials
+        self.has_smtp_credentials = bool(self.smtp_username and self.smtp_password)
+        
+        if not self.has_smtp_credentials:
+            logger.warning("SMTP credentials not configured. Email sending will be mocked.")
+        
+        # Authenticated SMTP sessions are pooled so TLS/auth is paid once per connection
+        self.pool = SMTPConnectionPool(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_username,
+            self.smtp_password,
+            max_connections=Config.SMTP_POOL_SIZE,
+            idle_timeout=Config.SMTP_POOL_IDLE_TIMEOUT,
+            use_tls=Config.SMTP_USE_TLS
+        ) if self.has_smtp_credentials else None
+    
+    def close(self):
+        """Close pooled SMTP connections."""
+        if self.pool:
+            self.pool.close()
+    
+    @timed("send_email")
+    def send_email(self, email: FollowUpEmail, from_email: str = None) -> Dict[str, Any]:
+        """Send a follow-up email to the student."""
+        try:
+            if not self.has_smtp_credentials:
+                return self._mock_send_email(email)
+            
+            return self._send_via_smtp(email, from_email)
+            
+        except Exception as e:
+            logger.error("Error sending email: %s", e)
+            return self._failed_result(e)
+    
+    @timed("send_bulk")
+    def send_bulk(self, emails: List[FollowUpEmail], from_email: str = None) -> List[Dict[str, Any]]:
+        """Send many emails over a few reused SMTP sessions.
+        
+        Messages are split across at most SMTP_POOL_SIZE connections and each
+        connection delivers its share back to back. Returns one result per
+        email, in input order, shaped like the send_email result; a failed
+        message never aborts the rest of the batch.
+        """
+        if not emails:
+            return []
+        if not self.has_smtp_credentials:
+            return [self._mock_send_email(email) for email in emails]
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(emails)
+        workers = min(self.pool.max_connections, len(emails))
+        shares = [list(range(start, len(emails), workers)) for start in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda share: self._send_share(emails, share, from_email, results), shares))
+        
+        sent = sum(1 for result in results if result["success"])
+        logger.info("Bulk send finished: %s/%s emails sent", sent, len(emails))
+        return results
+    
+    def _send_share(self, emails: List[FollowUpEmail], indexes: List[int], from_email: Optional[str], results: list):
+        """Deliver one worker's share of a bulk send over a single pooled session."""
+        pending = list(indexes)
+        retried = set()
+        while pending:
+            connected = False
+            try:
+                with self.pool.connection() as server:
+                    connected = True
+                    while pending:
+                        index = pending[0]
+                        try:
+                            server.send_message(self._build_message(emails[index], from_email))
+                            results[index] = self._sent_result(emails[index])
+                        except smtplib.SMTPServerDisconnected:
+                            raise
+                        except Exception as e:
+                            logger.error("Error sending email to %s: %s", emails[index].to_email, e)
+                            results[index] = self._failed_result(e)
+                        pending.pop(0)
+            except Exception as e:
+                if not connected:
+                    # Could not get a session at all: fail what is left of this share
+                    logger.error("Could not open SMTP connection for bulk send: %s", e)
+                    for index in pending:
+                        results[index] = self._failed_result(e)
+                    return
+                # Session dropped mid-batch: retry the current message once on a fresh one
+                index = pending[0]
+                if index in retried:
+                    results[index] = self._failed_result(e)
+                    pending.pop(0)
+                else:
+                    retried.add(index)
+                logger.warning("SMTP connection dropped during bulk send, reconnecting")
+    
+    def _build_message(self, email: FollowUpEmail, from_email: str = None) -> MIMEMultipart:
+        """Build the MIME message for an email."""
+        if not from_email:
+            from_email = self.smtp_username
+        
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = from_email
+        msg['To'] = email.to_email
+        msg['Subject'] = email.subject
+        
+        # Add body
+        msg.attach(MIMEText(email.body, 'plain'))
+        return msg
+    
+    @staticmethod
+    def _email_id(prefix: str) -> str:
+        """ID for a sent email; microseconds plus a random suffix keep emails of one bulk send apart."""
+        return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
+    
+    @classmethod
+    def _sent_result(cls, email: FollowUpEmail) -> Dict[str, Any]:
+        """Result dict for a successfully sent email."""
+        logger.info("Email sent successfully to %s", email.to_email)
+        return {
+            "success": True,
+            "email_id": cls._email_id("email"),
+            "sent_at": datetime.now().isoformat(),
+            "to_email": email.to_email,
+            "subject": email.subject
+        }
+    
+    @staticmethod
+    def _failed_result(error: Exception) -> Dict[str, Any]:
+        """Result dict for an email that could not be sent."""
+        return {
+            "success": False,
+            "error": str(error),
+            "email_id": None,
+            "sent_at": datetime.now().isoformat()
+        }
+    
+    def _send_via_smtp(self, email: FollowUpEmail, from_email: str = None) -> Dict[str, Any]:
+        """Send email via SMTP server."""
+        msg = self._build_message(email, from_email)
+        
+        # Send email over a pooled connection; retry once if the server dropped a reused session
+        try:
+            with self.pool.connection() as server:
+                server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            logger.warning("SMTP connection dropped, retrying on a fresh connection")
+            with self.pool.connection() as server:
+                server.send_message(msg)
+        
+        return self._sent_result(email)
+    
+    def _mock_send_email(self, email: FollowUpEmail) -> Dict[str, Any]:
+        """Mock email sending for testing purposes."""
+        log_event(logger, logging.INFO, "mock_email_sent", category="email.mock", to_email=email.to_email, subject=email.subject, body=email.body)
+        
+        return {
+            "success": True,
+            "email_id": self._email_id("mock_email"),
+            "sent_at": datetime.now().isoformat(),
+            "to_email": email.to_email,
+            "subject": email.subject,
+            "mock": True
+        }
+    
+    def save_email_template(self, email: FollowUpEmail, filepath: str = None) -> str:
+        """Save email content to a file for review."""
+        if not filepath:
+            # Microseconds plus a random suffix, so saves in the same second get their own file
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            filepath = f"emails/follow_up_email_{timestamp}_{uuid.uuid4().hex[:8]}.txt"
+        
+        # Create emails directory if it doesn't exist
+        import os
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        
+        # Write email content
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(f"To: {email.to_email}\n")
+            f.write(f"Subject: {email.subject}\n")
+            f.write(f"Generated: {email.generated_at}\n")
+            f.write("-" * 50 + "\n")
+            f.write(email.body)
+        
+        logger.info("Email template saved to %s", filepath)
         return filepath 
\ No newline at end of file
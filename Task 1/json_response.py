@@ -0,0 +1,43 @@
+import json
+from datetime import date, datetime
+from typing import Any
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is the fallback
+    orjson = None
+
+def _default(value: Any) -> Any:
+    """Encode the non-JSON types the API returns: pydantic models and datetimes."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any) -> bytes:
+    """Serialize a model or plain data to JSON bytes in one pass.
+
+    Models go straight through pydantic's compiled serializer; anything else
+    through orjson when it is installed, otherwise the standard library.
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump_json().encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSON response that serializes its content once, skipping FastAPI's jsonable_encoder pass.
+
+    Endpoints return it with models they built themselves, so the response
+    is neither re-validated against response_model nor converted to dicts
+    before encoding.
+    """
+
+    def render(self, content: Any) -> bytes:
+        """Encode the response body."""
+        return dumps(content)
@@ -0,0 +1,285 @@
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from typing import Optional, Dict, Any, AsyncIterator
+
+from config import Config
+from transcript_chunker import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+class LLMResult:
+    """Text returned by an LLM backend plus token usage."""
+
+    def __init__(self, text: str, prompt_tokens: int, response_tokens: int, cached_tokens: int = 0):
+        """Store the generated text and token counts; prompt_tokens includes cached_tokens served from a context."""
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+        self.cached_tokens = cached_tokens
+
+class LLMContext:
+    """Handle to content registered once with a backend and reused as the prefix of later prompts."""
+
+    def __init__(self, handle: str, content: str, tokens: int):
+        """Describe a created context; digest identifies its content in response cache keys."""
+        self.handle = handle
+        self.digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        self.tokens = tokens
+        self.cached_tokens_used = 0
+        self._lock = threading.Lock()
+
+    def record_use(self, cached_tokens: int) -> None:
+        """Count tokens a call read from the context instead of resending them."""
+        with self._lock:
+            self.cached_tokens_used += cached_tokens
+
+    def tokens_saved(self) -> int:
+        """Input tokens not resent thanks to the context, net of uploading it once."""
+        return self.cached_tokens_used - self.tokens
+
+class SimulatedQuotaError(RuntimeError):
+    """Quota error raised by FakeBackend, shaped like an HTTP 429 from the API."""
+
+    code = 429
+
+class LLMBackend:
+    """Interface every LLM backend implements for CounselingSessionAgent."""
+
+    model_name = "unknown"
+    supports_context = False
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None) -> LLMResult:
+        """Generate a completion for prompt, prefixed by context if given."""
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None) -> LLMResult:
+        """Generate a completion for prompt without blocking the event loop."""
+        raise NotImplementedError
+
+    def create_context(self, content: str, ttl_seconds: int) -> LLMContext:
+        """Register content once so later calls can reference it instead of resending it."""
+        raise NotImplementedError
+
+    async def acreate_context(self, content: str, ttl_seconds: int) -> LLMContext:
+        """Async variant of create_context; the default runs it in a worker thread."""
+        return await asyncio.to_thread(self.create_context, content, ttl_seconds)
+
+    def delete_context(self, context: LLMContext) -> None:
+        """Release a context before its TTL expires."""
+
+    async def adelete_context(self, context: LLMContext) -> None:
+        """Async variant of delete_context."""
+        await asyncio.to_thread(self.delete_context, context)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion for prompt in pieces as they are generated."""
+        result = await self.agenerate(prompt)
+        yield result.text
+
+class GeminiBackend(LLMBackend):
+    """Backend that calls Google Gemini through google-generativeai."""
+
+    supports_context = True
+
+    def __init__(self, model_name: str = None, api_key: str = None, context_model_name: str = None):
+        """Configure the Gemini client; cached contexts use context_model_name, a versioned model."""
+        import google.generativeai as genai
+
+        self.model_name = model_name or Config.GEMINI_MODEL
+        self.context_model_name = context_model_name or Config.GEMINI_CONTEXT_CACHE_MODEL
+        genai.configure(api_key=api_key or Config.GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(self.model_name)
+        # Context handle -> (CachedContent, model bound to it)
+        self._contexts: Dict[str, tuple] = {}
+        self._contexts_lock = threading.Lock()
+
+    @staticmethod
+    def _to_result(response, prompt: str) -> LLMResult:
+        """Read text and token usage from a Gemini response, estimating tokens if metadata is missing."""
+        text = response.text
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        response_tokens = getattr(usage, "candidates_token_count", None)
+        return LLMResult(
+            text,
+            prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt),
+            response_tokens if response_tokens is not None else estimate_tokens(text),
+            getattr(usage, "cached_content_token_count", None) or 0
+        )
+
+    def _model_for(self, context: Optional[LLMContext]):
+        """The plain model, or the one bound to a cached context."""
+        if context is None:
+            return self.model
+        with self._contexts_lock:
+            return self._contexts[context.handle][1]
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None) -> LLMResult:
+        """Call Gemini synchronously."""
+        response = self._model_for(context).generate_content(prompt, generation_config=generation_config)
+        return self._to_result(response, prompt)
+
+    async def agenerate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None) -> LLMResult:
+        """Call Gemini with the SDK's async client."""
+        response = await self._model_for(context).generate_content_async(prompt, generation_config=generation_config)
+        return self._to_result(response, prompt)
+
+    def create_context(self, content: str, ttl_seconds: int) -> LLMContext:
+        """Upload content as a Gemini CachedContent on the versioned context model."""
+        import google.generativeai as genai
+        from google.generativeai import caching
+
+        try:
+            cached = caching.CachedContent.create(model=self.context_model_name, contents=[content], ttl=timedelta(seconds=ttl_seconds))
+        except Exception as e:
+            logger.warning("Gemini context cache unavailable for model %s: %s", self.context_model_name, e)
+            raise
+        usage = getattr(cached, "usage_metadata", None)
+        tokens = getattr(usage, "total_token_count", None) or estimate_tokens(content)
+        with self._contexts_lock:
+            self._contexts[cached.name] = (cached, genai.GenerativeModel.from_cached_content(cached_content=cached))
+        return LLMContext(cached.name, content, tokens)
+
+    def delete_context(self, context: LLMContext) -> None:
+        """Delete the CachedContent so storage is not billed until the TTL."""
+        with self._contexts_lock:
+            cached, _ = self._contexts.pop(context.handle, (None, None))
+        if cached is not None:
+            cached.delete()
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Stream text chunks from Gemini as they are generated."""
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+class FakeBackend(LLMBackend):
+    """Deterministic offline backend with configurable latency, for tests and benchmarks.
+
+    Responses depend only on the prompt, and are shaped like real Gemini
+    output for each pipeline prompt (markdown heading lists for takeaway extraction,
+    JSON for structured output, prose otherwise) so the agent's parsers run
+    exactly as they would in production.
+    """
+
+    model_name = "fake"
+    supports_context = True
+
+    def __init__(self, latency: float = None, jitter: float = None, seed: int = 0, error_rate: float = None):
+        """Configure simulated latency (seconds), +/- jitter (seconds) and quota-error rate."""
+        self.latency = latency if latency is not None else Config.FAKE_LLM_LATENCY
+        self.jitter = jitter if jitter is not None else Config.FAKE_LLM_JITTER
+        self.error_rate = error_rate if error_rate is not None else Config.FAKE_LLM_ERROR_RATE
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._contexts: Dict[str, str] = {}
+        self._contexts_created = 0
+        self.calls = 0
+
+    def _delay(self) -> float:
+        """Draw the simulated latency for one call."""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            failed = self._random.random() < self.error_rate
+        if failed:
+            raise SimulatedQuotaError("Simulated quota exceeded (429)")
+        return max(0.0, delay)
+
+    @staticmethod
+    def _respond(prompt: str, generation_config: Optional[Dict[str, Any]]) -> str:
+        """Build a deterministic response shaped like the real one for this prompt."""
+        tag = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        goals = [f"Pursue a role in field {tag[:4]}", f"Build a portfolio around topic {tag[4:]}"]
+        actions = [f"Research programs related to {tag[:4]}", "Update resume and LinkedIn profile", "Schedule a follow-up session"]
+        summary = (
+            f"The session (ref {tag}) focused on the student's career direction. "
+            "The counselor and student discussed interests, strengths and realistic next steps, "
+            "and agreed on concrete actions to take before the next meeting."
+        )
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            return json.dumps({
+                "career_goals": goals,
+                "action_items": actions,
+                "concerns": ["Uncertainty about which path to choose"],
+                "achievements": ["Completed a relevant project"],
+                "insights": ["Student is motivated and reflective"],
+                "summary_text": summary,
+                "email_body": f"Dear student,\n\nThank you for meeting today. {summary}\n\nBest regards,\nYour counselor"
+            })
+        if "Career Goals" in prompt and "Action Items" in prompt and "Transcript:" in prompt:
+            return "\n".join(
+                ["## Career Goals"] + [f"- {goal}" for goal in goals]
+                + ["", "**Action Items:**"] + [f"{index}. {action}" for index, action in enumerate(actions, start=1)]
+                + ["", "### Concerns", "* Uncertainty about which path to choose"]
+                + ["", "Achievements", "- Completed a relevant project"]
+                + ["", "Insights:", "- Student is motivated and reflective"]
+            )
+        return summary
+
+    def _result(self, prompt: str, generation_config: Optional[Dict[str, Any]], context: Optional[LLMContext] = None) -> LLMResult:
+        """Wrap the fake response with estimated token counts, answering as if the context preceded the prompt."""
+        if context is None:
+            text = self._respond(prompt, generation_config)
+            return LLMResult(text, estimate_tokens(prompt), estimate_tokens(text))
+        with self._lock:
+            content = self._contexts[context.handle]
+        text = self._respond(f"{content}\n\n{prompt}", generation_config)
+        return LLMResult(text, estimate_tokens(prompt) + context.tokens, estimate_tokens(text), context.tokens)
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None) -> LLMResult:
+        """Sleep for the simulated latency and return the fake response."""
+        time.sleep(self._delay())
+        return self._result(prompt, generation_config, context)
+
+    async def agenerate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, context: Optional[LLMContext] = None) -> LLMResult:
+        """Async sleep for the simulated latency and return the fake response."""
+        await asyncio.sleep(self._delay())
+        return self._result(prompt, generation_config, context)
+
+    def create_context(self, content: str, ttl_seconds: int) -> LLMContext:
+        """Keep content in memory under a new handle (TTL is not simulated)."""
+        with self._lock:
+            self._contexts_created += 1
+            handle = f"fake-context-{self._contexts_created}"
+            self._contexts[handle] = content
+        return LLMContext(handle, content, estimate_tokens(content))
+
+    async def acreate_context(self, content: str, ttl_seconds: int) -> LLMContext:
+        """Create the context without a worker thread."""
+        return self.create_context(content, ttl_seconds)
+
+    def delete_context(self, context: LLMContext) -> None:
+        """Forget the context."""
+        with self._lock:
+            self._contexts.pop(context.handle, None)
+
+    async def adelete_context(self, context: LLMContext) -> None:
+        """Forget the context without a worker thread."""
+        self.delete_context(context)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Stream the fake response word by word; the first piece arrives after a fifth of the latency."""
+        delay = self._delay()
+        words = self._respond(prompt, None).split(" ")
+        await asyncio.sleep(delay * 0.2)
+        per_word = delay * 0.8 / max(1, len(words))
+        for index, word in enumerate(words):
+            yield word if index == 0 else " " + word
+            await asyncio.sleep(per_word)
+
+def build_backend() -> LLMBackend:
+    """Build the LLM backend selected by Config.LLM_BACKEND."""
+    if Config.LLM_BACKEND == "fake":
+        logger.info("Using fake LLM backend")
+        return FakeBackend()
+    if Config.LLM_BACKEND != "gemini":
+        raise ValueError(f"Unknown LLM_BACKEND: {Config.LLM_BACKEND}")
+    return GeminiBackend()
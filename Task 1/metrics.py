@@ -0,0 +1,205 @@
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    """Hashable, order-independent key for a label set."""
+    return tuple(sorted(labels.items()))
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    """Render a label set as {name="value",...}."""
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """Initialize an empty registry."""
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+
+    def inc(self, name: str, value: float = 1, help_text: str = "", **labels: str) -> None:
+        """Increment a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            self._help.setdefault(name, ("counter", help_text))
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        """Current value of a counter series (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def set_gauge(self, name: str, value: float, help_text: str = "", **labels: str) -> None:
+        """Set a gauge to the current value."""
+        key = _label_key(labels)
+        with self._lock:
+            self._help.setdefault(name, ("gauge", help_text))
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, help_text: str = "", **labels: str) -> None:
+        """Record an observation in a histogram."""
+        key = _label_key(labels)
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help_text))
+            series = self._histograms.setdefault(name, {})
+            # [bucket counts..., count, sum]
+            state = series.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(list(self._counters.items()) + list(self._gauges.items())):
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, state in sorted(series.items()):
+                    for index, bound in enumerate(self.buckets):
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', str(bound)),))} {state[index]}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {state[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-2]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+class RequestTimings:
+    """Per-request breakdown of stage latency and LLM token usage."""
+
+    def __init__(self):
+        """Start the request clock."""
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, stage: str) -> Dict[str, Any]:
+        """Get or create the entry for a stage (caller holds the lock)."""
+        return self.stages.setdefault(stage, {
+            "seconds": 0.0, "llm_calls": 0, "cache_hits": 0, "prompt_tokens": 0, "cached_tokens": 0, "response_tokens": 0
+        })
+
+    def add_stage_time(self, stage: str, seconds: float) -> None:
+        """Add elapsed time to a stage."""
+        with self._lock:
+            self._stage(stage)["seconds"] += seconds
+
+    def add_llm_call(self, stage: str, prompt_tokens: int, response_tokens: int, cache_hit: bool, cached_tokens: int = 0) -> None:
+        """Count an LLM call and its tokens against a stage."""
+        with self._lock:
+            entry = self._stage(stage)
+            entry["llm_calls"] += 1
+            entry["cache_hits"] += int(cache_hit)
+            entry["prompt_tokens"] += prompt_tokens
+            entry["cached_tokens"] += cached_tokens
+            entry["response_tokens"] += response_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Breakdown suitable for an API response. Concurrent stages overlap, so they can sum past the total."""
+        with self._lock:
+            stages = {name: dict(entry, seconds=round(entry["seconds"], 4)) for name, entry in self.stages.items()}
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "stages": stages
+        }
+
+_current_stage: ContextVar[str] = ContextVar("current_stage", default="unknown")
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+@contextmanager
+def track_request() -> Iterator[RequestTimings]:
+    """Collect stage timings for everything run inside the block (including tasks it spawns)."""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """Time a pipeline stage; LLM calls made inside are attributed to it."""
+    token = _current_stage.set(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        record_stage(stage, time.perf_counter() - started)
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration measured by the caller (e.g. across the yields of a stream)."""
+    metrics.observe("pipeline_stage_duration_seconds", seconds, "Latency of each pipeline stage", stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_stage_time(stage, seconds)
+
+def timed(stage: str):
+    """Decorator form of timed_stage for sync and async functions."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timed_stage(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_llm_call(
+    seconds: float,
+    prompt_tokens: int,
+    response_tokens: int,
+    cache_hit: bool = False,
+    stage: str = None,
+    cached_tokens: int = 0
+) -> None:
+    """Record one LLM call (or cache hit) against the given or current stage; cached_tokens were read from a context."""
+    stage = stage or _current_stage.get()
+    if cache_hit:
+        metrics.inc("llm_cache_hits_total", 1, "LLM calls answered from the response cache", stage=stage)
+    else:
+        metrics.observe("llm_call_duration_seconds", seconds, "Latency of Gemini API calls", stage=stage)
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens, "Prompt tokens sent to Gemini", stage=stage)
+        metrics.inc("llm_response_tokens_total", response_tokens, "Response tokens received from Gemini", stage=stage)
+        if cached_tokens:
+            metrics.inc("llm_cached_prompt_tokens_total", cached_tokens, "Prompt tokens served from a cached context", stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_llm_call(stage, prompt_tokens, response_tokens, cache_hit, cached_tokens)
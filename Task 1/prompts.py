@@ -0,0 +1,236 @@
+import re
+from typing import Dict, List, Optional
+
+from jinja2 import DictLoader, Environment, StrictUndefined
+
+# Shared by the inline and the cached-context extraction prompts
+TAKEAWAY_INSTRUCTIONS = """From the {{ source }}, identify and list:
+1. Career Goals mentioned by the participants.
+2. Action Items that the participants decided to take.
+3. Concerns the student raised.
+4. Achievements the student mentioned.
+5. Insights about the student's strengths, interests or situation.
+
+Format the output clearly with headings for "Career Goals", "Action Items", "Concerns", "Achievements" and "Insights", with one bulleted item per line. Leave a section empty if nothing applies."""
+
+TEMPLATE_SOURCES = {
+    "takeaway_instructions": TAKEAWAY_INSTRUCTIONS,
+
+    # Key takeaway extraction (Colab style)
+    "extract_takeaways": """
+{% with source = "following transcript" %}{% include "takeaway_instructions" %}{% endwith %}
+
+Transcript:
+{{ transcript }}
+""",
+
+    "summarize": """Summarize the following conversation between two people:
+
+{{ transcript }}""",
+
+    # Follow-up email
+    "email": """You are a career counselor writing a follow-up email to a student after a counseling session.
+
+Write a friendly, personalized email that:
+- Acknowledges the session and thanks the student
+- Summarizes key points discussed
+- Lists specific action items and deadlines
+- Offers encouragement and support
+- Provides next steps
+- Maintains a warm, professional tone
+
+The email should be:
+- Personalized to the student
+- Action-oriented
+- Encouraging and supportive
+- Clear about next steps
+- Professional but friendly
+
+Keep it concise (2-3 paragraphs) but comprehensive.
+
+Student Name: {{ student_name }}
+Student Email: {{ student_email }}
+Session Summary: {{ session_summary }}
+Key Action Items: {% for item in action_items %}{{ "\n" if not loop.first }}• {{ item }}{% endfor %}
+
+Generate a follow-up email.""",
+
+    # Map-reduce summarization of transcripts too long for one prompt
+    "chunk_summary": """Summarize part {{ part }} of {{ total }} of a conversation between a career counselor and a student. Capture the discussion points, career goals, action items and any resources mentioned in this part.
+
+Conversation part:
+{{ transcript }}""",
+
+    "combine_summaries": """The following are summaries of consecutive parts of one conversation between a career counselor and a student. Combine them into a single coherent summary of the whole conversation, without repeating points.
+
+{% for summary in partial_summaries %}{{ "\n\n" if not loop.first }}Part {{ loop.index }}:
+{{ summary }}{% endfor %}""",
+
+    # Incremental mode: fold newly appended exchanges into an existing summary
+    "update_summary": """The following is a summary of a conversation between a career counselor and a student:
+
+{{ previous_summary }}
+
+The conversation then continued with these exchanges:
+
+{{ transcript }}
+
+Rewrite the summary so it covers the whole conversation, including the new exchanges. Keep the same style and length, and do not drop earlier points unless the new exchanges supersede them.""",
+
+    # Single-shot mode: takeaways, summary and email in one JSON document
+    "single_shot": """You are a professional career counselor. Analyze the counseling session transcript below and respond with a single JSON object with exactly these keys:
+
+- "career_goals": list of career goals mentioned by the student
+- "action_items": list of action items the participants decided to take
+- "concerns": list of concerns the student raised
+- "achievements": list of achievements the student mentioned
+- "insights": list of notable insights about the student
+- "summary_text": a professional yet warm 2-3 paragraph session summary covering key discussion points, goals, action items and next steps
+- "email_body": {% if include_email %}a friendly, personalized 2-3 paragraph follow-up email to the student that thanks them for the session, summarizes the key points, lists the action items and offers encouragement{% else %}null{% endif %}
+
+Every list item is a short plain-text string without bullets or numbering.
+
+Student: {{ student_name }}
+Session Date: {{ session_date }}
+
+Transcript:
+{{ transcript }}""",
+
+    # Context caching: the transcript is registered once and each stage sends only its instruction
+    "transcript_context": """Career counseling session transcript.
+
+Transcript:
+{{ transcript }}""",
+
+    "context_extract_takeaways": """{% with source = "transcript above" %}{% include "takeaway_instructions" %}{% endwith %}""",
+
+    "context_summary": "Summarize the conversation between the two people in the transcript above.",
+
+    # Follow-up email rendered straight from the SessionSummary (email_mode "template"); not sent to the LLM
+    "template_email": """Dear {{ student_name }},
+
+Thank you for meeting with me on {{ session_date }}. Here is a short recap of our conversation:
+
+{{ summary_text }}
+{%- if career_goals %}
+
+The goals we talked about:
+{%- for goal in career_goals %}
+• {{ goal }}
+{%- endfor %}
+{%- endif %}
+{%- if action_items %}
+
+Your next steps:
+{%- for item in action_items %}
+• {{ item }}
+{%- endfor %}
+{%- endif %}
+
+You are making real progress, and I am here to help along the way. If any questions come up before our next session, just reply to this email.
+
+Best regards,
+{{ counselor_name }}"""
+}
+
+# Templates are compiled once at import; rendering is a call into the generated code
+_environment = Environment(
+    loader=DictLoader(TEMPLATE_SOURCES),
+    undefined=StrictUndefined,
+    autoescape=False,
+    keep_trailing_newline=True
+)
+TEMPLATES = {name: _environment.get_template(name) for name in TEMPLATE_SOURCES}
+
+def render_prompt(name: str, **fields) -> str:
+    """Render a precompiled prompt template; missing fields raise instead of rendering blank."""
+    return TEMPLATES[name].render(**fields)
+
+# Stand-ins parse_takeaways uses when a response has no career goals or action items
+CAREER_GOALS_FAILED = "Career goal extraction failed"
+ACTION_ITEMS_FAILED = "Action item extraction failed"
+EXTRACTION_FAILED_PLACEHOLDERS = {CAREER_GOALS_FAILED, ACTION_ITEMS_FAILED}
+
+TAKEAWAY_CATEGORIES = ("career_goals", "action_items", "concerns", "achievements", "insights")
+
+HEADING_ALIASES = {
+    "career goal": "career_goals",
+    "career goals": "career_goals",
+    "action item": "action_items",
+    "action items": "action_items",
+    "next steps": "action_items",
+    "concern": "concerns",
+    "concerns": "concerns",
+    "concerns raised": "concerns",
+    "concerns addressed": "concerns",
+    "achievement": "achievements",
+    "achievements": "achievements",
+    "insight": "insights",
+    "insights": "insights",
+    "key insights": "insights"
+}
+
+# A heading line: plain, markdown "#", numbered, bulleted and/or bold (before or after the number),
+# then a section name and whatever follows it on the line ("Career Goals mentioned by the student:")
+TAKEAWAY_HEADING_PATTERN = re.compile(
+    r"[ \t]*(?P<bullet>[-*•+][ \t]+)?(?:#{1,6}[ \t]*)?(?:\*\*|__)?[ \t]*(?:\d+[.)][ \t]*)?(?:\*\*|__)?[ \t]*(?P<alias>"
+    + "|".join(re.escape(alias) for alias in sorted(HEADING_ALIASES, key=len, reverse=True))
+    + r")(?![a-z0-9])(?P<rest>[^\n]*)",
+    re.IGNORECASE
+)
+# Lines that could be headings: anything that is not a bullet, plus bullets that are bold or end in a colon.
+# Only these are checked against the heading pattern, so plain bullet lines cost a single scan
+_HEADING_CANDIDATE_PATTERN = re.compile(
+    r"^[ \t]*(?:(?![-*•+][ \t]|\d+[.)][ \t])|(?:[-*•+]|\d+[.)])[ \t]+(?=\*\*|__|[^\n]*:[ \t]*$))[^\n]+",
+    re.MULTILINE
+)
+# A bullet or numbered item; other lines in a section (prose, blank lines) are skipped
+TAKEAWAY_ITEM_PATTERN = re.compile(r"^[ \t]*(?:[-*•+]|\d+[.)])[ \t]+([^\n]*)", re.MULTILINE)
+
+def _clean_item(item: str) -> str:
+    """Drop bold/underline emphasis wrapping a whole item."""
+    if item[:2] in ("**", "__") and item.endswith(item[:2]) and len(item) > 4:
+        return item[2:-2].strip()
+    return item
+
+def _heading_category(line: str) -> Optional[str]:
+    """Category a heading line introduces, or None if the line is not a heading.
+
+    Like the original prefix parser, any non-bullet line starting with a
+    section name is a heading. A bullet line only counts when nothing but
+    emphasis follows the name or it ends in a colon, so an item such as
+    "- **Career goals** are to teach" stays an item.
+    """
+    heading = TAKEAWAY_HEADING_PATTERN.match(line)
+    if heading is None:
+        return None
+    if heading.group("bullet"):
+        rest = heading.group("rest").strip(" \t*_")
+        if rest and not rest.endswith(":"):
+            return None
+    return HEADING_ALIASES[heading.group("alias").lower()]
+
+def parse_takeaways(response_text: str) -> Dict[str, List[str]]:
+    """Parse a heading-and-bullet takeaways response into categories.
+
+    Bullets before the first recognised heading are ignored. Career goals
+    and action items fall back to a failure placeholder when the response
+    has none, as the pipeline expects both to be present.
+    """
+    takeaways: Dict[str, List[str]] = {category: [] for category in TAKEAWAY_CATEGORIES}
+    sections = []  # (category, body start, body end)
+    for candidate in _HEADING_CANDIDATE_PATTERN.finditer(response_text):
+        category = _heading_category(candidate.group())
+        if category is None:
+            continue
+        if sections:
+            sections[-1][2] = candidate.start()
+        sections.append([category, candidate.end(), len(response_text)])
+    for category, start, end in sections:
+        items = [item.rstrip() for item in TAKEAWAY_ITEM_PATTERN.findall(response_text, start, end)]
+        takeaways[category].extend(_clean_item(item) if item[:1] in "*_" else item for item in items if item)
+    if not takeaways["career_goals"]:
+        takeaways["career_goals"] = [CAREER_GOALS_FAILED]
+    if not takeaways["action_items"]:
+        takeaways["action_items"] = [ACTION_ITEMS_FAILED]
+    return takeaways
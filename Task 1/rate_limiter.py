@@ -0,0 +1,288 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Optional, TypeVar, Awaitable, AsyncIterator, Dict, Any
+
+from config import Config
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+THROTTLE_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests", "SimulatedQuotaError"}
+TRANSIENT_ERROR_NAMES = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "GatewayTimeout", "ServerError"}
+THROTTLE_STATUS_CODES = {429}
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP-style status code carried by an API exception, if any."""
+    code = getattr(error, "code", None)
+    code = code() if callable(code) else code
+    return code if isinstance(code, int) else None
+
+def is_throttle_error(error: Exception) -> bool:
+    """True for quota / rate-limit errors (HTTP 429)."""
+    return type(error).__name__ in THROTTLE_ERROR_NAMES or _status_code(error) in THROTTLE_STATUS_CODES
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for errors worth retrying: throttling, transient server errors and timeouts."""
+    return (
+        is_throttle_error(error)
+        or type(error).__name__ in TRANSIENT_ERROR_NAMES
+        or _status_code(error) in TRANSIENT_STATUS_CODES
+        or isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError))
+    )
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute, holding at most capacity tokens.
+
+    Callers reserve tokens up front; when the bucket runs dry the reservation
+    drives it negative and the caller sleeps until the debt is repaid, so
+    waiters are served in arrival order without a busy loop.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        """Create a full bucket."""
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        """Take amount tokens and return how long the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate_per_second
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) tokens after the fact without waiting."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    def acquire(self, amount: float = 1) -> float:
+        """Block until amount tokens are available; returns the time waited."""
+        wait = self._reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, amount: float = 1) -> float:
+        """Async variant of acquire."""
+        wait = self._reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit: grows by about one slot per window of successes, halves on throttling."""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, decrease_factor: float = 0.5):
+        """Start at the initial limit."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+
+    def _try_acquire(self) -> bool:
+        """Take a slot if one is free (caller holds the lock)."""
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        """Block until a slot is free."""
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                event = threading.Event()
+                self._waiters.append(event.set)
+            event.wait(timeout=1.0)
+
+    async def aacquire(self) -> None:
+        """Wait for a free slot without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                future = loop.create_future()
+                self._waiters.append(lambda: loop.call_soon_threadsafe(
+                    lambda: future.done() or future.set_result(None)
+                ))
+            try:
+                await asyncio.wait_for(future, timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, throttled: bool = False, succeeded: bool = True) -> None:
+        """Free a slot and adapt the limit to the outcome of the call."""
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            elif succeeded:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            free = int(self.limit) - self.in_flight
+            wake = [self._waiters.popleft() for _ in range(min(max(free, 0), len(self._waiters)))]
+        for waiter in wake:
+            waiter()
+        metrics.set_gauge("llm_concurrency_limit", self.limit, "Current adaptive LLM concurrency limit")
+
+class LLMRateLimiter:
+    """Client-side quota guard for LLM calls: RPM/TPM token buckets, AIMD concurrency and retries with jittered backoff."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        initial_concurrency: int = None,
+        max_concurrency: int = None,
+        max_retries: int = None,
+        backoff_base: float = None,
+        backoff_max: float = None
+    ):
+        """Build the limiter from arguments, falling back to Config."""
+        rpm = requests_per_minute if requests_per_minute is not None else Config.GEMINI_RPM
+        tpm = tokens_per_minute if tokens_per_minute is not None else Config.GEMINI_TPM
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial_concurrency or Config.GEMINI_INITIAL_CONCURRENCY,
+            maximum=max_concurrency or Config.GEMINI_MAX_CONCURRENCY
+        )
+        self.max_retries = max_retries if max_retries is not None else Config.GEMINI_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else Config.GEMINI_BACKOFF_BASE_SECONDS
+        self.backoff_max = backoff_max if backoff_max is not None else Config.GEMINI_BACKOFF_MAX_SECONDS
+
+    def _record_failure(self, error: Exception, attempt: int) -> Optional[float]:
+        """Decide whether to retry after error; returns the backoff delay, or None to give up."""
+        throttled = is_throttle_error(error)
+        if throttled:
+            metrics.inc("llm_throttled_total", 1, "LLM calls rejected for quota / rate limits")
+        if attempt >= self.max_retries or not is_retryable_error(error):
+            return None
+        metrics.inc("llm_retries_total", 1, "LLM calls retried after a retryable error")
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+        logger.warning("Retryable LLM error (%s), retry %s/%s in %.2fs", type(error).__name__, attempt + 1, self.max_retries, delay)
+        return delay
+
+    def _admit(self, estimated_tokens: int) -> None:
+        """Wait for request and token budget, then a concurrency slot."""
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(estimated_tokens)
+        self.concurrency.acquire()
+
+    async def _aadmit(self, estimated_tokens: int) -> None:
+        """Async variant of _admit."""
+        if self.requests:
+            await self.requests.aacquire(1)
+        if self.tokens:
+            await self.tokens.aacquire(estimated_tokens)
+        await self.concurrency.aacquire()
+
+    def _settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Release the slot after a success and correct the token budget with actual usage."""
+        self.concurrency.release()
+        if self.tokens and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def call(self, func: Callable[[], T], estimated_tokens: int, actual_tokens: Callable[[T], int] = None) -> T:
+        """Run func under the quota budget, retrying retryable errors."""
+        attempt = 0
+        while True:
+            self._admit(estimated_tokens)
+            try:
+                result = func()
+            except Exception as e:
+                self.concurrency.release(throttled=is_throttle_error(e), succeeded=False)
+                delay = self._record_failure(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.concurrency.release(succeeded=False)
+                raise
+            self._settle(estimated_tokens, actual_tokens(result) if actual_tokens else None)
+            return result
+
+    async def acall(self, func: Callable[[], Awaitable[T]], estimated_tokens: int, actual_tokens: Callable[[T], int] = None) -> T:
+        """Async variant of call; func is a zero-argument coroutine factory."""
+        attempt = 0
+        while True:
+            await self._aadmit(estimated_tokens)
+            try:
+                result = await func()
+            except Exception as e:
+                self.concurrency.release(throttled=is_throttle_error(e), succeeded=False)
+                delay = self._record_failure(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.concurrency.release(succeeded=False)
+                raise
+            self._settle(estimated_tokens, actual_tokens(result) if actual_tokens else None)
+            return result
+
+    async def astream(self, func: Callable[[], AsyncIterator[str]], estimated_tokens: int) -> AsyncIterator[str]:
+        """Stream func() under the quota budget; only failures before the first piece are retried."""
+        attempt = 0
+        while True:
+            await self._aadmit(estimated_tokens)
+            yielded = False
+            try:
+                async for piece in func():
+                    yielded = True
+                    yield piece
+            except Exception as e:
+                self.concurrency.release(throttled=is_throttle_error(e), succeeded=False)
+                delay = None if yielded else self._record_failure(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.concurrency.release(succeeded=False)
+                raise
+            self._settle(estimated_tokens, None)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        """Current limiter state for diagnostics."""
+        return {
+            "requests_per_minute": self.requests.rate_per_second * 60 if self.requests else None,
+            "tokens_per_minute": self.tokens.rate_per_second * 60 if self.tokens else None,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "max_retries": self.max_retries
+        }
+
+def build_rate_limiter() -> Optional[LLMRateLimiter]:
+    """Build the LLM rate limiter from Config, or None if disabled."""
+    if not Config.GEMINI_RATE_LIMIT_ENABLED:
+        return None
+    return LLMRateLimiter()
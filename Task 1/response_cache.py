@@ -0,0 +1,295 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(model_name: str, prompt: str, *extra: str) -> str:
+    """Build a content-addressed cache key from the model name, prompt and any call options."""
+    digest = hashlib.sha256()
+    for part in (model_name, prompt) + extra:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ResponseCache:
+    """Base class for LLM response caches. Subclasses implement _get/_set.
+
+    get/set are for threads; aget/aset are for the event loop. By default
+    they call _get/_set inline, which suits in-memory tiers; tiers that
+    touch disk override _aget/_aset to run in a worker thread.
+    """
+
+    name = "cache"
+
+    def __init__(self):
+        """Initialize hit/miss counters."""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, value: Optional[str]) -> None:
+        """Record a lookup as a hit or a miss."""
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss."""
+        value = self._get(key)
+        self._count(value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response under key."""
+        self._set(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for the event loop."""
+        value = await self._aget(key)
+        self._count(value)
+        return value
+
+    async def aset(self, key: str, value: str) -> None:
+        """set() for the event loop."""
+        await self._aset(key, value)
+
+    async def _aget(self, key: str) -> Optional[str]:
+        return self._get(key)
+
+    async def _aset(self, key: str, value: str) -> None:
+        self._set(key, value)
+
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this cache."""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600):
+        """Initialize the LRU cache."""
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCache(ResponseCache):
+    """On-disk cache backed by SQLite with TTL and size-bounded LRU eviction.
+
+    A lookup is a single SELECT: last-access times are buffered and written
+    in one transaction every ACCESS_FLUSH_SIZE hits or at the next eviction
+    pass. Eviction of expired and least recently used rows runs every few
+    inserts rather than on each one, so the table may briefly hold a few
+    rows over max_entries. On the event loop, reads and writes run in a
+    worker thread.
+    """
+
+    name = "sqlite"
+
+    # Buffered last-access updates written per transaction
+    ACCESS_FLUSH_SIZE = 256
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: float = 86400):
+        """Open (or create) the cache database."""
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        self._pending_access: Dict[str, float] = {}
+        self._evict_every = max(1, min(64, max_entries // 16))
+        self._sets_since_eviction = 0
+
+    def _flush_access(self) -> None:
+        """Write buffered last-access times; the caller holds the lock and commits."""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired rows first, then the least recently used ones over the size bound."""
+        self._flush_access()
+        expired = self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,)).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        ).rowcount
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            # Expired rows are left for the next eviction pass
+            if row is None or row[1] < now:
+                return None
+            self._pending_access[key] = now
+            if len(self._pending_access) >= self.ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+            return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl_seconds, now)
+            )
+            self._pending_access.pop(key, None)
+            self._sets_since_eviction += 1
+            if self._sets_since_eviction >= self._evict_every:
+                self._evict(now)
+                self._sets_since_eviction = 0
+            self._conn.commit()
+
+    async def _aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def _aset(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set, key, value)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        """Write buffered last-access times and close the database connection."""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+class TieredCache(ResponseCache):
+    """Cache that checks each tier in order and promotes hits into faster tiers."""
+
+    name = "tiered"
+
+    def __init__(self, tiers: List[ResponseCache]):
+        """Initialize with tiers ordered fastest first."""
+        super().__init__()
+        self.tiers = tiers
+
+    def _get(self, key: str) -> Optional[str]:
+        for index, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster_tier in self.tiers[:index]:
+                    faster_tier.set(key, value)
+                return value
+        return None
+
+    def _set(self, key: str, value: str) -> None:
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    async def _aget(self, key: str) -> Optional[str]:
+        for index, tier in enumerate(self.tiers):
+            value = await tier.aget(key)
+            if value is not None:
+                for faster_tier in self.tiers[:index]:
+                    await faster_tier.aset(key, value)
+                return value
+        return None
+
+    async def _aset(self, key: str, value: str) -> None:
+        for tier in self.tiers:
+            await tier.aset(key, value)
+
+    def __len__(self) -> int:
+        return len(self.tiers[0]) if self.tiers else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return overall counters plus a breakdown per tier."""
+        stats = super().stats()
+        stats["tiers"] = [tier.stats() for tier in self.tiers]
+        return stats
+
+def build_response_cache() -> Optional[ResponseCache]:
+    """Build the response cache described by Config, or None if caching is disabled."""
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    tiers: List[ResponseCache] = [
+        MemoryCache(max_entries=Config.LLM_CACHE_MAX_ENTRIES, ttl_seconds=Config.LLM_CACHE_TTL_SECONDS)
+    ]
+    if Config.LLM_CACHE_PATH:
+        tiers.append(SQLiteCache(
+            Config.LLM_CACHE_PATH,
+            max_entries=Config.LLM_CACHE_DISK_MAX_ENTRIES,
+            ttl_seconds=Config.LLM_CACHE_TTL_SECONDS
+        ))
+        logger.info("LLM response cache persisted to %s", Config.LLM_CACHE_PATH)
+    return TieredCache(tiers)
@@ -0,0 +1,101 @@
+from typing import Any, Dict, List, Optional
+
+from models import SessionSummary, FollowUpEmail
+
+# Delivery and diagnostic fields copied into a compact response when they are set
+_OPTIONAL_FIELDS = ("email_sent", "outbox_id", "email_archive_id", "email_template_path", "timings", "error")
+
+def compact_session(session_summary: SessionSummary) -> Dict[str, Any]:
+    """JSON-ready summary without derived copies: takeaways grouped by category once.
+
+    career_goals, action_items, concerns_addressed and next_steps are all
+    views of the grouped takeaways, so they are left out.
+    """
+    takeaways: Dict[str, List[str]] = {}
+    for takeaway in session_summary.key_takeaways:
+        takeaways.setdefault(takeaway.category, []).append(takeaway.content)
+    compact = {
+        "session_id": session_summary.session_id,
+        "student_name": session_summary.student_name,
+        "date": session_summary.date.isoformat(),
+        "summary_text": session_summary.summary_text,
+        "takeaways": takeaways
+    }
+    if session_summary.counselor_notes:
+        compact["counselor_notes"] = session_summary.counselor_notes
+    return compact
+
+def compact_email(follow_up_email: FollowUpEmail) -> Dict[str, Any]:
+    """The email without the session summary it embeds."""
+    return {
+        "to_email": follow_up_email.to_email,
+        "subject": follow_up_email.subject,
+        "body": follow_up_email.body,
+        "generated_at": follow_up_email.generated_at.isoformat()
+    }
+
+def compact_result(session_summary: Optional[SessionSummary], follow_up_email: Optional[FollowUpEmail]) -> Dict[str, Any]:
+    """Compact "session" and "email" entries for a processed session."""
+    compact = {}
+    if session_summary is not None:
+        compact["session"] = compact_session(session_summary)
+    if follow_up_email is not None:
+        compact["email"] = compact_email(follow_up_email)
+    return compact
+
+def compact_response(response: Any) -> Dict[str, Any]:
+    """Compact form of a ProcessSessionResponse: each piece of data once, unset fields dropped."""
+    compact = {"success": response.success, "message": response.message}
+    compact.update(compact_result(response.session_summary, response.follow_up_email))
+    for name in _OPTIONAL_FIELDS:
+        value = getattr(response, name)
+        if value is not None:
+            compact[name] = value
+    return compact
+
+def parse_fields(spec: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated fields= parameter into dotted paths; None or blank means everything."""
+    if not spec:
+        return None
+    fields = [field.strip() for field in spec.split(",") if field.strip()]
+    if not fields:
+        return None
+    for field in fields:
+        if any(not part for part in field.split(".")):
+            raise ValueError(f"Invalid field path: {field!r}")
+    return fields
+
+def _field_tree(fields: List[str]) -> Dict[str, Any]:
+    """Nest dotted paths into a tree; None marks a subtree that is kept whole."""
+    tree: Dict[str, Any] = {}
+    for field in fields:
+        node = tree
+        parts = field.split(".")
+        for index, part in enumerate(parts):
+            if index == len(parts) - 1:
+                node[part] = None
+                break
+            child = node.get(part, {})
+            if child is None:
+                break
+            node[part] = child
+            node = child
+    return tree
+
+def _select(value: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    """Keep only the parts of value named in tree; lists are projected item by item."""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {name: _select(value[name], subtree) for name, subtree in tree.items() if name in value}
+    return value
+
+def project(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Keep only the requested dotted paths of a response; success (and any error) are always kept."""
+    projected = _select(data, _field_tree(fields))
+    projected["success"] = data.get("success")
+    if data.get("error") is not None:
+        projected["error"] = data["error"]
+    return projected
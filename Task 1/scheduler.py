@@ -0,0 +1,209 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from models import SessionTranscript
+from metrics import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Highest priority first. Interactive requests are someone waiting on a response;
+# batch jobs are backfills that should only use capacity nobody else needs
+PRIORITY_CLASSES = ("interactive", "standard", "batch")
+
+UNASSIGNED_COUNSELOR = "unassigned"
+
+class SchedulerFull(RuntimeError):
+    """Raised when the scheduler queue is at SCHEDULER_MAX_QUEUED."""
+
+def counselor_key(transcript: SessionTranscript) -> str:
+    """Fair-queuing key for a session: its counselor's email, else name, else a shared bucket."""
+    counselor = next((p for p in transcript.participants if p.role == "counselor"), None)
+    if counselor is None:
+        return UNASSIGNED_COUNSELOR
+    return (counselor.email or counselor.name or UNASSIGNED_COUNSELOR).strip().lower()
+
+class _Waiter:
+    """A queued request for a slot."""
+
+    __slots__ = ("future", "priority", "counselor", "enqueued")
+
+    def __init__(self, future: asyncio.Future, priority: str, counselor: str):
+        """Record when the request was queued."""
+        self.future = future
+        self.priority = priority
+        self.counselor = counselor
+        self.enqueued = time.monotonic()
+
+class SessionScheduler:
+    """Admission control for session processing: priority classes, per-counselor fairness and a global cap.
+
+    At most max_concurrent sessions run at once. Free slots always go to
+    the highest priority class with work queued, and the last
+    interactive_reserved slots only ever go to interactive requests, so an
+    interactive request never waits behind a batch that fills the cap.
+    Within a class, counselors are served round-robin, one session at a
+    time, so a counselor with a thousand queued sessions does not delay
+    the one session of another counselor by more than one turn.
+
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, max_concurrent: int = None, interactive_reserved: int = None, max_queued: int = None):
+        """Create an idle scheduler, falling back to Config for unset limits."""
+        self.max_concurrent = max(1, max_concurrent or Config.SCHEDULER_MAX_CONCURRENT)
+        reserved = interactive_reserved if interactive_reserved is not None else Config.SCHEDULER_INTERACTIVE_RESERVED
+        self.interactive_reserved = max(0, min(reserved, self.max_concurrent - 1))
+        self.max_queued = max_queued if max_queued is not None else Config.SCHEDULER_MAX_QUEUED
+        # priority -> counselor -> waiters; dict order is the round-robin order
+        self._queues: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {priority: OrderedDict() for priority in PRIORITY_CLASSES}
+        self._queued = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._running = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._admitted = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._recent_waits: Dict[str, Deque[float]] = {priority: deque(maxlen=1024) for priority in PRIORITY_CLASSES}
+
+    @property
+    def running(self) -> int:
+        """Sessions currently holding a slot."""
+        return sum(self._running.values())
+
+    @property
+    def queued(self) -> int:
+        """Sessions waiting for a slot."""
+        return sum(self._queued.values())
+
+    def _has_capacity(self, priority: str) -> bool:
+        """Whether a session of this class may start now."""
+        limit = self.max_concurrent if priority == "interactive" else self.max_concurrent - self.interactive_reserved
+        return self.running < limit
+
+    def _pop_next(self) -> Optional[_Waiter]:
+        """Take the next waiter: highest class with capacity, then the next counselor in round-robin order."""
+        for priority in PRIORITY_CLASSES:
+            if not self._queued[priority] or not self._has_capacity(priority):
+                continue
+            queues = self._queues[priority]
+            counselor, waiters = queues.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                queues[counselor] = waiters  # back of the rotation
+            self._queued[priority] -= 1
+            return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters."""
+        while True:
+            waiter = self._pop_next()
+            if waiter is None:
+                break
+            wait = time.monotonic() - waiter.enqueued
+            self._running[waiter.priority] += 1
+            self._admitted[waiter.priority] += 1
+            self._recent_waits[waiter.priority].append(wait)
+            metrics.observe("scheduler_wait_seconds", wait, "Time sessions waited for a processing slot", priority=waiter.priority)
+            waiter.future.set_result(None)
+        self._publish()
+
+    def _publish(self) -> None:
+        """Export queue depth and running counts as gauges."""
+        for priority in PRIORITY_CLASSES:
+            metrics.set_gauge("scheduler_queue_depth", self._queued[priority], "Sessions waiting for a processing slot", priority=priority)
+            metrics.set_gauge("scheduler_running", self._running[priority], "Sessions holding a processing slot", priority=priority)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Drop a waiter whose caller gave up before getting a slot."""
+        queues = self._queues[waiter.priority]
+        waiters = queues.get(waiter.counselor)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del queues[waiter.counselor]
+        self._queued[waiter.priority] -= 1
+        self._publish()
+
+    async def acquire(self, priority: str = "interactive", counselor: str = UNASSIGNED_COUNSELOR) -> None:
+        """Wait for a processing slot; raises SchedulerFull when the queue is at its limit."""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class: {priority}")
+        if self.max_queued and self.queued >= self.max_queued:
+            metrics.inc("scheduler_rejected_total", 1, "Sessions rejected because the scheduler queue was full", priority=priority)
+            raise SchedulerFull(f"Scheduler queue is full ({self.queued} sessions waiting)")
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, counselor)
+        self._queues[priority].setdefault(counselor, deque()).append(waiter)
+        self._queued[priority] += 1
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(priority)  # granted just as the caller went away
+            else:
+                self._remove(waiter)
+            raise
+
+    def release(self, priority: str) -> None:
+        """Return a slot and start the next waiter."""
+        self._running[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive", counselor: str = UNASSIGNED_COUNSELOR) -> AsyncIterator[None]:
+        """Hold a processing slot for the duration of the block."""
+        await self.acquire(priority, counselor)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    async def run(self, func: Callable[[], Awaitable[T]], priority: str = "interactive", counselor: str = UNASSIGNED_COUNSELOR) -> T:
+        """Run func() once a slot is free."""
+        async with self.slot(priority, counselor):
+            return await func()
+
+    @staticmethod
+    def _wait_summary(waits: Deque[float]) -> Dict[str, Optional[float]]:
+        """p50/p95/max of recent waits, in milliseconds."""
+        if not waits:
+            return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(waits)
+        return {
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running sessions and recent wait times per priority class, plus the busiest counselors."""
+        now = time.monotonic()
+        classes = {}
+        depth_by_counselor: Dict[str, int] = {}
+        for priority in PRIORITY_CLASSES:
+            queues = self._queues[priority]
+            oldest = min((waiters[0].enqueued for waiters in queues.values()), default=None)
+            classes[priority] = {
+                "queued": self._queued[priority],
+                "running": self._running[priority],
+                "admitted": self._admitted[priority],
+                "oldest_wait_ms": round((now - oldest) * 1000, 2) if oldest is not None else None,
+                "recent_wait": self._wait_summary(self._recent_waits[priority])
+            }
+            for counselor, waiters in queues.items():
+                depth_by_counselor[counselor] = depth_by_counselor.get(counselor, 0) + len(waiters)
+        busiest = sorted(depth_by_counselor.items(), key=lambda item: item[1], reverse=True)[:10]
+        return {
+            "max_concurrent": self.max_concurrent,
+            "interactive_reserved": self.interactive_reserved,
+            "running": self.running,
+            "queued": self.queued,
+            "counselors_waiting": len(depth_by_counselor),
+            "classes": classes,
+            "busiest_counselors": [{"counselor": counselor, "queued": depth} for counselor, depth in busiest]
+        }
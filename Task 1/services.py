@@ -0,0 +1,183 @@
+import time
+import logging
+import threading
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Services that can be switched off, and the Config flag for each
+_ENABLED_FLAGS = {
+    "email_outbox": "EMAIL_OUTBOX_ENABLED",
+    "session_store": "SESSION_STORE_ENABLED",
+    "email_archive": "EMAIL_ARCHIVE_ENABLED",
+    "scheduler": "SCHEDULER_ENABLED"
+}
+
+class ServiceContainer:
+    """Lazily constructed application services.
+
+    Nothing heavy is built at import time: the agent (and with it the LLM
+    SDK) is created on first use or by a background warm-up started from the
+    app lifespan, so the server can accept connections immediately.
+
+    Each service has its own lock, so a slow agent build never holds up the
+    session store or the scheduler. Code on the event loop uses the async
+    get_* methods, which run a first build (directories, SQLite) in the
+    threadpool; the properties are for threads and scripts.
+    """
+
+    def __init__(self):
+        """Create an empty container."""
+        self._locks = {
+            name: threading.Lock()
+            for name in ("agent", "email_service", "email_outbox", "session_store", "email_archive", "scheduler")
+        }
+        self._agent = None
+        self._email_service = None
+        self._email_outbox = None
+        self._session_store = None
+        self._email_archive = None
+        self._scheduler = None
+        self.agent_init_seconds: Optional[float] = None
+
+    def _build_agent(self):
+        """Construct the counseling agent once (thread-safe)."""
+        with self._locks["agent"]:
+            if self._agent is None:
+                started = time.perf_counter()
+                from counseling_agent import CounselingSessionAgent
+                self._agent = CounselingSessionAgent()
+                self.agent_init_seconds = time.perf_counter() - started
+                logger.info("Counseling agent initialized in %.3fs", self.agent_init_seconds)
+            return self._agent
+
+    async def get_agent(self):
+        """Return the agent, building it off the event loop on first use."""
+        if self._agent is not None:
+            return self._agent
+        return await run_in_threadpool(self._build_agent)
+
+    @property
+    def email_service(self):
+        """The email service, created on first use."""
+        if self._email_service is None:
+            with self._locks["email_service"]:
+                if self._email_service is None:
+                    from email_service import EmailService
+                    self._email_service = EmailService()
+        return self._email_service
+
+    @property
+    def email_outbox(self):
+        """The email outbox with its workers running, or None if disabled."""
+        if not Config.EMAIL_OUTBOX_ENABLED:
+            return None
+        if self._email_outbox is None:
+            email_service = self.email_service
+            with self._locks["email_outbox"]:
+                if self._email_outbox is None:
+                    from email_outbox import EmailOutbox
+                    outbox = EmailOutbox(email_service)
+                    outbox.start()
+                    self._email_outbox = outbox
+        return self._email_outbox
+
+    @property
+    def session_store(self):
+        """The processed-session store, or None if disabled."""
+        if not Config.SESSION_STORE_ENABLED:
+            return None
+        if self._session_store is None:
+            with self._locks["session_store"]:
+                if self._session_store is None:
+                    from session_store import SessionStore
+                    self._session_store = SessionStore()
+        return self._session_store
+
+    @property
+    def email_archive(self):
+        """The email archive with its writer running, or None if disabled."""
+        if not Config.EMAIL_ARCHIVE_ENABLED:
+            return None
+        if self._email_archive is None:
+            with self._locks["email_archive"]:
+                if self._email_archive is None:
+                    from email_archive import EmailArchive
+                    self._email_archive = EmailArchive()
+        return self._email_archive
+
+    @property
+    def scheduler(self):
+        """The session scheduler, or None if disabled."""
+        if not Config.SCHEDULER_ENABLED:
+            return None
+        if self._scheduler is None:
+            with self._locks["scheduler"]:
+                if self._scheduler is None:
+                    from scheduler import SessionScheduler
+                    self._scheduler = SessionScheduler()
+        return self._scheduler
+
+    async def _aget(self, name: str):
+        """Return a service from the event loop, building it in the threadpool the first time."""
+        service = getattr(self, f"_{name}")
+        if service is not None:
+            return service
+        flag = _ENABLED_FLAGS.get(name)
+        if flag and not getattr(Config, flag):
+            return None
+        return await run_in_threadpool(getattr, self, name)
+
+    async def get_email_service(self):
+        """Async access to email_service."""
+        return await self._aget("email_service")
+
+    async def get_email_outbox(self):
+        """Async access to email_outbox."""
+        return await self._aget("email_outbox")
+
+    async def get_session_store(self):
+        """Async access to session_store."""
+        return await self._aget("session_store")
+
+    async def get_email_archive(self):
+        """Async access to email_archive."""
+        return await self._aget("email_archive")
+
+    async def get_scheduler(self):
+        """Async access to scheduler."""
+        return await self._aget("scheduler")
+
+    def status(self) -> dict:
+        """Which services have been initialized so far."""
+        return {
+            "counseling_agent": "initialized" if self._agent is not None else "pending",
+            "email_service": "initialized" if self._email_service is not None else "pending",
+            "email_outbox": "disabled" if not Config.EMAIL_OUTBOX_ENABLED
+            else "initialized" if self._email_outbox is not None else "pending",
+            "session_store": "disabled" if not Config.SESSION_STORE_ENABLED
+            else "initialized" if self._session_store is not None else "pending",
+            "email_archive": "disabled" if not Config.EMAIL_ARCHIVE_ENABLED
+            else "initialized" if self._email_archive is not None else "pending",
+            "scheduler": "disabled" if not Config.SCHEDULER_ENABLED
+            else "initialized" if self._scheduler is not None else "pending"
+        }
+
+    def close(self):
+        """Stop background workers and release pooled connections."""
+        if self._email_outbox is not None:
+            self._email_outbox.close()
+            self._email_outbox = None
+        if self._email_service is not None:
+            self._email_service.close()
+            self._email_service = None
+        if self._session_store is not None:
+            self._session_store.close()
+            self._session_store = None
+        if self._email_archive is not None:
+            self._email_archive.close()
+            self._email_archive = None
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
+
+from models import SessionTranscript, SessionSummary, FollowUpEmail
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """SQLite store of processed sessions, keyed by session ID and indexed by student name and date.
+
+    Each row keeps the transcript, the generated summary and the follow-up
+    email as JSON, so results can be served again without re-running the
+    LLM pipeline. Saving a session ID again replaces the earlier result.
+    """
+
+    def __init__(self, path: str = None):
+        """Open (or create) the store database."""
+        self.path = path or Config.SESSION_STORE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, student_name TEXT NOT NULL, session_date TEXT NOT NULL, "
+            "summary_text TEXT NOT NULL, transcript_json TEXT NOT NULL, summary_json TEXT NOT NULL, "
+            "email_json TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_student ON sessions(student_name COLLATE NOCASE, session_date)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_date ON sessions(session_date)")
+        self._conn.commit()
+
+    def save(self, transcript: SessionTranscript, session_summary: SessionSummary, follow_up_email: Optional[FollowUpEmail] = None) -> None:
+        """Insert or replace the stored result for a session."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, student_name, session_date, summary_text, transcript_json, "
+                "summary_json, email_json, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET student_name = excluded.student_name, "
+                "session_date = excluded.session_date, summary_text = excluded.summary_text, "
+                "transcript_json = excluded.transcript_json, summary_json = excluded.summary_json, "
+                "email_json = excluded.email_json, updated_at = excluded.updated_at",
+                (
+                    transcript.session_id,
+                    session_summary.student_name,
+                    session_summary.date.isoformat(),
+                    session_summary.summary_text,
+                    transcript.model_dump_json(),
+                    session_summary.model_dump_json(),
+                    follow_up_email.model_dump_json() if follow_up_email else None,
+                    now,
+                    now
+                )
+            )
+            self._conn.commit()
+        logger.info("Stored result for session %s", transcript.session_id)
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored summary and email for a session, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT session_id, student_name, session_date, created_at, updated_at, summary_json, email_json "
+                "FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "session_id": row[0],
+            "student_name": row[1],
+            "date": row[2],
+            "created_at": row[3],
+            "updated_at": row[4],
+            "session_summary": json.loads(row[5]),
+            "follow_up_email": json.loads(row[6]) if row[6] else None
+        }
+
+    def get_result(self, session_id: str) -> Optional[Tuple[SessionTranscript, SessionSummary, Optional[FollowUpEmail]]]:
+        """Return the stored transcript, summary and email as models, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT transcript_json, summary_json, email_json FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return (
+            SessionTranscript.model_validate_json(row[0]),
+            SessionSummary.model_validate_json(row[1]),
+            FollowUpEmail.model_validate_json(row[2]) if row[2] else None
+        )
+
+    def list_sessions(
+        self,
+        student_name: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Page through stored sessions, newest first, optionally filtered by student name and date range."""
+        clauses, params = [], []
+        if student_name:
+            clauses.append("student_name = ? COLLATE NOCASE")
+            params.append(student_name)
+        if date_from:
+            clauses.append("session_date >= ?")
+            params.append(date_from.isoformat())
+        if date_to:
+            clauses.append("session_date <= ?")
+            params.append(date_to.isoformat())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM sessions{where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT session_id, student_name, session_date, summary_text, updated_at FROM sessions{where} "
+                "ORDER BY session_date DESC, session_id LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return {
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "items": [
+                {"session_id": row[0], "student_name": row[1], "date": row[2], "summary_text": row[3], "updated_at": row[4]}
+                for row in rows
+            ]
+        }
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,52 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def flight_key(session_id: str, transcript_json: str, *options: Any) -> str:
+    """Key identifying identical work: session ID, transcript content hash and request options."""
+    digest = hashlib.sha256(transcript_json.encode("utf-8")).hexdigest()
+    return "\x1f".join([session_id, digest] + [str(option) for option in options])
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one in-flight computation.
+
+    The first caller starts the work as a task; callers arriving while it
+    runs await the same task and receive the same result or exception. The
+    task is shielded, so a caller that disconnects does not cancel the work
+    for the others. Nothing is cached: once the task finishes, the next call
+    starts fresh.
+    """
+
+    def __init__(self, name: str = "default"):
+        """Create an empty flight group."""
+        self.name = name
+        self._flights: Dict[str, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        """Number of computations currently running."""
+        return len(self._flights)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func() for key, or join the computation already running for it."""
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._flights[key] = task
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+        else:
+            metrics.inc("singleflight_coalesced_total", 1, "Requests that joined an identical in-flight computation", group=self.name)
+            logger.info("Joining in-flight %s computation", self.name)
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        """Drop a finished flight so later calls recompute."""
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Retrieve any exception so a flight whose callers all left does not log "never retrieved"
+            task.exception()
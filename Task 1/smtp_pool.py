@@ -0,0 +1,139 @@
+import time
+import smtplib
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SMTPConnectionPool:
+    """Pool of authenticated SMTP sessions reused across messages.
+
+    Connections are created lazily, checked with NOOP before reuse when they
+    have been idle for a while, and replaced transparently when the server
+    has dropped them. At most ``max_connections`` sessions are open at once.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        max_connections: int = 4,
+        idle_timeout: float = 60,
+        health_check_after: float = 5,
+        connect_timeout: float = 30,
+        use_tls: bool = True
+    ):
+        """Initialize the pool; no connection is opened until first use."""
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.connect_timeout = connect_timeout
+        self.use_tls = use_tls
+
+        self._idle: Deque[Tuple[smtplib.SMTP, float]] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._closed = False
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        """Open and authenticate a new SMTP session."""
+        server = smtplib.SMTP(self.host, self.port, timeout=self.connect_timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            server.ehlo_or_helo_if_needed()
+            # With credentials configured, a server that does not offer AUTH (misconfigured, or
+            # before STARTTLS) makes login() raise SMTPNotSupportedError rather than sending unauthenticated
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close_quietly(server)
+            raise
+        self.connections_opened += 1
+        logger.info("Opened SMTP connection to %s:%s", self.host, self.port)
+        return server
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        """Check a session with NOOP."""
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(server: smtplib.SMTP) -> None:
+        """Close a session, ignoring errors from an already-dead connection."""
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _checkout(self) -> smtplib.SMTP:
+        """Take a healthy idle session from the pool, or open a new one."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, returned_at = self._idle.pop()
+            idle_for = time.monotonic() - returned_at
+            if idle_for > self.idle_timeout:
+                self._close_quietly(server)
+                continue
+            if idle_for > self.health_check_after and not self._is_alive(server):
+                self._close_quietly(server)
+                continue
+            return server
+        return self._connect()
+
+    def _checkin(self, server: smtplib.SMTP) -> None:
+        """Return a session to the pool."""
+        with self._lock:
+            if not self._closed:
+                self._idle.append((server, time.monotonic()))
+                return
+        self._close_quietly(server)
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """Borrow an authenticated session for the duration of the block."""
+        if self._closed:
+            raise RuntimeError("SMTP connection pool is closed")
+        self._slots.acquire()
+        try:
+            server = self._checkout()
+            try:
+                yield server
+            except Exception:
+                # Keep the session only if the failure was message-level, not a dead connection
+                if self._is_alive(server):
+                    self._checkin(server)
+                else:
+                    self._close_quietly(server)
+                raise
+            else:
+                self._checkin(server)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """Close every idle session and refuse further checkouts."""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for server, _ in idle:
+            self._close_quietly(server)
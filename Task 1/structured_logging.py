@@ -0,0 +1,169 @@
+import re
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+import logging.handlers
+from typing import Any, Dict, Optional
+
+from config import Config
+from metrics import metrics
+
+EMAIL_ADDRESS_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+_lock = threading.Lock()
+
+def _parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "category=rate,..." into a dict, ignoring malformed entries."""
+    rates = {}
+    for entry in spec.split(","):
+        name, _, rate = entry.partition("=")
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+SAMPLE_RATES = _parse_sample_rates(Config.LOG_SAMPLE_RATES)
+REDACT_FIELDS = {name.strip().lower() for name in Config.LOG_REDACT_FIELDS.split(",") if name.strip()}
+
+def sampled(category: Optional[str]) -> bool:
+    """Decide whether an event of this category is kept; categories without a rate are always kept."""
+    rate = SAMPLE_RATES.get(category, 1.0) if category else 1.0
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+def clip(value: Any, limit: int = None) -> Any:
+    """Truncate long strings, noting how much was cut."""
+    limit = limit if limit is not None else Config.LOG_MAX_FIELD_CHARS
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...[{len(value) - limit} more chars]"
+    return value
+
+def scrub(name: str, value: Any) -> Any:
+    """Redact sensitive fields by name and email addresses inside text, then truncate."""
+    if name.lower() in REDACT_FIELDS:
+        return "[redacted]"
+    if isinstance(value, str):
+        value = clip(value)
+        if Config.LOG_REDACT_EMAILS:
+            value = EMAIL_ADDRESS_PATTERN.sub("[email]", value)
+        return value
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return clip(str(value))
+
+def log_event(logger: logging.Logger, level: int, event: str, category: str = None, **fields: Any) -> None:
+    """Log a structured event.
+
+    The level and sample checks run before a record is created, and fields
+    are passed through untouched: truncation, redaction and serialization
+    happen later on the listener thread, so large payloads such as prompts
+    cost a reference on the calling thread rather than a copy.
+    """
+    if not logger.isEnabledFor(level) or not sampled(category):
+        return
+    logger.log(level, event, extra={"event": event, "category": category, "fields": fields}, stacklevel=2)
+
+def _event_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """Structured fields of a record: log_event fields plus any other extra= attributes."""
+    fields = dict(getattr(record, "fields", None) or {})
+    for name, value in vars(record).items():
+        if name not in _RECORD_ATTRIBUTES and name not in ("event", "category", "fields"):
+            fields[name] = value
+    return {name: scrub(name, value) for name, value in fields.items()}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event or message, and scrubbed fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Serialize a record."""
+        payload = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name
+        }
+        event = getattr(record, "event", None)
+        if event:
+            payload["event"] = event
+        else:
+            payload["message"] = scrub("message", record.getMessage())
+        category = getattr(record, "category", None)
+        if category:
+            payload["category"] = category
+        payload.update(_event_fields(record))
+        if record.exc_info:
+            payload["exception"] = clip(self.formatException(record.exc_info), Config.LOG_MAX_FIELD_CHARS * 4)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs: the usual prefix, then key=value fields."""
+
+    def __init__(self):
+        """Use the standard level/name/message prefix."""
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record with its scrubbed fields appended."""
+        line = super().format(record)
+        fields = _event_fields(record)
+        if fields:
+            line += " " + " ".join(f"{name}={value!r}" for name, value in fields.items())
+        return line
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks or formats on the calling thread.
+
+    The stock QueueHandler merges msg and args in prepare(); here the record
+    is queued as is and the listener thread does all the formatting. When
+    the bounded queue is full the record is dropped and counted instead of
+    stalling the request.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Queue the record unformatted."""
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Put the record on the queue, dropping it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total", 1, "Log records dropped because the log queue was full")
+
+def configure_logging(level: str = None, log_format: str = None) -> None:
+    """Route all logging through a background queue listener; safe to call more than once."""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JsonFormatter() if (log_format or Config.LOG_FORMAT) == "json" else TextFormatter())
+        records: queue.Queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        _queue_handler = NonBlockingQueueHandler(records)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(getattr(logging, (level or Config.LOG_LEVEL).upper()))
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
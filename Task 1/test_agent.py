@@ -1,245 +1,1507 @@
-# #!/usr/bin/env python3
-# """
-# Test script for the Counseling Session Agent
-
-# This script tests the core functionality of the AI agent without requiring
-# an actual Gemini API key (uses mock responses).
-# """
-
-# import json
-# import unittest
-# from unittest.mock import Mock, patch
-# from datetime import datetime
-
-# from models import SessionTranscript, SessionParticipant, AgentResponse
-# from counseling_agent import CounselingSessionAgent
-
-# class TestCounselingSessionAgent(unittest.TestCase):
-#     """Test cases for the CounselingSessionAgent class."""
-    
-#     def setUp(self):
-#         """Set up test fixtures."""
-#         # Create a sample transcript for testing
-#         self.sample_transcript = SessionTranscript(
-#             session_id="test_session_001",
-#             date=datetime.now(),
-#             participants=[
-#                 SessionParticipant(name="Dr. Test", role="counselor"),
-#                 SessionParticipant(name="Test Student", role="student", email="test@university.edu")
-#             ],
-#             transcript="""
-#             Counselor: Hello, how are you doing today?
-#             Student: I'm doing well, thank you. I've been thinking about my career goals.
-#             Counselor: That's great! What specific goals do you have?
-#             Student: I want to work in software development and learn machine learning.
-#             Counselor: Excellent! Let's create a plan for you.
-#             Student: That would be very helpful.
-#             """,
-#             duration_minutes=30
-#         )
-        
-#         # Mock LLM responses
-#         self.mock_takeaways_response = {
-#             "career_goals": ["Work in software development", "Learn machine learning"],
-#             "action_items": ["Create a study plan", "Apply for internships"],
-#             "concerns": ["Need to improve technical skills"],
-#             "achievements": ["Completed basic programming courses"],
-#             "insights": ["Student is motivated and has clear goals"]
-#         }
-        
-#         self.mock_summary_response = """
-#         This session focused on Test Student's career aspirations in software development and machine learning. 
-#         The student demonstrated clear motivation and has already completed foundational programming courses. 
-#         Key action items include creating a structured study plan and applying for relevant internships.
-#         """
-        
-#         self.mock_email_response = """
-#         Dear Test Student,
-        
-#         Thank you for our productive career counseling session today. I enjoyed discussing your goals in software development and machine learning.
-        
-#         As we discussed, your next steps include creating a study plan and applying for internships. I'm confident you'll make great progress toward your career goals.
-        
-#         Please don't hesitate to reach out if you need any guidance along the way.
-        
-#         Best regards,
-#         Dr. Test
-#         """
-    
-#     @patch('counseling_agent.ChatGoogleGenerativeAI')
-#     def test_extract_key_takeaways(self, mock_chat_gemini):
-#         """Test key takeaways extraction."""
-#         # Mock the LLM response
-#         mock_llm = Mock()
-#         mock_llm.invoke.return_value.content = json.dumps(self.mock_takeaways_response)
-#         mock_chat_gemini.return_value = mock_llm
-        
-#         # Initialize agent
-#         agent = CounselingSessionAgent()
-        
-#         # Test extraction
-#         result = agent.extract_key_takeaways(self.sample_transcript.transcript)
-        
-#         # Verify results
-#         self.assertIn("career_goals", result)
-#         self.assertIn("action_items", result)
-#         self.assertEqual(len(result["career_goals"]), 2)
-#         self.assertEqual(len(result["action_items"]), 2)
-    
-#     @patch('counseling_agent.ChatGoogleGenerativeAI')
-#     def test_generate_session_summary(self, mock_chat_gemini):
-#         """Test session summary generation."""
-#         # Mock the LLM response
-#         mock_llm = Mock()
-#         mock_llm.invoke.return_value.content = self.mock_summary_response
-#         mock_chat_gemini.return_value = mock_llm
-        
-#         # Initialize agent
-#         agent = CounselingSessionAgent()
-        
-#         # Test summary generation
-#         summary = agent.generate_session_summary(
-#             self.sample_transcript, 
-#             self.mock_takeaways_response
-#         )
-        
-#         # Verify summary
-#         self.assertEqual(summary.session_id, "test_session_001")
-#         self.assertEqual(summary.student_name, "Test Student")
-#         self.assertIsNotNone(summary.summary_text)
-#         self.assertEqual(len(summary.career_goals), 2)
-#         self.assertEqual(len(summary.action_items), 2)
-    
-#     @patch('counseling_agent.ChatGoogleGenerativeAI')
-#     def test_generate_follow_up_email(self, mock_chat_gemini):
-#         """Test follow-up email generation."""
-#         # Mock the LLM response
-#         mock_llm = Mock()
-#         mock_llm.invoke.return_value.content = self.mock_email_response
-#         mock_chat_gemini.return_value = mock_llm
-        
-#         # Initialize agent
-#         agent = CounselingSessionAgent()
-        
-#         # Create a session summary
-#         summary = agent.generate_session_summary(
-#             self.sample_transcript, 
-#             self.mock_takeaways_response
-#         )
-        
-#         # Test email generation
-#         email = agent.generate_follow_up_email(summary, "test@university.edu")
-        
-#         # Verify email
-#         self.assertEqual(email.to_email, "test@university.edu")
-#         self.assertIn("Follow-up", email.subject)
-#         self.assertIsNotNone(email.body)
-    
-#     @patch('counseling_agent.ChatGoogleGenerativeAI')
-#     def test_process_session_complete(self, mock_chat_gemini):
-#         """Test complete session processing."""
-#         # Mock the LLM responses
-#         mock_llm = Mock()
-#         mock_llm.invoke.side_effect = [
-#             Mock(content=json.dumps(self.mock_takeaways_response)),
-#             Mock(content=self.mock_summary_response),
-#             Mock(content=self.mock_email_response)
-#         ]
-#         mock_chat_gemini.return_value = mock_llm
-        
-#         # Initialize agent
-#         agent = CounselingSessionAgent()
-        
-#         # Test complete processing
-#         result = agent.process_session(self.sample_transcript)
-        
-#         # Verify result
-#         self.assertTrue(result.success)
-#         self.assertIsNotNone(result.data["session_summary"])
-#         self.assertIsNotNone(result.data["follow_up_email"])
-#         self.assertIsNotNone(result.data["key_takeaways"])
-    
-#     def test_fallback_extraction(self):
-#         """Test fallback extraction when JSON parsing fails."""
-#         # Initialize agent
-#         agent = CounselingSessionAgent()
-        
-#         # Test with malformed response
-#         malformed_response = """
-#         Career Goals:
-#         - Work in software development
-#         - Learn machine learning
-        
-#         Action Items:
-#         - Create study plan
-#         - Apply for internships
-#         """
-        
-#         result = agent._fallback_extraction(malformed_response)
-        
-#         # Verify fallback extraction
-#         self.assertIn("career_goals", result)
-#         self.assertIn("action_items", result)
-#         self.assertTrue(len(result["career_goals"]) > 0)
-#         self.assertTrue(len(result["action_items"]) > 0)
-
-# class TestDataModels(unittest.TestCase):
-#     """Test cases for data models."""
-    
-#     def test_session_transcript_validation(self):
-#         """Test SessionTranscript model validation."""
-#         # Valid transcript
-#         transcript = SessionTranscript(
-#             session_id="test_001",
-#             date=datetime.now(),
-#             participants=[
-#                 SessionParticipant(name="Dr. Test", role="counselor"),
-#                 SessionParticipant(name="Student", role="student")
-#             ],
-#             transcript="Test transcript content"
-#         )
-        
-#         self.assertEqual(transcript.session_id, "test_001")
-#         self.assertEqual(len(transcript.participants), 2)
-    
-#     def test_session_participant_validation(self):
-#         """Test SessionParticipant model validation."""
-#         participant = SessionParticipant(
-#             name="Test Student",
-#             role="student",
-#             email="test@university.edu"
-#         )
-        
-#         self.assertEqual(participant.name, "Test Student")
-#         self.assertEqual(participant.role, "student")
-#         self.assertEqual(participant.email, "test@university.edu")
-
-# def run_tests():
-#     """Run all tests."""
-#     print("🧪 Running Counseling Session Agent Tests (Gemini)")
-#     print("=" * 50)
-    
-#     # Create test suite
-#     test_suite = unittest.TestSuite()
-    
-#     # Add test cases
-#     test_suite.addTest(unittest.makeSuite(TestCounselingSessionAgent))
-#     test_suite.addTest(unittest.makeSuite(TestDataModels))
-    
-#     # Run tests
-#     runner = unittest.TextTestRunner(verbosity=2)
-#     result = runner.run(test_suite)
-    
-#     # Print summary
-#     print("\n" + "=" * 50)
-#     if result.wasSuccessful():
-#         print("✅ All tests passed!")
-#     else:
-#         print("❌ Some tests failed!")
-#         print(f"Failures: {len(result.failures)}")
-#         print(f"Errors: {len(result.errors)}")
-    
-#     return result.wasSuccessful()
-
-# if __name__ == "__main__":
-#     run_tests() 
\ No newline at end of file
+#!/usr/bin/env python3
+"""
+Test script for the Counseling Session Agent
+
+This script tests the core functionality of the AI agent without requiring
+an actual Gemini API key.
+"""
+
+import os
+import gzip
+import glob
+import json
+import time
+import asyncio
+import socket
+import smtplib
+import sqlite3
+import threading
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    Controller = None
+try:
+    import google.generativeai as genai
+    from google.generativeai import caching
+except ImportError:
+    genai = None
+
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import api
+import compression
+import response_cache
+import httpx
+import rate_limiter
+from compression import CompressionMiddleware, choose_encoding
+from config import Config
+from counseling_agent import CounselingSessionAgent
+from llm_backends import FakeBackend, GeminiBackend, SimulatedQuotaError
+from email_archive import EmailArchive, SEGMENT_SUFFIX
+from email_outbox import EmailOutbox, PENDING, SENDING, SENT, FAILED
+from email_service import EmailService
+from models import SessionTranscript, SessionParticipant, SessionSummary, FollowUpEmail
+from prompts import parse_takeaways, CAREER_GOALS_FAILED, ACTION_ITEMS_FAILED
+from response_format import parse_fields
+from smtp_pool import SMTPConnectionPool
+from rate_limiter import TokenBucket, AdaptiveConcurrencyLimiter, LLMRateLimiter
+from response_cache import MemoryCache, SQLiteCache, TieredCache
+from scheduler import SessionScheduler, SchedulerFull, counselor_key
+from services import ServiceContainer
+from session_store import SessionStore
+from singleflight import SingleFlight
+
+class RecordingBackend(FakeBackend):
+    """FakeBackend that remembers the prompts it was sent."""
+    
+    def __init__(self):
+        super().__init__(latency=0, jitter=0)
+        self.prompts = []
+    
+    async def agenerate(self, prompt, generation_config=None, context=None):
+        self.prompts.append(prompt)
+        return await super().agenerate(prompt, generation_config, context)
+
+class TestCounselingSessionAgent(unittest.TestCase):
+    """Test cases for the CounselingSessionAgent pipelines, run offline through the fake backend."""
+    
+    TRANSCRIPT = """Counselor: Hello, how are you doing today?
+Student: I'm doing well, thank you. I've been thinking about my career goals.
+Counselor: That's great! What specific goals do you have?
+Student: I want to work in software development and learn machine learning.
+Counselor: Excellent! Let's create a plan for you.
+Student: That would be very helpful."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        patcher = mock.patch.multiple(
+            Config, LLM_CACHE_ENABLED=False, GEMINI_RATE_LIMIT_ENABLED=False, CONTEXT_CACHE_ENABLED=False,
+            PIPELINE_MODE="multi_call", EMAIL_MODE="llm", CHUNK_TOKEN_BUDGET=8000, CHUNK_MAX_CONCURRENCY=4
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = RecordingBackend()
+        self.agent = CounselingSessionAgent(backend=self.backend)
+        self.sample_transcript = self.make_transcript(self.TRANSCRIPT)
+    
+    @staticmethod
+    def make_transcript(text: str, student_email: str = "test@university.edu") -> SessionTranscript:
+        """A session with a counselor and a student."""
+        return SessionTranscript(
+            session_id="test_session_001",
+            date=datetime(2026, 3, 2, 10, 0),
+            participants=[
+                SessionParticipant(name="Dr. Test", role="counselor"),
+                SessionParticipant(name="Test Student", role="student", email=student_email)
+            ],
+            transcript=text,
+            duration_minutes=30
+        )
+    
+    def process(self, transcript: SessionTranscript, **kwargs):
+        """Run aprocess_session to completion."""
+        return asyncio.run(self.agent.aprocess_session(transcript, **kwargs))
+    
+    def process_incremental(self, transcript: SessionTranscript, previous, previous_transcript: SessionTranscript = None, **kwargs):
+        """Run aprocess_incremental against a previous response."""
+        return asyncio.run(self.agent.aprocess_incremental(
+            transcript,
+            previous_transcript or self.sample_transcript,
+            previous.data.session_summary,
+            previous.data.follow_up_email,
+            **kwargs
+        ))
+    
+    def test_multi_call_pipeline(self):
+        """Takeaways, summary and email each take one call and are parsed into the response."""
+        response = self.process(self.sample_transcript, mode="multi_call")
+        
+        self.assertTrue(response.success, response.error)
+        self.assertEqual(self.backend.calls, 3)
+        result = response.data
+        self.assertEqual(len(result.key_takeaways["career_goals"]), 2)
+        self.assertTrue(result.key_takeaways["career_goals"][0].startswith("Pursue a role"))
+        self.assertEqual(len(result.key_takeaways["action_items"]), 3)
+        self.assertEqual(result.key_takeaways["concerns"], ["Uncertainty about which path to choose"])
+        self.assertEqual(result.session_summary.student_name, "Test Student")
+        self.assertIn("career direction", result.session_summary.summary_text)
+        self.assertEqual(result.follow_up_email.to_email, "test@university.edu")
+        self.assertEqual(result.follow_up_email.generated_by, "llm")
+    
+    def test_single_shot_pipeline(self):
+        """Single-shot mode makes one JSON call and returns the same shape of result."""
+        response = self.process(self.sample_transcript, mode="single_shot")
+        
+        self.assertTrue(response.success, response.error)
+        self.assertEqual(self.backend.calls, 1)
+        result = response.data
+        self.assertEqual(len(result.key_takeaways["career_goals"]), 2)
+        self.assertEqual(len(result.key_takeaways["action_items"]), 3)
+        self.assertEqual(result.key_takeaways["insights"], ["Student is motivated and reflective"])
+        self.assertIn("career direction", result.session_summary.summary_text)
+        self.assertIn("Thank you for meeting today", result.follow_up_email.body)
+        self.assertEqual(result.follow_up_email.generated_by, "llm")
+    
+    def test_single_shot_with_template_email(self):
+        """Template email mode leaves the email out of the single-shot call and fills in the template."""
+        response = self.process(self.sample_transcript, mode="single_shot", email_mode="template")
+        
+        self.assertTrue(response.success, response.error)
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual(response.data.follow_up_email.generated_by, "template")
+        self.assertIn("Dr. Test", response.data.follow_up_email.body)
+    
+    def test_long_transcript_is_map_reduced(self):
+        """A transcript over the token budget is extracted and summarized per chunk, then merged."""
+        lines = []
+        for index in range(40):
+            lines.append(f"Counselor: Question {index} about your plans for the coming semester?")
+            lines.append(f"Student: Answer {index}, I would like to explore another internship option.")
+        transcript = self.make_transcript("\n".join(lines))
+        
+        with mock.patch.object(Config, "CHUNK_TOKEN_BUDGET", 200):
+            chunks = self.agent._chunk(transcript.transcript)
+            self.assertGreater(len(chunks), 1)
+            for mode in ("multi_call", "single_shot"):
+                with self.subTest(mode=mode):
+                    self.backend.calls = 0
+                    response = self.process(transcript, mode=mode)
+                    
+                    self.assertTrue(response.success, response.error)
+                    # One extraction and one partial summary per chunk, the combine step and the email
+                    self.assertEqual(self.backend.calls, 2 * len(chunks) + 2)
+                    key_takeaways = response.data.key_takeaways
+                    # Each chunk yields its own goals; the shared action items are merged once
+                    self.assertEqual(len(key_takeaways["career_goals"]), 2 * len(chunks))
+                    self.assertEqual(len(key_takeaways["action_items"]), len(chunks) + 2)
+                    self.assertEqual(key_takeaways["concerns"], ["Uncertainty about which path to choose"])
+        self.assertTrue(all(len(prompt) < len(transcript.transcript) for prompt in self.backend.prompts))
+    
+    def test_incremental_sends_only_the_appended_exchanges(self):
+        """An appended transcript extracts from the delta and updates the previous summary."""
+        previous = self.process(self.sample_transcript)
+        appended = self.make_transcript(self.TRANSCRIPT + "\nStudent: I also want to look at data science roles.")
+        self.backend.calls = 0
+        self.backend.prompts = []
+        
+        response = self.process_incremental(appended, previous)
+        
+        self.assertTrue(response.success, response.error)
+        self.assertEqual(response.message, "Session processed incrementally")
+        self.assertEqual(self.backend.calls, 3)
+        self.assertFalse(any("how are you doing today" in prompt for prompt in self.backend.prompts))
+        self.assertTrue(any("data science roles" in prompt for prompt in self.backend.prompts))
+        goals = response.data.key_takeaways["career_goals"]
+        self.assertEqual(goals[:2], previous.data.key_takeaways["career_goals"])
+        self.assertEqual(len(goals), 4)
+        self.assertNotEqual(response.data.session_summary.summary_text, previous.data.session_summary.summary_text)
+    
+    def test_incremental_unchanged_transcript_reuses_result(self):
+        """An unchanged transcript makes no LLM calls and keeps the stored email."""
+        previous = self.process(self.sample_transcript)
+        self.backend.calls = 0
+        
+        response = self.process_incremental(self.make_transcript(self.TRANSCRIPT), previous)
+        
+        self.assertTrue(response.success, response.error)
+        self.assertEqual(self.backend.calls, 0)
+        self.assertEqual(response.data.key_takeaways, previous.data.key_takeaways)
+        self.assertEqual(response.data.follow_up_email.body, previous.data.follow_up_email.body)
+    
+    def test_incremental_changed_participants_reprocesses(self):
+        """A changed student address is not an append: the session is processed again for the new address."""
+        previous = self.process(self.sample_transcript)
+        self.backend.calls = 0
+        
+        response = self.process_incremental(self.make_transcript(self.TRANSCRIPT, "new@university.edu"), previous)
+        
+        self.assertTrue(response.success, response.error)
+        self.assertEqual(response.message, "Session processed successfully")
+        self.assertEqual(self.backend.calls, 3)
+        self.assertEqual(response.data.follow_up_email.to_email, "new@university.edu")
+    
+    def test_incremental_reuse_honors_email_mode(self):
+        """Reusing an LLM-written result with template email mode rewrites only the email, without LLM calls."""
+        previous = self.process(self.sample_transcript)
+        self.backend.calls = 0
+        
+        response = self.process_incremental(self.make_transcript(self.TRANSCRIPT), previous, email_mode="template")
+        
+        self.assertTrue(response.success, response.error)
+        self.assertEqual(self.backend.calls, 0)
+        self.assertEqual(response.data.follow_up_email.generated_by, "template")
+        self.assertEqual(response.data.key_takeaways, previous.data.key_takeaways)
+
+
+class TestDataModels(unittest.TestCase):
+    """Test cases for data models."""
+    
+    def test_session_transcript_validation(self):
+        """Test SessionTranscript model validation."""
+        # Valid transcript
+        transcript = SessionTranscript(
+            session_id="test_001",
+            date=datetime.now(),
+            participants=[
+                SessionParticipant(name="Dr. Test", role="counselor"),
+                SessionParticipant(name="Student", role="student")
+            ],
+            transcript="Test transcript content"
+        )
+        
+        self.assertEqual(transcript.session_id, "test_001")
+        self.assertEqual(len(transcript.participants), 2)
+    
+    def test_session_participant_validation(self):
+        """Test SessionParticipant model validation."""
+        participant = SessionParticipant(
+            name="Test Student",
+            role="student",
+            email="test@university.edu"
+        )
+        
+        self.assertEqual(participant.name, "Test Student")
+        self.assertEqual(participant.role, "student")
+        self.assertEqual(participant.email, "test@university.edu")
+
+class TestTakeawayParser(unittest.TestCase):
+    """Test cases for the regex takeaway parser."""
+    
+    ITEMS = """- Work in software development
+* Learn machine learning
+"""
+    ACTIONS = """1. Create a study plan
+• Apply for internships
+"""
+    EXPECTED = {
+        "career_goals": ["Work in software development", "Learn machine learning"],
+        "action_items": ["Create a study plan", "Apply for internships"]
+    }
+    
+    def build_response(self, goals_heading, actions_heading):
+        """A takeaways response with the given section headings."""
+        return f"Here is what I found:\n\n{goals_heading}\n{self.ITEMS}\n{actions_heading}\n{self.ACTIONS}"
+    
+    def assert_sections(self, parsed, expected):
+        """Career goals and action items match the expected ones."""
+        self.assertEqual(parsed["career_goals"], expected["career_goals"])
+        self.assertEqual(parsed["action_items"], expected["action_items"])
+    
+    def test_prefix_headings(self):
+        """Headings that start with the section name give every item."""
+        headings = [
+            ("Career Goals", "Action Items"),
+            ("Career Goals:", "Action Items:"),
+            ("career goals", "action items"),
+            ("Career Goals mentioned by the participants:", "Action Items agreed on:"),
+            ("Career goals discussed", "Action items for next week")
+        ]
+        for goals_heading, actions_heading in headings:
+            with self.subTest(goals_heading=goals_heading):
+                self.assert_sections(parse_takeaways(self.build_response(goals_heading, actions_heading)), self.EXPECTED)
+    
+    def test_markdown_numbered_and_bold_headings(self):
+        """Decorated headings give the same items as the plain ones."""
+        headings = [
+            ("## Career Goals", "## Action Items"),
+            ("**Career Goals:**", "**Action Items:**"),
+            ("**1. Career Goals:**", "**2. Action Items:**"),
+            ("1. **Career Goals:**", "2. **Action Items:**"),
+            ("### 1. Career Goals", "### 2. Action Items"),
+            ("- **Career Goals**", "- **Action Items**"),
+            ("__Career Goals__", "__Action Items__")
+        ]
+        for goals_heading, actions_heading in headings:
+            with self.subTest(goals_heading=goals_heading):
+                self.assert_sections(parse_takeaways(self.build_response(goals_heading, actions_heading)), self.EXPECTED)
+    
+    def test_bullet_starting_with_section_name_is_an_item(self):
+        """A bullet that merely starts with a section name stays in its section."""
+        response = "Career Goals:\n- **Career goals** are to teach\n- Action items come later\nAction Items:\n- Apply\n"
+        parsed = parse_takeaways(response)
+        self.assertEqual(parsed["career_goals"], ["**Career goals** are to teach", "Action items come later"])
+        self.assertEqual(parsed["action_items"], ["Apply"])
+    
+    def test_other_categories(self):
+        """Concerns, achievements and insights are parsed under their aliases."""
+        response = (
+            "Career Goals:\n- Teach\nNext Steps:\n- Apply\nConcerns raised:\n- Funding\n"
+            "Achievements:\n- Finished a course\nKey Insights:\n- Motivated\n"
+        )
+        parsed = parse_takeaways(response)
+        self.assertEqual(parsed["action_items"], ["Apply"])
+        self.assertEqual(parsed["concerns"], ["Funding"])
+        self.assertEqual(parsed["achievements"], ["Finished a course"])
+        self.assertEqual(parsed["insights"], ["Motivated"])
+    
+    def test_missing_sections_get_placeholders(self):
+        """Career goals and action items fall back to failure placeholders."""
+        parsed = parse_takeaways("Bullets with no heading:\n- Something\n")
+        self.assertEqual(parsed["career_goals"], [CAREER_GOALS_FAILED])
+        self.assertEqual(parsed["action_items"], [ACTION_ITEMS_FAILED])
+
+class RecordingHandler:
+    """aiosmtpd handler that records delivered messages and rejects the first ``fail_first`` ones."""
+    
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.attempts = []
+        self.messages = []
+        self.logins = []
+    
+    def authenticate(self, server, session, envelope, mechanism, auth_data):
+        """Accept the test credentials and record each login."""
+        self.logins.append((auth_data.login.decode(), auth_data.password.decode()))
+        return AuthResult(success=auth_data.password == b"secret")
+    
+    async def handle_DATA(self, server, session, envelope):
+        self.attempts.append(time.time())
+        if len(self.attempts) <= self.fail_first:
+            return "451 Requested action aborted: try again later"
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+@unittest.skipIf(Controller is None, "aiosmtpd not installed")
+class TestEmailOutbox(unittest.TestCase):
+    """Test cases for the email outbox, delivering to a local aiosmtpd server."""
+    
+    def setUp(self):
+        """Start an SMTP server that requires AUTH and point the email service at it."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "outbox.db")
+        self.handler = RecordingHandler()
+        port = self.start_server(self.handler, authenticator=self.handler.authenticate, auth_require_tls=False, auth_required=True)
+        
+        patcher = mock.patch.multiple(
+            Config, SMTP_SERVER="127.0.0.1", SMTP_PORT=port, SMTP_USERNAME="counselor@university.edu",
+            SMTP_PASSWORD="secret", SMTP_USE_TLS=False
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.email_service = EmailService()
+        self.addCleanup(self.email_service.close)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+    
+    def start_server(self, handler: RecordingHandler, **kwargs) -> int:
+        """Run an aiosmtpd server on a free local port until the test ends; returns the port."""
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        controller = Controller(handler, hostname="127.0.0.1", port=port, **kwargs)
+        controller.start()
+        self.addCleanup(controller.stop)
+        return port
+    
+    def make_outbox(self, **kwargs) -> EmailOutbox:
+        """An outbox on the test database; closed at the end of the test."""
+        kwargs.setdefault("workers", 1)
+        kwargs.setdefault("poll_interval", 0.05)
+        outbox = EmailOutbox(self.email_service, path=self.path, **kwargs)
+        self.addCleanup(outbox.close)
+        return outbox
+    
+    @staticmethod
+    def make_email(to_email: str = "student@university.edu") -> FollowUpEmail:
+        """A follow-up email for a sample session."""
+        summary = SessionSummary(
+            session_id="outbox_001",
+            student_name="Test Student",
+            date=datetime.now(),
+            key_takeaways=[],
+            career_goals=["Work in software development"],
+            action_items=["Create a study plan"],
+            concerns_addressed=[],
+            next_steps=["Create a study plan"],
+            summary_text="Discussed software careers."
+        )
+        return FollowUpEmail(
+            to_email=to_email,
+            subject="Follow-up from our session",
+            body="Thank you for meeting with me.",
+            session_summary=summary
+        )
+    
+    def wait_for_status(self, outbox: EmailOutbox, outbox_id: str, status: str, timeout: float = 10) -> dict:
+        """Poll an outbox entry until it reaches a status."""
+        deadline = time.monotonic() + timeout
+        entry = outbox.get(outbox_id)
+        while entry["status"] != status:
+            if time.monotonic() > deadline:
+                self.fail(f"Outbox entry stayed {entry['status']}, expected {status}")
+            time.sleep(0.02)
+            entry = outbox.get(outbox_id)
+        return entry
+    
+    def test_enqueue_persists_and_delivers(self):
+        """An enqueued email is stored as pending and delivered once the workers run."""
+        outbox = self.make_outbox()
+        outbox_id = outbox.enqueue(self.make_email())
+        entry = outbox.get(outbox_id)
+        self.assertEqual(entry["status"], PENDING)
+        self.assertEqual(entry["to_email"], "student@university.edu")
+        self.assertEqual(self.handler.messages, [])
+        
+        outbox.start()
+        entry = self.wait_for_status(outbox, outbox_id, SENT)
+        self.assertEqual(entry["attempts"], 1)
+        self.assertTrue(entry["result"]["success"])
+        self.assertEqual(len(self.handler.messages), 1)
+        envelope = self.handler.messages[0]
+        self.assertEqual(envelope.rcpt_tos, ["student@university.edu"])
+        self.assertIn(b"Subject: Follow-up from our session", envelope.original_content)
+        self.assertEqual(outbox.counts(), {SENT: 1})
+    
+    def test_old_sent_and_failed_entries_are_pruned(self):
+        """Sent and failed entries past retention are deleted on open and by prune(); pending ones are kept."""
+        outbox = self.make_outbox(retention_seconds=3600)
+        outbox_ids = {status: outbox.enqueue(self.make_email()) for status in (SENT, FAILED, PENDING)}
+        recent_id = outbox.enqueue(self.make_email())
+        with outbox._lock:
+            for status, outbox_id in outbox_ids.items():
+                outbox._conn.execute(
+                    "UPDATE outbox SET status = ?, updated_at = ? WHERE id = ?", (status, time.time() - 7200, outbox_id)
+                )
+            outbox._conn.execute("UPDATE outbox SET status = ? WHERE id = ?", (SENT, recent_id))
+            outbox._conn.commit()
+        
+        self.assertEqual(outbox.prune(), 2)
+        self.assertIsNone(outbox.get(outbox_ids[SENT]))
+        self.assertIsNone(outbox.get(outbox_ids[FAILED]))
+        self.assertEqual(outbox.get(outbox_ids[PENDING])["status"], PENDING)
+        self.assertEqual(outbox.get(recent_id)["status"], SENT)
+        
+        # Opening the outbox prunes too; with retention 0 nothing is deleted
+        with outbox._lock:
+            outbox._conn.execute("UPDATE outbox SET updated_at = ? WHERE id = ?", (time.time() - 7200, recent_id))
+            outbox._conn.commit()
+        self.assertEqual(self.make_outbox(retention_seconds=0).counts(), {PENDING: 1, SENT: 1})
+        self.assertEqual(self.make_outbox(retention_seconds=3600).counts(), {PENDING: 1})
+    
+    def test_failed_send_is_retried_after_backoff(self):
+        """A rejected send goes back to pending with a backoff delay, then succeeds."""
+        self.handler.fail_first = 1
+        outbox = self.make_outbox(backoff_seconds=0.4)
+        outbox_id = outbox.enqueue(self.make_email())
+        outbox.start()
+        
+        entry = self.wait_for_status(outbox, outbox_id, SENT)
+        self.assertEqual(entry["attempts"], 2)
+        self.assertIsNone(entry["last_error"])
+        self.assertEqual(len(self.handler.attempts), 2)
+        self.assertEqual(len(self.handler.messages), 1)
+        # Jitter keeps at least half of the 0.4s backoff
+        self.assertGreaterEqual(self.handler.attempts[1] - self.handler.attempts[0], 0.2)
+    
+    def test_failed_send_waits_for_backoff(self):
+        """Between attempts the entry is pending, records the error and is not due yet."""
+        self.handler.fail_first = 1
+        outbox = self.make_outbox(backoff_seconds=30)
+        outbox_id = outbox.enqueue(self.make_email())
+        outbox.start()
+        
+        deadline = time.monotonic() + 10
+        while not outbox.get(outbox_id)["attempts"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+        entry = outbox.get(outbox_id)
+        self.assertEqual(entry["status"], PENDING)
+        self.assertEqual(entry["attempts"], 1)
+        self.assertIn("451", entry["last_error"])
+        self.assertGreaterEqual(entry["next_attempt_at"] - entry["updated_at"], 15)
+        time.sleep(0.3)
+        self.assertEqual(len(self.handler.attempts), 1)
+    
+    def test_gives_up_after_max_attempts(self):
+        """An email that keeps failing ends up failed after max_attempts tries."""
+        self.handler.fail_first = 10
+        outbox = self.make_outbox(max_attempts=2, backoff_seconds=0.05)
+        outbox_id = outbox.enqueue(self.make_email())
+        outbox.start()
+        
+        entry = self.wait_for_status(outbox, outbox_id, FAILED)
+        self.assertEqual(entry["attempts"], 2)
+        self.assertEqual(len(self.handler.attempts), 2)
+        self.assertEqual(self.handler.messages, [])
+    
+    def test_logs_in_with_configured_credentials(self):
+        """Delivery authenticates with SMTP_USERNAME and SMTP_PASSWORD."""
+        result = self.email_service.send_email(self.make_email())
+        self.assertTrue(result["success"], result.get("error"))
+        self.assertEqual(self.handler.logins, [("counselor@university.edu", "secret")])
+    
+    def test_refuses_to_send_unauthenticated(self):
+        """With credentials configured, a server that offers no AUTH is an error, not an unauthenticated send."""
+        handler = RecordingHandler()
+        port = self.start_server(handler)
+        pool = SMTPConnectionPool("127.0.0.1", port, "counselor@university.edu", "secret", use_tls=False)
+        self.addCleanup(pool.close)
+        with self.assertRaises(smtplib.SMTPNotSupportedError):
+            with pool.connection() as server:
+                server.send_message(EmailService()._build_message(self.make_email()))
+        self.assertEqual(handler.messages, [])
+        
+        # Without credentials the same server is used as an open relay, as for local development
+        anonymous = SMTPConnectionPool("127.0.0.1", port, use_tls=False)
+        self.addCleanup(anonymous.close)
+        with anonymous.connection() as server:
+            server.send_message(EmailService()._build_message(self.make_email(), "counselor@university.edu"))
+        self.assertEqual(len(handler.messages), 1)
+    
+    def test_bulk_send_gives_each_email_its_own_id(self):
+        """Emails of one bulk send, all within the same second, get distinct IDs."""
+        emails = [self.make_email(f"student{index}@university.edu") for index in range(6)]
+        results = self.email_service.send_bulk(emails)
+        
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertEqual([result["to_email"] for result in results], [email.to_email for email in emails])
+        self.assertEqual(len({result["email_id"] for result in results}), 6)
+        self.assertEqual(len(self.handler.messages), 6)
+    
+    def test_in_flight_email_recovered_after_crash(self):
+        """An email claimed by a worker that died mid-send is delivered after a restart."""
+        outbox = self.make_outbox()
+        outbox_id = outbox.enqueue(self.make_email())
+        # Simulate a worker that claimed the email and died before recording the outcome
+        self.assertIsNotNone(outbox._claim())
+        self.assertEqual(outbox.get(outbox_id)["status"], SENDING)
+        outbox.close()
+        
+        restarted = self.make_outbox()
+        self.assertEqual(restarted.get(outbox_id)["status"], PENDING)
+        restarted.start()
+        entry = self.wait_for_status(restarted, outbox_id, SENT)
+        self.assertEqual(entry["attempts"], 1)
+        self.assertEqual(len(self.handler.messages), 1)
+
+class ApiTestCase(unittest.TestCase):
+    """Base for API tests: a fresh service container with a fake-backend agent and no on-disk services."""
+    
+    def setUp(self):
+        """Point the app at a fresh service container."""
+        patcher = mock.patch.multiple(
+            Config, LLM_CACHE_ENABLED=False, GEMINI_RATE_LIMIT_ENABLED=False, CONTEXT_CACHE_ENABLED=False,
+            EMAIL_OUTBOX_ENABLED=False, SESSION_STORE_ENABLED=False, EMAIL_ARCHIVE_ENABLED=False,
+            PIPELINE_MODE="multi_call", EMAIL_MODE="llm", SCHEDULER_MAX_CONCURRENT=3, SCHEDULER_INTERACTIVE_RESERVED=1
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = RecordingBackend()
+        self.services = ServiceContainer()
+        self.services._agent = CounselingSessionAgent(backend=self.backend)
+        self.addCleanup(self.services.close)
+        services_patcher = mock.patch.object(api, "services", self.services)
+        services_patcher.start()
+        self.addCleanup(services_patcher.stop)
+        self.client = TestClient(api.app)
+    
+    @staticmethod
+    def request_body(session_id: str = "api_001", **overrides) -> dict:
+        """A /process-session request body that does not send email."""
+        transcript = TestCounselingSessionAgent.make_transcript(TestCounselingSessionAgent.TRANSCRIPT)
+        body = {
+            "transcript": transcript.model_copy(update={"session_id": session_id}).model_dump(mode="json"),
+            "send_email": False,
+            "incremental": False
+        }
+        body.update(overrides)
+        return body
+
+class TestSessionScheduler(unittest.TestCase):
+    """Test cases for the priority and fair-queuing session scheduler."""
+    
+    @staticmethod
+    async def run_queued(scheduler: SessionScheduler, jobs: list) -> list:
+        """Queue (priority, counselor, name) jobs behind a held slot, release it, and return the order they ran in."""
+        order = []
+        
+        async def job(priority, counselor, name):
+            async with scheduler.slot(priority, counselor):
+                order.append(name)
+        
+        await scheduler.acquire("batch", "holder")
+        tasks = [asyncio.create_task(job(*spec)) for spec in jobs]
+        await asyncio.sleep(0)
+        assert scheduler.queued == len(jobs)
+        scheduler.release("batch")
+        await asyncio.gather(*tasks)
+        return order
+    
+    def test_higher_priority_classes_run_first(self):
+        """Queued interactive work runs before standard, and standard before batch, whatever the arrival order."""
+        scheduler = SessionScheduler(max_concurrent=1, interactive_reserved=0, max_queued=0)
+        jobs = [("batch", "c", "batch"), ("standard", "c", "standard"), ("interactive", "c", "interactive")]
+        order = asyncio.run(self.run_queued(scheduler, jobs))
+        self.assertEqual(order, ["interactive", "standard", "batch"])
+    
+    def test_counselors_are_served_round_robin(self):
+        """A counselor with many queued sessions does not starve the others."""
+        scheduler = SessionScheduler(max_concurrent=1, interactive_reserved=0, max_queued=0)
+        jobs = [("standard", "a", "a1"), ("standard", "a", "a2"), ("standard", "a", "a3"),
+                ("standard", "b", "b1"), ("standard", "c", "c1")]
+        order = asyncio.run(self.run_queued(scheduler, jobs))
+        self.assertEqual(order, ["a1", "b1", "c1", "a2", "a3"])
+    
+    def test_reserved_slots_only_go_to_interactive(self):
+        """Batch work leaves the reserved slots free for interactive requests."""
+        async def scenario():
+            scheduler = SessionScheduler(max_concurrent=2, interactive_reserved=1, max_queued=0)
+            await scheduler.acquire("batch", "a")
+            waiting = asyncio.create_task(scheduler.acquire("batch", "b"))
+            await asyncio.sleep(0)
+            self.assertFalse(waiting.done())
+            await asyncio.wait_for(scheduler.acquire("interactive", "c"), 1)
+            self.assertEqual((scheduler.running, scheduler.queued), (2, 1))
+            # With the interactive request holding a slot, the one non-reserved slot is still taken
+            scheduler.release("batch")
+            await asyncio.sleep(0)
+            self.assertFalse(waiting.done())
+            scheduler.release("interactive")
+            await asyncio.wait_for(waiting, 1)
+            self.assertEqual((scheduler.running, scheduler.queued), (1, 0))
+        asyncio.run(scenario())
+    
+    def test_slot_released_after_failure_or_cancellation(self):
+        """A failed or cancelled holder frees its slot, and a cancelled waiter leaves the queue."""
+        async def scenario():
+            scheduler = SessionScheduler(max_concurrent=1, interactive_reserved=0, max_queued=0)
+            with self.assertRaises(RuntimeError):
+                async with scheduler.slot("interactive", "a"):
+                    raise RuntimeError("pipeline failed")
+            self.assertEqual(scheduler.running, 0)
+            
+            started = asyncio.Event()
+            
+            async def hold():
+                async with scheduler.slot("standard", "a"):
+                    started.set()
+                    await asyncio.sleep(60)
+            
+            holder = asyncio.create_task(hold())
+            await started.wait()
+            waiter = asyncio.create_task(scheduler.acquire("standard", "b"))
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.queued, 1)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            self.assertEqual(scheduler.queued, 0)
+            self.assertEqual(scheduler.stats()["counselors_waiting"], 0)
+            holder.cancel()
+            await asyncio.gather(holder, return_exceptions=True)
+            self.assertEqual(scheduler.running, 0)
+            await asyncio.wait_for(scheduler.acquire("standard", "c"), 1)
+        asyncio.run(scenario())
+    
+    def test_full_queue_is_rejected(self):
+        """Requests beyond max_queued raise SchedulerFull instead of waiting."""
+        async def scenario():
+            scheduler = SessionScheduler(max_concurrent=1, interactive_reserved=0, max_queued=1)
+            await scheduler.acquire("interactive", "a")
+            waiter = asyncio.create_task(scheduler.acquire("interactive", "b"))
+            await asyncio.sleep(0)
+            with self.assertRaises(SchedulerFull):
+                await scheduler.acquire("interactive", "c")
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        asyncio.run(scenario())
+    
+    def test_counselor_key(self):
+        """Sessions are grouped by counselor email, then name, then a shared bucket."""
+        transcript = TestCounselingSessionAgent.make_transcript("Counselor: Hi.")
+        self.assertEqual(counselor_key(transcript), "dr. test")
+        transcript.participants[0].email = "Lee@University.edu"
+        self.assertEqual(counselor_key(transcript), "lee@university.edu")
+        transcript.participants = transcript.participants[1:]
+        self.assertEqual(counselor_key(transcript), "unassigned")
+
+class TestSchedulerApi(ApiTestCase):
+    """Test cases for the scheduler behind /process-session and /scheduler/stats."""
+    
+    def test_stats_after_requests(self):
+        """Each request is admitted in its class and gives its slot back."""
+        self.assertEqual(self.client.post("/process-session", json=self.request_body()).status_code, 200)
+        self.assertEqual(self.client.post("/process-session", json=self.request_body("api_002", priority="batch")).status_code, 200)
+        
+        stats = self.client.get("/scheduler/stats").json()
+        self.assertEqual(stats["max_concurrent"], 3)
+        self.assertEqual(stats["interactive_reserved"], 1)
+        self.assertEqual((stats["running"], stats["queued"]), (0, 0))
+        self.assertEqual(stats["classes"]["interactive"]["admitted"], 1)
+        self.assertEqual(stats["classes"]["batch"]["admitted"], 1)
+        self.assertIsNotNone(stats["classes"]["interactive"]["recent_wait"]["p50_ms"])
+    
+    def test_failed_request_releases_its_slot(self):
+        """A pipeline error returns 500 and leaves no slot held."""
+        with mock.patch.object(self.services._agent, "aprocess_session", side_effect=RuntimeError("backend down")):
+            response = self.client.post("/process-session", json=self.request_body())
+        self.assertEqual(response.status_code, 500)
+        stats = self.client.get("/scheduler/stats").json()
+        self.assertEqual((stats["running"], stats["queued"]), (0, 0))
+        self.assertEqual(stats["classes"]["interactive"]["admitted"], 1)
+    
+    def test_full_queue_returns_503(self):
+        """SchedulerFull surfaces as 503."""
+        with mock.patch("scheduler.SessionScheduler.acquire", side_effect=SchedulerFull("Scheduler queue is full")):
+            response = self.client.post("/process-session", json=self.request_body())
+        self.assertEqual(response.status_code, 503)
+
+class FakeClock:
+    """Stand-in for the time module: the clock only moves when sleep() is called or now is set."""
+    
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+    
+    def monotonic(self) -> float:
+        return self.now
+    
+    def time(self) -> float:
+        return self.now
+    
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+    
+    async def asleep(self, seconds: float) -> None:
+        self.sleep(seconds)
+
+class ServiceUnavailable(Exception):
+    """Named like the Google API error for a transient 503."""
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for the LLM rate limiter, on a fake clock with jitter pinned to its upper bound."""
+    
+    def setUp(self):
+        """Replace the limiter's clock and backoff jitter."""
+        self.clock = FakeClock()
+        for patcher in (
+            mock.patch.object(rate_limiter, "time", self.clock),
+            mock.patch.object(rate_limiter, "backoff_delay", lambda attempt, base, maximum: min(maximum, base * (2 ** attempt)))
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def make_limiter(self, **kwargs) -> LLMRateLimiter:
+        """A limiter with no RPM/TPM budget, starting at four concurrent calls."""
+        options = dict(requests_per_minute=0, tokens_per_minute=0, initial_concurrency=4, max_concurrency=8,
+                       max_retries=3, backoff_base=1, backoff_max=3)
+        options.update(kwargs)
+        return LLMRateLimiter(**options)
+    
+    @staticmethod
+    def failing(errors: list, result: str = "ok"):
+        """A call that raises each error in turn, then returns result; counts its calls."""
+        def func():
+            func.calls += 1
+            if errors:
+                raise errors.pop(0)
+            return result
+        func.calls = 0
+        return func
+    
+    def test_token_bucket_waits_for_refill(self):
+        """A drained bucket makes callers wait for the refill, and refills only up to capacity."""
+        bucket = TokenBucket(rate_per_minute=60, capacity=2)
+        self.assertEqual([bucket.acquire(), bucket.acquire()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+        self.assertEqual(self.clock.sleeps, [1.0, 1.0])
+        
+        self.clock.now += 60
+        self.assertEqual([bucket.acquire(), bucket.acquire()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.acquire(), 1.0)
+    
+    def test_token_bucket_adjust_refunds_overestimates(self):
+        """Refunding an overestimate makes the tokens available again without waiting."""
+        bucket = TokenBucket(rate_per_minute=600, capacity=100)
+        bucket.acquire(100)
+        bucket.adjust(-40)
+        self.assertEqual(bucket.acquire(40), 0.0)
+        self.assertAlmostEqual(bucket.acquire(10), 1.0)
+    
+    def test_concurrency_halves_on_throttle_and_grows_back(self):
+        """AIMD: a 429 halves the limit, down to the minimum, and successes add about one slot per window."""
+        limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=1, maximum=8)
+        limiter.acquire()
+        limiter.release(throttled=True, succeeded=False)
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(throttled=True, succeeded=False)
+        self.assertEqual(limiter.limit, 1)
+        
+        successes = 0
+        while limiter.limit < 4:
+            limiter.acquire()
+            limiter.release()
+            successes += 1
+        self.assertEqual(limiter.in_flight, 0)
+        # Additive increase: roughly limit successes per extra slot, so 1 -> 4 takes a handful, not one
+        self.assertGreater(successes, 3)
+        self.assertLess(successes, 10)
+        for _ in range(200):
+            limiter.acquire()
+            limiter.release()
+        self.assertEqual(limiter.limit, 8)
+    
+    def test_retryable_error_is_retried_with_backoff(self):
+        """Throttling and transient errors are retried after exponential backoff, shrinking the limit on 429s."""
+        limiter = self.make_limiter()
+        func = self.failing([SimulatedQuotaError("429"), ServiceUnavailable("503")])
+        
+        self.assertEqual(limiter.call(func, estimated_tokens=10), "ok")
+        self.assertEqual(func.calls, 3)
+        self.assertEqual(self.clock.sleeps, [1, 2])
+        # Halved from 4 by the 429, unchanged by the 503, then one success adds 1/limit
+        self.assertEqual(limiter.concurrency.limit, 2.5)
+        self.assertEqual(limiter.concurrency.in_flight, 0)
+    
+    def test_gives_up_after_max_retries(self):
+        """The last error is raised once max_retries retries are used up; backoff is capped at backoff_max."""
+        limiter = self.make_limiter()
+        func = self.failing([ServiceUnavailable(str(attempt)) for attempt in range(10)])
+        
+        with self.assertRaises(ServiceUnavailable):
+            limiter.call(func, estimated_tokens=10)
+        self.assertEqual(func.calls, 4)
+        self.assertEqual(self.clock.sleeps, [1, 2, 3])
+        self.assertEqual(limiter.concurrency.in_flight, 0)
+    
+    def test_non_retryable_error_is_raised_at_once(self):
+        """Errors that are not throttling or transient are not retried."""
+        limiter = self.make_limiter()
+        func = self.failing([ValueError("bad prompt")])
+        
+        with self.assertRaises(ValueError):
+            limiter.call(func, estimated_tokens=10)
+        self.assertEqual(func.calls, 1)
+        self.assertEqual(self.clock.sleeps, [])
+    
+    def test_async_call_retries(self):
+        """acall retries the same way without blocking the event loop."""
+        limiter = self.make_limiter()
+        func = self.failing([SimulatedQuotaError("429")])
+        
+        async def call():
+            return func()
+        
+        with mock.patch.object(rate_limiter.asyncio, "sleep", self.clock.asleep):
+            result = asyncio.run(limiter.acall(call, estimated_tokens=10))
+        self.assertEqual(result, "ok")
+        self.assertEqual(func.calls, 2)
+        self.assertEqual(self.clock.sleeps, [1])
+
+class TestSingleFlight(ApiTestCase):
+    """Test cases for coalescing identical in-flight session requests."""
+    
+    def setUp(self):
+        """Give the fake backend enough latency for requests to overlap."""
+        super().setUp()
+        self.backend.latency = 0.05
+    
+    def test_concurrent_calls_share_one_run(self):
+        """Callers with the same key get the result of a single pipeline run."""
+        flights = SingleFlight("test")
+        agent = self.services._agent
+        transcript = TestCounselingSessionAgent.make_transcript(TestCounselingSessionAgent.TRANSCRIPT)
+        
+        async def scenario():
+            results = await asyncio.gather(*(
+                flights.do("session", lambda: agent.aprocess_session(transcript)) for _ in range(5)
+            ))
+            self.assertEqual(flights.in_flight(), 0)
+            return results
+        
+        results = asyncio.run(scenario())
+        self.assertEqual(self.backend.calls, 3)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertTrue(results[0].success)
+    
+    def test_exception_reaches_every_caller_and_clears_the_key(self):
+        """A failed run raises in every waiter, and the next call starts a new run."""
+        flights = SingleFlight("test")
+        runs = []
+        
+        async def failing():
+            runs.append(1)
+            await self.backend.agenerate("prompt")
+            raise RuntimeError("pipeline failed")
+        
+        async def scenario():
+            results = await asyncio.gather(*(flights.do("session", failing) for _ in range(4)), return_exceptions=True)
+            self.assertEqual(flights.in_flight(), 0)
+            await asyncio.gather(flights.do("session", failing), return_exceptions=True)
+            return results
+        
+        results = asyncio.run(scenario())
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(len(runs), 2)
+    
+    def test_cancelled_caller_does_not_cancel_the_run(self):
+        """A caller that goes away leaves the computation running for the others."""
+        flights = SingleFlight("test")
+        
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+        
+        async def scenario():
+            first = asyncio.create_task(flights.do("session", slow))
+            second = asyncio.create_task(flights.do("session", slow))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+        
+        self.assertEqual(asyncio.run(scenario()), "done")
+    
+    def test_identical_requests_share_one_pipeline_run(self):
+        """Concurrent identical /process-session requests make one set of LLM calls; different ones do not coalesce."""
+        async def scenario():
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                identical = [client.post("/process-session", json=self.request_body()) for _ in range(4)]
+                other = client.post("/process-session", json=self.request_body("api_other"))
+                return await asyncio.gather(*identical, other)
+        
+        responses = asyncio.run(scenario())
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(self.backend.calls, 6)
+        bodies = [response.json() for response in responses[:4]]
+        self.assertTrue(all(body == bodies[0] for body in bodies))
+        self.assertEqual(api.session_flights.in_flight(), 0)
+
+class TestResponseCache(unittest.TestCase):
+    """Test cases for the memory and SQLite response cache tiers, on a fake clock."""
+    
+    def setUp(self):
+        """Use a temporary cache directory and a fake clock."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, "cache", "responses.db")
+        self.clock = FakeClock()
+        patcher = mock.patch.object(response_cache, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def make_sqlite(self, **kwargs) -> SQLiteCache:
+        """A SQLite tier on the test database; closed at the end of the test."""
+        cache = SQLiteCache(self.path, **kwargs)
+        self.addCleanup(lambda: cache._conn.close())
+        return cache
+    
+    def stored_last_access(self, key: str) -> float:
+        """last_access of a row as committed to disk, read through a separate connection."""
+        with sqlite3.connect(self.path) as conn:
+            return conn.execute("SELECT last_access FROM responses WHERE key = ?", (key,)).fetchone()[0]
+    
+    def test_memory_cache_evicts_least_recently_used(self):
+        """The in-process tier drops the entry used longest ago, and expires entries at their TTL."""
+        cache = MemoryCache(max_entries=2, ttl_seconds=10)
+        cache.set("a", "A")
+        cache.set("b", "B")
+        self.assertEqual(cache.get("a"), "A")
+        cache.set("c", "C")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), ("A", "C"))
+        self.assertEqual(cache.evictions, 1)
+        
+        self.clock.now += 11
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["hits"], 3)
+        self.assertEqual(cache.stats()["misses"], 2)
+    
+    def test_sqlite_cache_persists_across_instances(self):
+        """Entries written by one instance are read by the next one opened on the same file."""
+        cache = self.make_sqlite()
+        cache.set("key", "response")
+        cache.close()
+        
+        reopened = self.make_sqlite()
+        self.assertEqual(reopened.get("key"), "response")
+        self.assertEqual(len(reopened), 1)
+    
+    def test_sqlite_cache_evicts_least_recently_used(self):
+        """Over max_entries, the rows accessed longest ago go first, counting buffered accesses."""
+        cache = self.make_sqlite(max_entries=4)
+        for index in range(4):
+            cache.set(f"k{index}", f"v{index}")
+            self.clock.now += 1
+        self.assertEqual(cache.get("k0"), "v0")
+        self.clock.now += 1
+        cache.set("k4", "v4")
+        
+        self.assertEqual(len(cache), 4)
+        self.assertEqual(cache.get("k0"), "v0")
+        self.assertIsNone(cache.get("k1"))
+        self.assertEqual(cache.evictions, 1)
+    
+    def test_sqlite_cache_expires_entries(self):
+        """An expired row is a miss at once and is deleted by the next eviction pass."""
+        cache = self.make_sqlite(max_entries=16, ttl_seconds=10)
+        cache.set("old", "stale")
+        self.clock.now += 11
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(len(cache), 1)
+        cache.set("new", "fresh")
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 1)
+    
+    def test_sqlite_cache_batches_last_access_updates(self):
+        """Hits only update last_access on disk once ACCESS_FLUSH_SIZE accumulate, or on close."""
+        cache = self.make_sqlite()
+        cache.ACCESS_FLUSH_SIZE = 3
+        for key in ("a", "b", "c", "d"):
+            cache.set(key, key.upper())
+        written = self.stored_last_access("a")
+        
+        self.clock.now += 5
+        cache.get("a")
+        cache.get("b")
+        self.assertEqual(self.stored_last_access("a"), written)
+        cache.get("c")
+        self.assertEqual(self.stored_last_access("a"), written + 5)
+        
+        self.clock.now += 5
+        cache.get("d")
+        cache.close()
+        self.assertEqual(self.stored_last_access("d"), written + 10)
+    
+    def test_tiered_cache_promotes_disk_hits(self):
+        """A hit in the SQLite tier is copied into memory, so the next lookup never touches disk."""
+        TieredCache([MemoryCache(), self.make_sqlite()]).set("key", "response")
+        
+        memory = MemoryCache()
+        disk = self.make_sqlite()
+        tiered = TieredCache([memory, disk])
+        self.assertEqual(tiered.get("key"), "response")
+        self.assertEqual(len(memory), 1)
+        self.assertEqual(tiered.get("key"), "response")
+        self.assertEqual((memory.hits, disk.hits), (1, 1))
+        self.assertIsNone(tiered.get("missing"))
+        self.assertEqual(tiered.stats()["hit_rate"], round(2 / 3, 4))
+    
+    def test_async_access_runs_sqlite_off_the_event_loop(self):
+        """aget/aset give the same results, with SQLite work done in a worker thread."""
+        disk = self.make_sqlite()
+        threads = []
+        original_get = disk._get
+        
+        def recording_get(key):
+            threads.append(threading.get_ident())
+            return original_get(key)
+        
+        disk._get = recording_get
+        memory = MemoryCache()
+        tiered = TieredCache([memory, disk])
+        
+        async def scenario():
+            await disk.aset("key", "response")
+            return await tiered.aget("key"), await tiered.aget("key"), threading.get_ident()
+        
+        first, second, loop_thread = asyncio.run(scenario())
+        self.assertEqual((first, second), ("response", "response"))
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+        self.assertEqual(memory.hits, 1)
+
+class TestCompression(unittest.TestCase):
+    """Test cases for br/gzip negotiation and the compression middleware."""
+    
+    BODY = "counseling session " * 300
+    
+    def setUp(self):
+        """Serve a few fixed responses through the middleware."""
+        lines = [f'{{"session_id": "s{index}"}}\n' for index in range(50)]
+        app = Starlette(routes=[
+            Route("/large", lambda request: PlainTextResponse(self.BODY)),
+            Route("/small", lambda request: PlainTextResponse("ok")),
+            Route("/encoded", lambda request: Response(
+                gzip.compress(self.BODY.encode()), media_type="text/plain", headers={"Content-Encoding": "gzip"}
+            )),
+            Route("/events", lambda request: PlainTextResponse(self.BODY, media_type="text/event-stream")),
+            Route("/stream", lambda request: StreamingResponse(iter(lines), media_type="application/x-ndjson"))
+        ])
+        self.lines = lines
+        self.client = TestClient(CompressionMiddleware(app, minimum_size=1024))
+    
+    def get(self, path: str, accept_encoding: str) -> httpx.Response:
+        """GET a path with the given Accept-Encoding."""
+        return self.client.get(path, headers={"Accept-Encoding": accept_encoding})
+    
+    def test_choose_encoding(self):
+        """br is preferred when installed and accepted; q=0 refuses an encoding."""
+        br = "br" if compression.brotli is not None else "gzip"
+        self.assertEqual(choose_encoding("gzip, deflate, br"), br)
+        self.assertEqual(choose_encoding("br;q=0.5, gzip;q=1.0"), br)
+        self.assertEqual(choose_encoding("gzip, br;q=0"), "gzip")
+        self.assertEqual(choose_encoding("GZIP"), "gzip")
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding(""))
+        with mock.patch.object(compression, "brotli", None):
+            self.assertEqual(choose_encoding("br, gzip"), "gzip")
+            self.assertIsNone(choose_encoding("br"))
+    
+    def test_gzip(self):
+        """Large bodies are gzipped, with Content-Length of the compressed body."""
+        response = self.get("/large", "gzip")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.text, self.BODY)
+        self.assertLess(int(response.headers["content-length"]), len(self.BODY) // 10)
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+    
+    @unittest.skipIf(compression.brotli is None, "brotli not installed")
+    def test_brotli(self):
+        """Clients accepting br get brotli."""
+        response = self.get("/large", "gzip, br")
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertEqual(response.text, self.BODY)
+    
+    def test_small_and_unaccepted_bodies_pass_through(self):
+        """Bodies under minimum_size, or clients accepting neither encoding, get the body as is."""
+        small = self.get("/small", "gzip, br")
+        self.assertNotIn("content-encoding", small.headers)
+        self.assertEqual(small.text, "ok")
+        identity = self.get("/large", "identity")
+        self.assertNotIn("content-encoding", identity.headers)
+        self.assertEqual(identity.text, self.BODY)
+    
+    def test_encoded_and_excluded_types_pass_through(self):
+        """Already-encoded bodies and event streams are not compressed again."""
+        encoded = self.get("/encoded", "br, gzip")
+        self.assertEqual(encoded.headers["content-encoding"], "gzip")
+        self.assertEqual(encoded.text, self.BODY)
+        events = self.get("/events", "br, gzip")
+        self.assertNotIn("content-encoding", events.headers)
+        self.assertEqual(events.text, self.BODY)
+    
+    def test_streamed_body_is_compressed_incrementally(self):
+        """A streamed response is compressed chunk by chunk and decodes to the same lines."""
+        response = self.get("/stream", "gzip")
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertNotIn("content-length", response.headers)
+        self.assertEqual(response.text, "".join(self.lines))
+
+class TestResponseShaping(ApiTestCase):
+    """Test cases for format=compact and fields= on /process-session."""
+    
+    def post(self, query: str = "") -> httpx.Response:
+        """POST the sample session with a query string."""
+        return self.client.post(f"/process-session{query}", json=self.request_body())
+    
+    def test_full_response_is_compressed(self):
+        """The full response is large enough to be compressed."""
+        response = self.client.post("/process-session", json=self.request_body(), headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.json()["session_summary"]["student_name"], "Test Student")
+    
+    def test_compact_format(self):
+        """Compact responses carry the summary and email once, takeaways grouped by category."""
+        full = self.post().json()
+        compact = self.post("?format=compact").json()
+        
+        self.assertEqual(set(compact), {"success", "message", "session", "email"})
+        self.assertNotIn("session_summary", compact["email"])
+        self.assertNotIn("career_goals", compact["session"])
+        self.assertEqual(compact["session"]["takeaways"]["career_goals"], full["session_summary"]["career_goals"])
+        self.assertEqual(compact["session"]["summary_text"], full["session_summary"]["summary_text"])
+        self.assertEqual(compact["email"]["body"], full["follow_up_email"]["body"])
+        self.assertLess(len(self.post("?format=compact").content), len(self.post().content))
+    
+    def test_fields_projection(self):
+        """fields= keeps only the listed paths, plus success."""
+        body = self.post("?fields=session_summary.summary_text,follow_up_email.to_email").json()
+        self.assertEqual(set(body), {"success", "session_summary", "follow_up_email"})
+        self.assertEqual(set(body["session_summary"]), {"summary_text"})
+        self.assertEqual(body["follow_up_email"], {"to_email": "test@university.edu"})
+        
+        compact = self.post("?format=compact&fields=session.takeaways.career_goals").json()
+        self.assertEqual(set(compact), {"success", "session"})
+        self.assertEqual(set(compact["session"]["takeaways"]), {"career_goals"})
+    
+    def test_unknown_and_malformed_fields(self):
+        """Unknown fields are left out; malformed paths are rejected with 400."""
+        body = self.post("?fields=no_such_field,session_summary.nope").json()
+        self.assertEqual(body, {"success": True, "session_summary": {}})
+        self.assertEqual(self.post("?fields=session_summary..summary_text").status_code, 400)
+        self.assertIsNone(parse_fields(" , "))
+        self.assertEqual(parse_fields("a.b, c"), ["a.b", "c"])
+
+class TestEmailArchive(ApiTestCase):
+    """Test cases for the gzip JSONL email archive and its /emails/archive lookup."""
+    
+    def setUp(self):
+        """Open an archive with tiny segments in a temporary directory."""
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.archive = self.open_archive()
+    
+    def open_archive(self) -> EmailArchive:
+        """An archive on the test directory whose segments rotate after 512 bytes."""
+        archive = EmailArchive(directory=self.directory, segment_max_bytes=512, queue_size=100)
+        self.addCleanup(archive.close)
+        return archive
+    
+    @staticmethod
+    def make_email(index: int) -> FollowUpEmail:
+        """The follow-up email of one of two sessions."""
+        email = TestEmailOutbox.make_email(f"student{index}@university.edu")
+        email.subject = f"Follow-up {index}"
+        email.session_summary.session_id = f"archive_{index % 2}"
+        return email
+    
+    def segments(self) -> list:
+        """Segment files written so far."""
+        return sorted(glob.glob(os.path.join(self.directory, f"*{SEGMENT_SUFFIX}")))
+    
+    def test_rotates_segments_and_reads_back_through_the_index(self):
+        """Batches written past the size limit open new segments; every email is found through the index."""
+        archive_ids = {}
+        for batch in range(4):
+            for index in range(batch * 5, batch * 5 + 5):
+                archive_ids[self.archive.save(self.make_email(index))] = index
+            self.archive.flush()
+        
+        segments = self.segments()
+        self.assertGreater(len(segments), 1)
+        # Each segment is a plain multi-member gzip file of JSON lines
+        lines = []
+        for segment in segments:
+            with gzip.open(segment, "rt", encoding="utf-8") as f:
+                lines.extend(json.loads(line) for line in f)
+        self.assertEqual(sorted(line["archive_id"] for line in lines), sorted(archive_ids))
+        
+        for archive_id, index in archive_ids.items():
+            record = self.archive.get(archive_id)
+            self.assertEqual(record["archive_id"], archive_id)
+            self.assertEqual(record["email"]["to_email"], f"student{index}@university.edu")
+        self.assertIsNone(self.archive.get("unknown"))
+        
+        found = self.archive.find("archive_0", limit=50)
+        self.assertEqual(len(found), 10)
+        self.assertEqual([entry["archived_at"] for entry in found], sorted((entry["archived_at"] for entry in found), reverse=True))
+        self.assertEqual(len(self.archive.find("archive_1", limit=3)), 3)
+    
+    def test_close_writes_queued_emails(self):
+        """Emails still queued at a clean shutdown are written, and a reopened archive finds them."""
+        archive_ids = [self.archive.save(self.make_email(index)) for index in range(30)]
+        self.archive.close()
+        
+        reopened = self.open_archive()
+        for archive_id in archive_ids:
+            self.assertIsNotNone(reopened.get(archive_id))
+        self.assertEqual(len(reopened.find("archive_0", limit=200)) + len(reopened.find("archive_1", limit=200)), 30)
+    
+    def test_api_lookup(self):
+        """An email archived by /process-session can be listed and fetched through /emails/archive."""
+        self.services._email_archive = self.archive
+        with mock.patch.multiple(Config, SMTP_USERNAME=None, SMTP_PASSWORD=None):
+            response = self.client.post(
+                "/process-session", json=self.request_body("archive_api", send_email=True, save_email_template=True)
+            )
+        self.assertEqual(response.status_code, 200)
+        archive_id = response.json()["email_archive_id"]
+        self.archive.flush()
+        
+        listed = self.client.get("/emails/archive", params={"session_id": "archive_api"}).json()
+        self.assertEqual([entry["archive_id"] for entry in listed], [archive_id])
+        record = self.client.get(f"/emails/archive/{archive_id}").json()
+        self.assertEqual(record["email"]["to_email"], "test@university.edu")
+        self.assertEqual(record["email"]["session_summary"]["session_id"], "archive_api")
+        self.assertEqual(self.client.get("/emails/archive/unknown").status_code, 404)
+
+class TestSessionStore(unittest.TestCase):
+    """Test cases for the SQLite store of processed sessions."""
+    
+    SESSIONS = [
+        ("s1", "Alice Chen", datetime(2026, 1, 5, 9, 0)),
+        ("s2", "Bob Diaz", datetime(2026, 1, 12, 9, 0)),
+        ("s3", "alice chen", datetime(2026, 2, 2, 9, 0)),
+        ("s4", "Bob Diaz", datetime(2026, 2, 16, 9, 0)),
+        ("s5", "Alice Chen", datetime(2026, 3, 1, 9, 0))
+    ]
+    
+    def setUp(self):
+        """Open a store in a temporary directory and fill it."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, "store", "sessions.db")
+        self.store = self.open_store()
+        for session_id, student_name, date in self.SESSIONS:
+            self.store.save(*self.make_result(session_id, student_name, date))
+    
+    def open_store(self) -> SessionStore:
+        """A store on the test database; closed at the end of the test."""
+        store = SessionStore(self.path)
+        self.addCleanup(store.close)
+        return store
+    
+    @staticmethod
+    def make_result(session_id: str, student_name: str, date: datetime, summary_text: str = None) -> tuple:
+        """Transcript, summary and email of a processed session."""
+        transcript = SessionTranscript(
+            session_id=session_id,
+            date=date,
+            participants=[
+                SessionParticipant(name="Dr. Test", role="counselor"),
+                SessionParticipant(name=student_name, role="student", email="student@university.edu")
+            ],
+            transcript="Counselor: Hello.\nStudent: Hi."
+        )
+        summary = CounselingSessionAgent._build_session_summary(
+            transcript,
+            {"career_goals": ["Teach"], "action_items": ["Apply"], "concerns": [], "achievements": [], "insights": []},
+            summary_text or f"Summary of {session_id}"
+        )
+        email = CounselingSessionAgent._build_email(summary, "student@university.edu", "Thank you for meeting.")
+        return transcript, summary, email
+    
+    def test_get_returns_the_stored_result(self):
+        """get() returns the summary and email as JSON; get_result() returns the models."""
+        stored = self.store.get("s2")
+        self.assertEqual(stored["student_name"], "Bob Diaz")
+        self.assertEqual(stored["date"], "2026-01-12T09:00:00")
+        self.assertEqual(stored["session_summary"]["summary_text"], "Summary of s2")
+        self.assertEqual(stored["follow_up_email"]["body"], "Thank you for meeting.")
+        self.assertIsNone(self.store.get("unknown"))
+        
+        transcript, summary, email = self.store.get_result("s2")
+        expected = self.make_result("s2", "Bob Diaz", datetime(2026, 1, 12, 9, 0))
+        self.assertEqual(transcript, expected[0])
+        self.assertEqual(summary, expected[1])
+        self.assertEqual(email.body, expected[2].body)
+        self.assertIsNone(self.store.get_result("unknown"))
+    
+    def test_saving_again_replaces_the_result(self):
+        """A second save of a session ID replaces it, keeping created_at."""
+        before = self.store.get("s1")
+        self.store.save(*self.make_result("s1", "Alice Chen", datetime(2026, 1, 5, 9, 0), "Updated summary"))
+        after = self.store.get("s1")
+        self.assertEqual(after["session_summary"]["summary_text"], "Updated summary")
+        self.assertEqual(after["created_at"], before["created_at"])
+        self.assertGreaterEqual(after["updated_at"], before["updated_at"])
+        self.assertEqual(self.store.list_sessions()["total"], 5)
+    
+    def test_results_persist_across_instances(self):
+        """A reopened store serves what an earlier instance saved."""
+        self.store.close()
+        reopened = self.open_store()
+        self.assertEqual(reopened.get("s5")["session_summary"]["summary_text"], "Summary of s5")
+        self.assertEqual(reopened.list_sessions()["total"], 5)
+    
+    def test_list_pages_newest_first(self):
+        """Pages follow session date, newest first, with the total of all matches."""
+        pages = [self.store.list_sessions(limit=2, offset=offset) for offset in (0, 2, 4)]
+        self.assertTrue(all(page["total"] == 5 for page in pages))
+        self.assertEqual([[item["session_id"] for item in page["items"]] for page in pages], [["s5", "s4"], ["s3", "s2"], ["s1"]])
+        self.assertEqual(pages[0]["items"][0]["summary_text"], "Summary of s5")
+        self.assertEqual(self.store.list_sessions(offset=10)["items"], [])
+    
+    def test_list_filters_by_student_and_date(self):
+        """Student names match case-insensitively; the date range is inclusive."""
+        alice = self.store.list_sessions(student_name="ALICE CHEN")
+        self.assertEqual(alice["total"], 3)
+        self.assertEqual([item["session_id"] for item in alice["items"]], ["s5", "s3", "s1"])
+        
+        february = self.store.list_sessions(date_from=datetime(2026, 2, 2, 9, 0), date_to=datetime(2026, 2, 28))
+        self.assertEqual([item["session_id"] for item in february["items"]], ["s4", "s3"])
+        
+        both = self.store.list_sessions(student_name="bob diaz", date_from=datetime(2026, 2, 1))
+        self.assertEqual([item["session_id"] for item in both["items"]], ["s4"])
+        self.assertEqual(self.store.list_sessions(student_name="Nobody")["total"], 0)
+
+@unittest.skipIf(genai is None, "google-generativeai not installed")
+class TestGeminiContextCache(unittest.TestCase):
+    """Test cases for Gemini cached contexts, with the SDK's upload patched out."""
+    
+    def test_context_uses_versioned_model(self):
+        """The cache is created on the pinned context model, not the unversioned generation model."""
+        backend = GeminiBackend(model_name="gemini-2.0-flash", api_key="test-key")
+        cached = mock.Mock(usage_metadata=mock.Mock(total_token_count=5000))
+        cached.name = "cachedContents/abc"
+        with mock.patch.object(caching.CachedContent, "create", return_value=cached) as create, \
+             mock.patch.object(genai.GenerativeModel, "from_cached_content"):
+            context = backend.create_context("transcript", 60)
+        
+        self.assertEqual(create.call_args.kwargs["model"], Config.GEMINI_CONTEXT_CACHE_MODEL)
+        self.assertEqual(Config.GEMINI_CONTEXT_CACHE_MODEL, "gemini-2.0-flash-001")
+        self.assertEqual((context.handle, context.tokens), ("cachedContents/abc", 5000))
+    
+    def test_unavailable_cache_is_logged(self):
+        """A rejected upload is logged with the model name and raised for the agent to fall back."""
+        backend = GeminiBackend(api_key="test-key", context_model_name="gemini-custom-001")
+        with mock.patch.object(caching.CachedContent, "create", side_effect=RuntimeError("model not supported")):
+            with self.assertLogs("llm_backends", level="WARNING") as logs:
+                with self.assertRaises(RuntimeError):
+                    backend.create_context("transcript", 60)
+        self.assertIn("gemini-custom-001", logs.output[0])
+        self.assertIn("model not supported", logs.output[0])
+
+class TestEmailService(unittest.TestCase):
+    """Test cases for the email service without SMTP credentials (mock delivery)."""
+    
+    def test_mock_bulk_send_gives_each_email_its_own_id(self):
+        """Mock sends in the same second still get distinct IDs."""
+        with mock.patch.multiple(Config, SMTP_USERNAME=None, SMTP_PASSWORD=None):
+            email_service = EmailService()
+        emails = [TestEmailOutbox.make_email(f"student{index}@university.edu") for index in range(20)]
+        results = email_service.send_bulk(emails)
+        
+        self.assertTrue(all(result["mock"] for result in results))
+        self.assertEqual(len({result["email_id"] for result in results}), 20)
+        self.assertTrue(all(result["email_id"].startswith("mock_email_") for result in results))
+
+def run_tests():
+    """Run all tests."""
+    print("🧪 Running Counseling Session Agent Tests (Gemini)")
+    print("=" * 50)
+    
+    # Create test suite
+    loader = unittest.defaultTestLoader
+    test_suite = unittest.TestSuite()
+    
+    # Add test cases
+    test_suite.addTest(loader.loadTestsFromTestCase(TestCounselingSessionAgent))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestDataModels))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestTakeawayParser))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestEmailOutbox))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestEmailService))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestSessionScheduler))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestSchedulerApi))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestRateLimiter))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestSingleFlight))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestResponseCache))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestCompression))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestResponseShaping))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestEmailArchive))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestSessionStore))
+    test_suite.addTest(loader.loadTestsFromTestCase(TestGeminiContextCache))
+    
+    # Run tests
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(test_suite)
+    
+    # Print summary
+    print("\n" + "=" * 50)
+    if result.wasSuccessful():
+        print("✅ All tests passed!")
+    else:
+        print("❌ Some tests failed!")
+        print(f"Failures: {len(result.failures)}")
+        print(f"Errors: {len(result.errors)}")
+    
+    return result.wasSuccessful()
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,65 @@
+import re
+from typing import List
+
+# Rough heuristic for English text: one token is about four characters
+CHARS_PER_TOKEN = 4
+
+# A new speaker turn starts with "Name:" (optionally "Dr. Name:") at the beginning of a line
+SPEAKER_TURN_PATTERN = re.compile(r"^\s*(?:[A-Z][a-z]{0,3}\.\s+)?[A-Z][\w'-]*(?:\s[A-Z][\w'-]*)?:", re.MULTILINE)
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text without calling the tokenizer."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def split_turns(transcript: str) -> List[str]:
+    """Split a transcript into speaker turns; lines without a speaker stay with the previous turn."""
+    starts = [match.start() for match in SPEAKER_TURN_PATTERN.finditer(transcript)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(transcript))
+    turns = [transcript[begin:end].strip() for begin, end in zip(starts, starts[1:])]
+    return [turn for turn in turns if turn]
+
+def _split_oversized_turn(turn: str, max_tokens: int) -> List[str]:
+    """Split a single turn that exceeds the budget on sentence boundaries, then hard-wrap."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces: List[str] = []
+    current = ""
+    for sentence in SENTENCE_END_PATTERN.split(turn):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_transcript(transcript: str, max_tokens: int) -> List[str]:
+    """Pack speaker turns into windows of at most max_tokens (estimated), never splitting a turn unless it alone is too long."""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for turn in split_turns(transcript):
+        turn_tokens = estimate_tokens(turn)
+        if turn_tokens > max_tokens:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized_turn(turn, max_tokens))
+            continue
+        if current and current_tokens + turn_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(turn)
+        current_tokens += turn_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
@@ -0,0 +1,53 @@
+import os
+import re
+import glob
+from datetime import datetime
+from typing import List, Optional
+
+from models import SessionTranscript, SessionParticipant
+
+SPEAKER_PATTERN = re.compile(r"([A-Za-z]+):")
+NON_STUDENT_SPEAKERS = ["counselor", "dr.", "ms.", "mr.", "mrs."]
+
+def extract_student_name(transcript_text: str, default: str = "Student") -> str:
+    """Return the first speaker in the transcript who is not the counselor."""
+    for line in transcript_text.splitlines():
+        match = SPEAKER_PATTERN.match(line.strip())
+        if match and match.group(1).lower() not in NON_STUDENT_SPEAKERS:
+            return match.group(1)
+    return default
+
+def load_transcript_file(
+    filepath: str,
+    session_id: Optional[str] = None,
+    counselor_name: str = "Counselor",
+    counselor_email: Optional[str] = None,
+    email_domain: str = "university.edu"
+) -> SessionTranscript:
+    """Build a SessionTranscript from a plain-text transcript file."""
+    with open(filepath, "r", encoding="utf-8") as f:
+        transcript_text = f.read()
+
+    student_name = extract_student_name(transcript_text)
+    participants = [
+        SessionParticipant(name=counselor_name, role="counselor", email=counselor_email),
+        SessionParticipant(
+            name=student_name,
+            role="student",
+            email=f"{student_name.lower()}@{email_domain}"
+        )
+    ]
+
+    return SessionTranscript(
+        session_id=session_id or os.path.splitext(os.path.basename(filepath))[0],
+        date=datetime.fromtimestamp(os.path.getmtime(filepath)),
+        participants=participants,
+        transcript=transcript_text
+    )
+
+def load_transcript_directory(directory: str, pattern: str = "*.txt") -> List[SessionTranscript]:
+    """Load every transcript file in a directory, sorted by filename."""
+    if not os.path.isdir(directory):
+        raise ValueError(f"Transcript directory not found: {directory}")
+    paths = sorted(glob.glob(os.path.join(directory, pattern)))
+    return [load_transcript_file(path) for path in paths]